@@ -2,16 +2,29 @@
 PGFinder - PG Finder and Management System
 Main application entry point.
 """
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
 import logging
 from flask import Flask, render_template
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import config
-from models.database import get_db, close_connection
+from models.database import close_connection
 from routes.auth import auth_bp, signup, login, logout
 from routes.main import main_bp, home, dashboard
 from routes.pg import pg_bp
 from routes.requests import requests_bp
 from routes.admin import admin_bp
+from routes.health import health_bp
+from routes.api import api_bp
+from routes.saved_searches import saved_searches_bp
+from utils import startup, invalidation, autocomplete
+from commands import register_commands
+from utils.json_provider import FastJSONProvider
+from utils import fragments, resilience, deadlines, admission
+from models.job_queue import start_app_worker
+from models import archive
 
 # Configure logging
 logging.basicConfig(
@@ -20,6 +33,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+startup.record_import_time((time.perf_counter() - _IMPORT_STARTED) * 1000)
+
 
 def create_app(config_name=None):
     """
@@ -32,18 +47,40 @@ def create_app(config_name=None):
     Returns:
         Flask application instance
     """
+    started = time.perf_counter()
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     
     # Load configuration
     config_name = config_name or os.getenv('FLASK_ENV', 'default')
     app.config.from_object(config[config_name])
     
+    # Template caches (before any template is rendered)
+    fragments.init_app(app)
+    
+    # Load shedding, then per-request database deadlines (before any other
+    # request hook)
+    admission.init_app(app)
+    deadlines.init_app(app)
+    
+    # Stale-data indicator and 503 page for failed reads
+    resilience.init_app(app)
+    
+    # Trust X-Forwarded-For from the platform's proxies so request.remote_addr
+    # is the real client IP (used for login throttling)
+    proxy_count = app.config.get('TRUSTED_PROXY_COUNT', 0)
+    if proxy_count:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_count, x_proto=proxy_count)
+    
     # Register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
     app.register_blueprint(pg_bp)
     app.register_blueprint(requests_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(health_bp)
+    app.register_blueprint(api_bp)
+    app.register_blueprint(saved_searches_bp)
     
     # Register backward compatibility routes (without /auth prefix)
     app.add_url_rule('/signup', 'signup', signup, methods=['GET', 'POST'])
@@ -52,12 +89,22 @@ def create_app(config_name=None):
     app.add_url_rule('/', 'home', home, methods=['GET'])
     app.add_url_rule('/dashboard', 'dashboard', dashboard, methods=['GET'])
     
-    # Initialize database connection
-    try:
-        get_db()
-        logger.info("Database connection established")
-    except Exception as e:
-        logger.error(f"Failed to initialize database: {e}")
+    # Maintenance commands (flask --app app <command>)
+    register_commands(app)
+    
+    # Connect to the database and check indexes. In lazy mode (the default)
+    # this runs on a background thread so the worker serves traffic at once;
+    # /readyz reports when it has finished.
+    startup.register_warmup_task(invalidation.start_consumer)
+    startup.register_warmup_task(start_app_worker)
+    startup.register_warmup_task(autocomplete.build_index)
+    startup.register_warmup_task(archive.schedule)
+    startup.start_warmup(app.config.get('STARTUP_MODE'))
+    
+    @app.before_request
+    def warmup_after_fork():
+        """Start warm-up in workers forked from a preloaded master"""
+        startup.ensure_warmup()
     
     # Error handlers
     @app.errorhandler(404)
@@ -73,6 +120,7 @@ def create_app(config_name=None):
         """Close database connection on app context teardown"""
         pass  # MongoDB connection is handled globally
     
+    startup.record_startup_time((time.perf_counter() - started) * 1000)
     return app
 
 
@@ -0,0 +1,62 @@
+"""
+Maintenance commands, run with the Flask CLI:
+
+    flask --app app <command>
+"""
+import click
+from models.pg_listing import PGListing
+from models.join_request import JoinRequest
+from models.stats import ListingStats, OwnerStats
+
+
+@click.command('backfill-owner-summaries')
+@click.option('--batch-size', default=500, show_default=True, help='Owners fetched per query')
+def backfill_owner_summaries(batch_size):
+    """Embed owner name/email snapshots in existing PG listings."""
+    updated = PGListing.backfill_owner_summaries(batch_size=batch_size)
+    click.echo(f"Updated {updated} listings")
+
+
+@click.command('backfill-request-snapshots')
+@click.option('--batch-size', default=500, show_default=True, help='Listings or students fetched per query')
+def backfill_request_snapshots(batch_size):
+    """Store PG and student snapshots on existing join requests."""
+    updated = JoinRequest.backfill_snapshots(batch_size=batch_size)
+    click.echo(f"Updated {updated} join requests")
+
+
+@click.command('backfill-facility-masks')
+@click.option('--batch-size', default=500, show_default=True, help='Listings updated per bulk write')
+def backfill_facility_masks(batch_size):
+    """Store the facility bitmask on existing PG listings."""
+    updated = PGListing.backfill_facility_masks(batch_size=batch_size)
+    click.echo(f"Updated {updated} listings")
+
+
+@click.command('rebuild-counters')
+def rebuild_counters():
+    """Recompute the materialized dashboard counters."""
+    counts = ListingStats.rebuild()
+    click.echo(f"Listing counters: {counts}")
+    owners = OwnerStats.rebuild_all()
+    click.echo(f"Rebuilt stats for {owners} owners")
+
+
+@click.command('archive')
+@click.option('--batch-size', default=None, type=int, help='Documents moved per batch [default: ARCHIVE_BATCH_SIZE]')
+@click.option('--max-batches', default=1000, show_default=True, help='Batches per collection')
+def archive_old_documents(batch_size, max_batches):
+    """Move settled join requests and old rejected listings to the archive."""
+    requests = JoinRequest.archive_settled(batch_size=batch_size, max_batches=max_batches)
+    click.echo(f"Archived {requests} join requests")
+    listings = PGListing.archive_rejected(batch_size=batch_size, max_batches=max_batches)
+    click.echo(f"Archived {listings} listings")
+
+
+def register_commands(app):
+    """Register maintenance commands on the app's CLI"""
+    app.cli.add_command(backfill_owner_summaries)
+    app.cli.add_command(backfill_request_snapshots)
+    app.cli.add_command(backfill_facility_masks)
+    app.cli.add_command(rebuild_counters)
+    app.cli.add_command(archive_old_documents)
@@ -15,6 +15,19 @@ class Config:
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
     DATABASE_NAME = os.getenv('DATABASE_NAME', 'pgfinder_db')
     
+    # MongoDB connection pool (per worker process)
+    MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 50))
+    MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 60000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))
+    
+    # Startup: 'lazy' defers the DB ping and index checks to a background
+    # warm-up so workers accept traffic immediately; 'eager' blocks on them
+    STARTUP_MODE = os.getenv('STARTUP_MODE', 'lazy').lower()
+    STARTUP_BUDGET_MS = int(os.getenv('STARTUP_BUDGET_MS', 2000))
+    WARMUP_RETRY_INTERVAL = float(os.getenv('WARMUP_RETRY_INTERVAL', 1.0))
+    WARMUP_MAX_RETRY_INTERVAL = float(os.getenv('WARMUP_MAX_RETRY_INTERVAL', 30.0))
+    
     # Session configuration
     SESSION_PERMANENT = False
     SESSION_COOKIE_SECURE = os.getenv('SESSION_COOKIE_SECURE', 'False').lower() == 'true'
@@ -28,6 +41,143 @@ class Config:
     # Password requirements
     MIN_PASSWORD_LENGTH = 8
     
+    # Password hashing (werkzeug method string; existing hashes made with
+    # other parameters are upgraded on the user's next login)
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_SALT_LENGTH = int(os.getenv('PASSWORD_SALT_LENGTH', 16))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 8))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 5.0))
+    
+    # Login throttling (token buckets: burst capacity and refill per minute)
+    LOGIN_RATE_LIMIT_ENABLED = os.getenv('LOGIN_RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+    LOGIN_IP_BURST = int(os.getenv('LOGIN_IP_BURST', 20))
+    LOGIN_IP_PER_MINUTE = float(os.getenv('LOGIN_IP_PER_MINUTE', 10))
+    LOGIN_EMAIL_BURST = int(os.getenv('LOGIN_EMAIL_BURST', 5))
+    LOGIN_EMAIL_PER_MINUTE = float(os.getenv('LOGIN_EMAIL_PER_MINUTE', 2))
+    
+    # Number of reverse proxies in front of the app, used to find the client IP
+    TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', 0))
+    
+    # Dashboards: read counts from $inc-maintained counter documents
+    # instead of aggregating on every page load
+    USE_MATERIALIZED_COUNTERS = os.getenv('USE_MATERIALIZED_COUNTERS', 'True').lower() == 'true'
+    ADMIN_PENDING_LIMIT = int(os.getenv('ADMIN_PENDING_LIMIT', 50))
+    DASHBOARD_RECENT_LIMIT = int(os.getenv('DASHBOARD_RECENT_LIMIT', 5))
+    
+    # Per-process cache and cross-worker invalidation bus
+    # (CACHE_BUS_MODE: auto, change_stream, tailable or off)
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1000))
+    CACHE_DEFAULT_TTL = float(os.getenv('CACHE_DEFAULT_TTL', 60))
+    CACHE_BUS_MODE = os.getenv('CACHE_BUS_MODE', 'auto').lower()
+    CACHE_EVENTS_MAX_LAG_MS = int(os.getenv('CACHE_EVENTS_MAX_LAG_MS', 1000))
+    CACHE_EVENTS_SIZE_BYTES = int(os.getenv('CACHE_EVENTS_SIZE_BYTES', 4 * 1024 * 1024))
+    CACHE_EVENTS_MAX_DOCS = int(os.getenv('CACHE_EVENTS_MAX_DOCS', 10000))
+    
+    # Background jobs (post-write side effects). JOB_WORKERS_IN_APP threads
+    # run inside each web worker; set it to 0 and run `python worker.py`
+    # to process jobs in a separate process instead
+    JOB_QUEUE_ENABLED = os.getenv('JOB_QUEUE_ENABLED', 'True').lower() == 'true'
+    JOB_WORKERS_IN_APP = int(os.getenv('JOB_WORKERS_IN_APP', 2))
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1.0))
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 60))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+    JOB_RETRY_BASE_SECONDS = float(os.getenv('JOB_RETRY_BASE_SECONDS', 5))
+    JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', 7 * 24 * 3600))
+    # Jobs recorded with a write but not enqueued by their writer (see the
+    # pending_jobs outbox in models/job_queue.py) are enqueued by a sweep
+    JOB_OUTBOX_SWEEP_SECONDS = float(os.getenv('JOB_OUTBOX_SWEEP_SECONDS', 30))
+    JOB_OUTBOX_GRACE_SECONDS = float(os.getenv('JOB_OUTBOX_GRACE_SECONDS', 30))
+    
+    # Rendered listing card cache and on-disk Jinja bytecode cache. 'auto'
+    # uses Jinja's private per-user directory under the temp dir; a custom
+    # directory must be owned by the app's user and not group/world
+    # writable. An empty string disables it
+    FRAGMENT_CACHE_ENABLED = os.getenv('FRAGMENT_CACHE_ENABLED', 'True').lower() == 'true'
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', 5000))
+    FRAGMENT_CACHE_TTL = int(os.getenv('FRAGMENT_CACHE_TTL', 3600))
+    JINJA_BYTECODE_CACHE_DIR = os.getenv('JINJA_BYTECODE_CACHE_DIR', 'auto')
+    
+    # Per-city rent distribution shown on the search page
+    RENT_STATS_TTL = int(os.getenv('RENT_STATS_TTL', 3600))
+    RENT_HISTOGRAM_BUCKETS = int(os.getenv('RENT_HISTOGRAM_BUCKETS', 10))
+    
+    # Saved searches: per-user limit, and the rent bucket width used to
+    # index searches with a narrow rent range
+    SAVED_SEARCH_MAX_PER_USER = int(os.getenv('SAVED_SEARCH_MAX_PER_USER', 10))
+    SAVED_SEARCH_RENT_BUCKET = float(os.getenv('SAVED_SEARCH_RENT_BUCKET', 2000))
+    
+    # Live availability streams (Server-Sent Events). Streams stay open
+    # only under a cooperative or threaded worker; sync workers send one
+    # snapshot and ask the browser to reconnect after SSE_POLL_RETRY_MS
+    SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+    SSE_MAX_STREAM_SECONDS = int(os.getenv('SSE_MAX_STREAM_SECONDS', 300))
+    SSE_MAX_LISTINGS = int(os.getenv('SSE_MAX_LISTINGS', 50))
+    SSE_RETRY_MS = int(os.getenv('SSE_RETRY_MS', 3000))
+    SSE_POLL_RETRY_MS = int(os.getenv('SSE_POLL_RETRY_MS', 15000))
+    
+    # Archival of finished documents: join requests approved or rejected,
+    # and listings rejected, more than N days ago move to archive
+    # collections. Each run moves at most ARCHIVE_MAX_BATCHES batches so it
+    # finishes within the job lease
+    ARCHIVE_ENABLED = os.getenv('ARCHIVE_ENABLED', 'True').lower() == 'true'
+    ARCHIVE_REQUESTS_AFTER_DAYS = int(os.getenv('ARCHIVE_REQUESTS_AFTER_DAYS', 90))
+    ARCHIVE_LISTINGS_AFTER_DAYS = int(os.getenv('ARCHIVE_LISTINGS_AFTER_DAYS', 90))
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 500))
+    ARCHIVE_MAX_BATCHES = int(os.getenv('ARCHIVE_MAX_BATCHES', 20))
+    ARCHIVE_BATCH_PAUSE = float(os.getenv('ARCHIVE_BATCH_PAUSE', 0.1))
+    ARCHIVE_INTERVAL_SECONDS = int(os.getenv('ARCHIVE_INTERVAL_SECONDS', 24 * 3600))
+    
+    # Read circuit breaker: opens after BREAKER_FAILURE_THRESHOLD
+    # consecutive database failures and probes again after
+    # BREAKER_RESET_SECONDS; meanwhile pages serve the last good results,
+    # kept up to BREAKER_STALE_TTL seconds (results of more than
+    # BREAKER_STALE_MAX_ITEMS documents are not kept)
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))
+    BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', 10))
+    BREAKER_STALE_TTL = int(os.getenv('BREAKER_STALE_TTL', 3600))
+    BREAKER_STALE_MAX_ENTRIES = int(os.getenv('BREAKER_STALE_MAX_ENTRIES', 1000))
+    BREAKER_STALE_MAX_ITEMS = int(os.getenv('BREAKER_STALE_MAX_ITEMS', 100))
+    
+    # Per-request deadline for database work in GET and HEAD requests,
+    # overridden per endpoint by REQUEST_DEADLINES ('endpoint=seconds' or
+    # 'blueprint.*=seconds', 0 for none; live streams have none since they
+    # stay open by design). Requests that write have no deadline
+    REQUEST_DEADLINE_SECONDS = float(os.getenv('REQUEST_DEADLINE_SECONDS', 5))
+    REQUEST_DEADLINES = os.getenv(
+        'REQUEST_DEADLINES',
+        'pg.search=3,api.search_pgs=3,pg.autocomplete_api=1,admin.*=15,'
+        'pg.availability_stream=0,requests.received_stream=0'
+    )
+    
+    # Admission control: requests in flight per worker for each route class
+    # (ADMISSION_CLASSES maps 'endpoint' or 'blueprint.*' to a class).
+    # Excess requests wait up to ADMISSION_QUEUE_TIMEOUT seconds, then get a
+    # 503; signed-in owners and admins go first and wait longer
+    ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'True').lower() == 'true'
+    ADMISSION_CLASSES = os.getenv(
+        'ADMISSION_CLASSES',
+        'pg.search=search,api.search_pgs=search,pg.rent_stats_api=search,'
+        'main.dashboard=dashboard,dashboard=dashboard,pg.my_listings=dashboard,'
+        'requests.received=dashboard,requests.my_requests=dashboard,'
+        'saved_searches.index=dashboard,admin.*=admin'
+    )
+    ADMISSION_LIMITS = os.getenv('ADMISSION_LIMITS', 'search=16,dashboard=16,admin=4')
+    ADMISSION_QUEUE_SIZE = int(os.getenv('ADMISSION_QUEUE_SIZE', 32))
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 0.5))
+    ADMISSION_PRIORITY_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_PRIORITY_QUEUE_TIMEOUT', 2.0))
+    ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 2))
+    
+    # Bearer token for /metrics (admins can always read it; with no token
+    # set, only admins can)
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    
+    # Seconds between retries of a failed autocomplete index build
+    AUTOCOMPLETE_RETRY_SECONDS = float(os.getenv('AUTOCOMPLETE_RETRY_SECONDS', 30))
+    
+    # Listings returned by a relevance-ranked search
+    SEARCH_TOP_K = int(os.getenv('SEARCH_TOP_K', 50))
+    
     # Application settings
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
     PORT = int(os.getenv('PORT', 8000))
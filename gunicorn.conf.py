@@ -0,0 +1,35 @@
+"""
+Gunicorn configuration for PGFinder.
+Manages the per-worker MongoDB client lifecycle.
+
+Workers default to gevent so that idle Server-Sent Events streams (live
+room availability) cost a greenlet rather than a whole worker. Set
+GUNICORN_WORKER_CLASS=sync to opt out; streams then fall back to
+polling (see utils/streams.py).
+
+Nothing from the application is imported at module level: gunicorn loads
+this file, and runs post_fork, before the gevent worker patches the
+standard library, and pymongo imported then would keep unpatched threads
+and locks.
+"""
+import os
+import sys
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+
+def post_fork(server, worker):
+    """Drop any MongoDB client inherited from the master process"""
+    # Only a preloaded app has one; importing the module here would load
+    # pymongo ahead of the patch
+    database = sys.modules.get('models.database')
+    if database is not None:
+        database.reset_after_fork()
+
+
+def worker_exit(server, worker):
+    """Log pool metrics and close the worker's MongoDB client"""
+    from models import database
+    server.log.info(f"MongoDB pool metrics for worker {worker.pid}: {database.get_pool_metrics()}")
+    database.close_connection()
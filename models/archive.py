@@ -0,0 +1,165 @@
+"""
+Hot/cold archival of finished documents.
+
+Documents that reached a terminal status long ago (settled join requests,
+rejected listings) are moved to '<collection>_archive' in batches, which
+keeps the hot collections and their indexes small. Finders leave the
+archive out unless a user asks for history (include_archived=True), in
+which case archived documents come back flagged with archived=True.
+
+Archival runs as the 'archive.run' job, which reschedules itself every
+ARCHIVE_INTERVAL_SECONDS, or on demand with `flask --app app archive`.
+"""
+import logging
+import time
+from datetime import datetime
+from pymongo import ReplaceOne
+from models.database import get_collection
+from models.job_queue import JobQueue
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIX = '_archive'
+
+
+def archive_name(collection_name):
+    """Get the archive collection name of a hot collection"""
+    return collection_name + ARCHIVE_SUFFIX
+
+
+def move_batch(collection_name, query, batch_size):
+    """
+    Move up to batch_size documents matching a query to the archive.
+
+    The batch is copied first, with one upsert per document so a retried
+    batch copies again harmlessly, then deleted from the hot collection
+    with the same query, so a document that changed in between stays hot.
+
+    Args:
+        collection_name: Hot collection name
+        query: Filter selecting archivable documents
+        batch_size: Maximum documents to move
+
+    Returns:
+        List of the documents moved
+    """
+    hot = get_collection(collection_name)
+    docs = list(hot.find(query).limit(batch_size))
+    if not docs:
+        return []
+
+    now = datetime.utcnow()
+    get_collection(archive_name(collection_name)).bulk_write(
+        [ReplaceOne({'_id': doc['_id']}, {**doc, 'archived_at': now}, upsert=True) for doc in docs],
+        ordered=False
+    )
+    ids = [doc['_id'] for doc in docs]
+    hot.delete_many({'$and': [query, {'_id': {'$in': ids}}]})
+    still_hot = set(hot.distinct('_id', {'_id': {'$in': ids}}))
+    return [doc for doc in docs if doc['_id'] not in still_hot]
+
+
+def move_all(collection_name, query, batch_size=None, max_batches=None, on_moved=None):
+    """
+    Move matching documents to the archive batch by batch.
+
+    Args:
+        collection_name: Hot collection name
+        query: Filter selecting archivable documents
+        batch_size: Documents per batch (default ARCHIVE_BATCH_SIZE)
+        max_batches: Stop after this many batches (default ARCHIVE_MAX_BATCHES)
+        on_moved: Optional callback taking each batch of moved documents
+
+    Returns:
+        Number of documents moved
+    """
+    batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+    max_batches = max_batches or Config.ARCHIVE_MAX_BATCHES
+    moved = 0
+    for _ in range(max_batches):
+        batch = move_batch(collection_name, query, batch_size)
+        if not batch:
+            break
+        moved += len(batch)
+        if on_moved:
+            on_moved(batch)
+        if len(batch) < batch_size:
+            break
+        # Let foreground queries in between batches
+        time.sleep(Config.ARCHIVE_BATCH_PAUSE)
+    if moved:
+        logger.info(f"Archived {moved} documents from {collection_name}")
+    return moved
+
+
+def find_with_archive(collection_name, query, projection=None, sort=('created_at', -1), limit=None):
+    """
+    Find documents in a hot collection and its archive.
+
+    A document copied to the archive but changed before it could be
+    deleted is in both; the hot copy wins.
+
+    Args:
+        collection_name: Hot collection name
+        query: Filter document
+        projection: Projection document or None
+        sort: (field, direction) to merge the results by
+        limit: Maximum number of documents
+
+    Returns:
+        List of documents; archived ones have archived=True
+    """
+    field, direction = sort
+    results = {}
+    for name, archived in ((archive_name(collection_name), True), (collection_name, False)):
+        cursor = get_collection(name).find(query, projection).sort(field, direction)
+        if limit:
+            cursor = cursor.limit(limit)
+        for doc in cursor:
+            if archived:
+                doc['archived'] = True
+            results[doc['_id']] = doc
+    docs = sorted(results.values(), key=lambda doc: doc.get(field) or datetime.min, reverse=direction < 0)
+    return docs[:limit] if limit else docs
+
+
+def run():
+    """
+    Archive everything past its age limit.
+
+    Returns:
+        Dictionary of collection name -> documents moved
+    """
+    from models.join_request import JoinRequest
+    from models.pg_listing import PGListing
+    return {
+        'join_requests': JoinRequest.archive_settled(),
+        'pg_listings': PGListing.archive_rejected(),
+    }
+
+
+@JobQueue.handler('archive.run')
+def _archive_job(slot):
+    run()
+    schedule(slot + 1)
+
+
+def schedule(slot=None):
+    """
+    Enqueue the archival job for an interval slot.
+
+    The idempotency key is the slot number, so every worker can call this
+    at startup and the job still runs once per ARCHIVE_INTERVAL_SECONDS.
+    """
+    if not Config.ARCHIVE_ENABLED or not Config.JOB_QUEUE_ENABLED:
+        return None
+    now = time.time()
+    if slot is None:
+        slot = int(now // Config.ARCHIVE_INTERVAL_SECONDS)
+    return JobQueue.enqueue(
+        'archive.run',
+        {'slot': slot},
+        idempotency_key=f"archive:{slot}",
+        delay=max(0, slot * Config.ARCHIVE_INTERVAL_SECONDS - now)
+    )
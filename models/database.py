@@ -1,108 +1,413 @@
 """
 Database connection and management module.
 Handles MongoDB connection with proper error handling and retries.
+
+The MongoClient is owned by a single process. Gunicorn forks workers from
+the master after importing the app, and a client (with its sockets and
+monitor threads) must never be shared across a fork, so the client is
+tagged with the PID that created it and discarded in the child after fork.
 """
 import logging
 import os
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+import threading
+import time
+from pymongo import MongoClient, monitoring, ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError, OperationFailure
 from config import Config
 
 logger = logging.getLogger(__name__)
 
-# Global database connection
+# Per-process database connection
 _client = None
 _db = None
+_client_pid = None
+_lock = threading.Lock()
+
+# Indexes backing the model queries, created during startup warm-up
+INDEXES = {
+    'users': [
+        ([('email', ASCENDING)], {'unique': True}),
+        # Job outbox sweep (models/job_queue.py)
+        ([('pending_jobs.created_at', ASCENDING)], {'sparse': True}),
+    ],
+    'pg_listings': [
+        ([('status', ASCENDING), ('available_rooms', ASCENDING), ('created_at', DESCENDING)], {}),
+        ([('status', ASCENDING), ('created_at', DESCENDING)], {}),
+        # Facility filters test the bitmask on index keys, not documents
+        ([('status', ASCENDING), ('available_rooms', ASCENDING), ('facilities_mask', ASCENDING)], {}),
+        ([('owner_id', ASCENDING), ('created_at', DESCENDING)], {}),
+        ([('status', ASCENDING), ('updated_at', ASCENDING)], {}),
+        ([('pending_jobs.created_at', ASCENDING)], {'sparse': True}),
+    ],
+    'pg_listings_archive': [
+        ([('owner_id', ASCENDING), ('created_at', DESCENDING)], {}),
+    ],
+    'join_requests': [
+        ([('student_id', ASCENDING), ('created_at', DESCENDING)], {}),
+        ([('pg_owner_id', ASCENDING), ('created_at', DESCENDING)], {}),
+        ([('pg_owner_id', ASCENDING), ('updated_at', ASCENDING)], {}),
+        ([('pg_id', ASCENDING), ('created_at', DESCENDING)], {}),
+        ([('student_id', ASCENDING), ('pg_id', ASCENDING), ('status', ASCENDING)], {}),
+        ([('status', ASCENDING), ('updated_at', ASCENDING)], {}),
+        ([('pending_jobs.created_at', ASCENDING)], {'sparse': True}),
+    ],
+    'join_requests_archive': [
+        ([('student_id', ASCENDING), ('created_at', DESCENDING)], {}),
+        ([('pg_owner_id', ASCENDING), ('created_at', DESCENDING)], {}),
+    ],
+    'saved_searches': [
+        ([('index_key', ASCENDING)], {}),
+        ([('user_id', ASCENDING), ('created_at', DESCENDING)], {}),
+    ],
+    'search_feed': [
+        ([('search_id', ASCENDING), ('pg_id', ASCENDING)], {'unique': True}),
+        ([('user_id', ASCENDING), ('created_at', DESCENDING)], {}),
+    ],
+    'jobs': [
+        ([('status', ASCENDING), ('run_at', ASCENDING)], {}),
+        ([('status', ASCENDING), ('locked_until', ASCENDING)], {}),
+        ([('idempotency_key', ASCENDING)], {
+            'unique': True,
+            'partialFilterExpression': {'idempotency_key': {'$type': 'string'}}
+        }),
+        ([('completed_at', ASCENDING)], {'expireAfterSeconds': Config.JOB_RETENTION_SECONDS}),
+    ],
+}
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Connection pool listener that records checkout statistics.
+
+    Listener callbacks run synchronously on the thread performing the
+    checkout, so wait times are measured with a thread-local start time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self, after_fork=False):
+        """
+        Reset all counters.
+
+        Args:
+            after_fork: Also replace the lock, which may have been held by
+                another thread of the parent at fork time
+        """
+        if after_fork:
+            self._lock = threading.Lock()
+            self._local = threading.local()
+        with self._lock:
+            self.checkouts_started = 0
+            self.checkouts_succeeded = 0
+            self.checkouts_failed = 0
+            self.checkout_failures_by_reason = {}
+            self.checked_in = 0
+            self.in_use = 0
+            self.max_in_use = 0
+            self.total_wait_ms = 0.0
+            self.max_wait_ms = 0.0
+            self.connections_created = 0
+            self.connections_closed = 0
+            self.pool_clears = 0
+
+    def _record_wait(self):
+        started = getattr(self._local, 'started', None)
+        self._local.started = None
+        if started is None:
+            return 0.0
+        return (time.perf_counter() - started) * 1000
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+        with self._lock:
+            self.checkouts_started += 1
+
+    def connection_checked_out(self, event):
+        wait_ms = self._record_wait()
+        with self._lock:
+            self.checkouts_succeeded += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def connection_check_out_failed(self, event):
+        wait_ms = self._record_wait()
+        reason = str(event.reason)
+        with self._lock:
+            self.checkouts_failed += 1
+            self.checkout_failures_by_reason[reason] = self.checkout_failures_by_reason.get(reason, 0) + 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        logger.warning(f"MongoDB pool checkout failed ({reason}) after {wait_ms:.1f}ms")
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_in += 1
+            self.in_use = max(0, self.in_use - 1)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+            self.in_use = 0
+
+    def pool_closed(self, event):
+        pass
+
+    def snapshot(self):
+        """
+        Get a point-in-time copy of the pool statistics.
+
+        Returns:
+            Dictionary of counters for this process
+        """
+        with self._lock:
+            succeeded = self.checkouts_succeeded
+            return {
+                'pid': os.getpid(),
+                'checkouts_started': self.checkouts_started,
+                'checkouts_succeeded': succeeded,
+                'checkouts_failed': self.checkouts_failed,
+                'checkout_failures_by_reason': dict(self.checkout_failures_by_reason),
+                'checked_in': self.checked_in,
+                'in_use': self.in_use,
+                'max_in_use': self.max_in_use,
+                'avg_wait_ms': round(self.total_wait_ms / succeeded, 3) if succeeded else 0.0,
+                'max_wait_ms': round(self.max_wait_ms, 3),
+                'connections_created': self.connections_created,
+                'connections_closed': self.connections_closed,
+                'pool_clears': self.pool_clears,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+def _client_options():
+    """Build MongoClient keyword arguments from configuration"""
+    # Handle SSL certificate issues using certifi
+    import certifi
+
+    client_options = {
+        'serverSelectionTimeoutMS': 10000,
+        'connectTimeoutMS': 20000,
+        'socketTimeoutMS': 30000,
+        'retryWrites': True,
+        'tls': True,
+        'tlsCAFile': certifi.where(),  # Explicitly use certifi CA bundle
+        'connect': False,  # Lazy connection; sockets are opened on first use in the worker
+        'maxPoolSize': Config.MONGO_MAX_POOL_SIZE,
+        'minPoolSize': Config.MONGO_MIN_POOL_SIZE,
+        'maxIdleTimeMS': Config.MONGO_MAX_IDLE_TIME_MS,
+        'waitQueueTimeoutMS': Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        'event_listeners': [pool_metrics],
+    }
+
+    # Allow disabling SSL verification via environment variable (Escape hatch for Render)
+    if os.getenv('MONGO_TLS_DISABLE', 'false').lower() == 'true':
+        logger.warning("MongoDB TLS verification disabled by environment variable.")
+        client_options['tlsAllowInvalidCertificates'] = True
+        # When disabling verification, we might need to relax hostname check too
+        client_options['tlsAllowInvalidHostnames'] = True
+
+    logger.info(f"Connecting to MongoDB using certifi at: {certifi.where()}")
+    return client_options
 
 
 def get_db():
     """
     Get database instance.
     Creates connection if not already established.
-    
+
     Returns:
         Database instance
-        
+
     Raises:
         ConnectionFailure: If unable to connect to MongoDB
     """
     global _db
-    if _db is None:
-        _client = get_client()
-        _db = _client[Config.DATABASE_NAME]
-    return _db
+    client = get_client()
+    db = _db
+    if db is None or db.client is not client:
+        db = client[Config.DATABASE_NAME]
+        _db = db
+    return db
 
 
 def get_client():
     """
-    Get MongoDB client instance.
-    Creates connection if not already established.
-    
+    Get MongoDB client instance for the current process.
+    Creates the client if not already established, or if the existing
+    client was inherited from a parent process through fork.
+
+    The client is created with connect=False, so this call never blocks on
+    the network; use ping() to verify connectivity.
+
     Returns:
         MongoClient instance
-        
+
     Raises:
-        ConnectionFailure: If unable to connect to MongoDB
+        ConnectionFailure: If the client cannot be configured
     """
-    global _client
-    if _client is None:
-        try:
-            # Handle SSL certificate issues using certifi
-            import certifi
-            
-            client_options = {
-                'serverSelectionTimeoutMS': 10000,
-                'connectTimeoutMS': 20000,
-                'socketTimeoutMS': 30000,
-                'retryWrites': True,
-                'tls': True,
-                'tlsCAFile': certifi.where(),  # Explicitly use certifi CA bundle
-                'connect': False  # Lazy connection to handle Gunicorn forking safely
-            }
-            
-            # Allow disabling SSL verification via environment variable (Escape hatch for Render)
-            if os.getenv('MONGO_TLS_DISABLE', 'false').lower() == 'true':
-                logger.warning("MongoDB TLS verification disabled by environment variable.")
-                client_options['tlsAllowInvalidCertificates'] = True
-                # When disabling verification, we might need to relax hostname check too
-                client_options['tlsAllowInvalidHostnames'] = True
-            
-            logger.info(f"Connecting to MongoDB using certifi at: {certifi.where()}")
-            
-            _client = MongoClient(Config.MONGO_URI, **client_options)
-            
-            # Test the connection
-            _client.admin.command('ping')
-            logger.info("Successfully connected to MongoDB")
-        except (ConnectionFailure, ServerSelectionTimeoutError) as e:
-            logger.error(f"Failed to connect to MongoDB: {e}")
-            raise ConnectionFailure(f"Unable to connect to MongoDB: {e}")
-        except ImportError:
-            logger.error("certifi module not found. Please add certifi to requirements.txt")
-            raise
-    return _client
+    global _client, _db, _client_pid
+    pid = os.getpid()
+    client = _client
+    if client is not None and _client_pid == pid:
+        return client
+
+    with _lock:
+        if _client is not None and _client_pid != pid:
+            # Inherited across fork without the at-fork hook running
+            logger.warning(f"Discarding MongoDB client inherited from PID {_client_pid}")
+            _client = None
+            _db = None
+        if _client is None:
+            try:
+                _client = MongoClient(Config.MONGO_URI, **_client_options())
+                _client_pid = pid
+                logger.info(f"MongoDB client created for PID {pid} "
+                            f"(maxPoolSize={Config.MONGO_MAX_POOL_SIZE}, "
+                            f"minPoolSize={Config.MONGO_MIN_POOL_SIZE})")
+            except ImportError:
+                logger.error("certifi module not found. Please add certifi to requirements.txt")
+                raise
+            except Exception as e:
+                logger.error(f"Failed to create MongoDB client: {e}")
+                raise ConnectionFailure(f"Unable to connect to MongoDB: {e}")
+        return _client
+
+
+def ping():
+    """
+    Verify connectivity to MongoDB.
+
+    Raises:
+        ConnectionFailure: If the server cannot be reached
+    """
+    try:
+        get_client().admin.command('ping')
+    except (ConnectionFailure, ServerSelectionTimeoutError) as e:
+        logger.error(f"Failed to connect to MongoDB: {e}")
+        raise ConnectionFailure(f"Unable to connect to MongoDB: {e}")
+
+
+def ensure_indexes():
+    """
+    Create any missing indexes listed in INDEXES.
+
+    create_index is a no-op for indexes that already exist. A conflicting
+    index (e.g. duplicate emails preventing a unique index) is logged and
+    skipped rather than failing startup.
+
+    Returns:
+        Number of index specifications checked
+    """
+    db = get_db()
+    checked = 0
+    for collection_name, specs in INDEXES.items():
+        for keys, options in specs:
+            try:
+                db[collection_name].create_index(keys, **options)
+            except OperationFailure as e:
+                logger.error(f"Could not create index {keys} on {collection_name}: {e}")
+            checked += 1
+    logger.info(f"Checked {checked} indexes")
+    return checked
+
+
+def reset_after_fork():
+    """
+    Drop the client inherited from the parent process.
+
+    The parent's client is not closed here: its sockets are shared with the
+    parent and closing them from the child would break the parent. The next
+    get_client() call in the child creates a fresh client and pool.
+    """
+    global _client, _db, _client_pid, _lock
+    _client = None
+    _db = None
+    _client_pid = None
+    _lock = threading.Lock()
+    pool_metrics.reset(after_fork=True)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_after_fork)
+
+
+def get_pool_metrics():
+    """
+    Get connection pool checkout metrics for this process.
+
+    Returns:
+        Dictionary of pool statistics
+    """
+    return pool_metrics.snapshot()
 
 
 def close_connection():
     """Close MongoDB connection"""
-    global _client, _db
-    if _client:
-        _client.close()
+    global _client, _db, _client_pid
+    with _lock:
+        if _client and _client_pid == os.getpid():
+            _client.close()
+            logger.info("MongoDB connection closed")
         _client = None
         _db = None
-        logger.info("MongoDB connection closed")
+        _client_pid = None
 
 
 def get_collection(collection_name):
     """
     Get a collection from the database.
-    
+
     Args:
         collection_name: Name of the collection
-        
+
     Returns:
         Collection instance
     """
     db = get_db()
     return db[collection_name]
 
+
+def resolve_projection(profiles, projection):
+    """
+    Resolve a named projection profile.
+
+    Args:
+        profiles: Dictionary of profile name -> projection document
+        projection: Profile name, projection document, or None for all fields
+
+    Returns:
+        Projection document or None
+
+    Raises:
+        ValueError: If the profile name is unknown
+    """
+    if projection is None or isinstance(projection, dict):
+        return projection
+    try:
+        return profiles[projection]
+    except KeyError:
+        raise ValueError(f"Unknown projection profile '{projection}'") from None
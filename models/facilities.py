@@ -0,0 +1,73 @@
+"""
+Canonical facility registry.
+
+Each facility has a fixed bit position, so a listing's facilities can be
+stored as a single integer (facilities_mask) and a multi-facility filter
+becomes one $bitsAllSet test. Positions are stable: only append new
+facilities to FACILITIES, never reorder or remove them.
+"""
+
+# Index in this tuple is the facility's bit position
+FACILITIES = (
+    'WiFi', 'AC', 'Food', 'Laundry', 'Power Backup', 'Security',
+    'Parking', 'Gym', 'TV', 'Refrigerator', 'Washing Machine',
+    'Geyser', 'Housekeeping', 'Study Table', 'Cupboard',
+)
+
+_BITS = {name.casefold(): bit for bit, name in enumerate(FACILITIES)}
+
+
+def canonical(name):
+    """
+    Get the registry spelling of a facility.
+
+    Returns:
+        Canonical name, or None if the facility is not registered
+    """
+    bit = _BITS.get(name.strip().casefold()) if isinstance(name, str) else None
+    return FACILITIES[bit] if bit is not None else None
+
+
+def normalize(facilities):
+    """
+    Clean a facility list: registered names get their canonical spelling,
+    others are kept as typed, and duplicates are dropped.
+    """
+    result = []
+    seen = set()
+    for name in facilities or []:
+        if not isinstance(name, str) or not name.strip():
+            continue
+        name = canonical(name) or name.strip()
+        if name.casefold() not in seen:
+            seen.add(name.casefold())
+            result.append(name)
+    return result
+
+
+def split(facilities):
+    """
+    Split facilities into a bitmask of registered ones and a list of the rest.
+
+    Returns:
+        Tuple of (mask, unregistered names)
+    """
+    mask = 0
+    unregistered = []
+    for name in normalize(facilities):
+        bit = _BITS.get(name.casefold())
+        if bit is None:
+            unregistered.append(name)
+        else:
+            mask |= 1 << bit
+    return mask, unregistered
+
+
+def to_mask(facilities):
+    """Get the bitmask of the registered facilities in a list"""
+    return split(facilities)[0]
+
+
+def from_mask(mask):
+    """Get the registered facility names set in a bitmask"""
+    return [name for bit, name in enumerate(FACILITIES) if mask & (1 << bit)]
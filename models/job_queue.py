@@ -0,0 +1,375 @@
+"""
+Durable background job queue backed by the `jobs` collection.
+
+Request handlers commit their primary write and enqueue follow-up work
+(room reservations, snapshot fan-out) instead of doing it inline. Jobs are
+claimed with a lease, so a job whose worker dies is picked up again once
+the lease expires: delivery is at-least-once and handlers must be
+idempotent. An idempotency key makes enqueueing the same work twice a
+no-op.
+
+So that a failure between the write and the enqueue cannot lose a job,
+the write itself records the job in the document's `pending_jobs` outbox
+(outbox_entry()). The writer then enqueues it and removes it
+(flush_outbox()). Whatever a failed or interrupted flush leaves behind is
+enqueued by the workers' outbox sweep (sweep_outboxes()).
+
+Workers run as threads inside the web app (JOB_WORKERS_IN_APP) or in a
+separate process (python worker.py).
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from models.database import get_collection
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """Job queue operations"""
+
+    _handlers = {}
+    _outboxes = []
+    _wakeup = threading.Event()
+
+    @staticmethod
+    def handler(name):
+        """
+        Register a function as the handler for a job name.
+
+        Usage:
+            @JobQueue.handler('pg.reserve_room')
+            def reserve_room(pg_id, request_id):
+                ...
+        """
+        def decorator(fn):
+            JobQueue._handlers[name] = fn
+            return fn
+        return decorator
+
+    @staticmethod
+    def register_outbox(collection_name):
+        """Register a collection whose documents may hold pending_jobs"""
+        if collection_name not in JobQueue._outboxes:
+            JobQueue._outboxes.append(collection_name)
+
+    @staticmethod
+    def outbox_entry(name, payload, idempotency_key):
+        """
+        Build a pending job to $push to a document's pending_jobs in the
+        write that makes the job necessary.
+
+        Args:
+            name: Registered handler name
+            payload: Keyword arguments for the handler
+            idempotency_key: Required, so the flush and the sweep cannot
+                both create the job
+
+        Returns:
+            Outbox entry dictionary
+        """
+        if name not in JobQueue._handlers:
+            raise ValueError(f"No handler registered for job '{name}'")
+        return {
+            'name': name,
+            'payload': payload or {},
+            'idempotency_key': idempotency_key,
+            'created_at': datetime.utcnow()
+        }
+
+    @staticmethod
+    def flush_outbox(collection_name, doc_id, entries):
+        """
+        Enqueue pending jobs recorded on a document and remove them from it.
+
+        Errors are logged, not raised: the write that recorded the jobs has
+        committed, and the outbox sweep enqueues whatever is left.
+
+        Returns:
+            Number of entries enqueued
+        """
+        flushed = 0
+        for entry in entries:
+            try:
+                JobQueue.enqueue(entry['name'], entry['payload'], idempotency_key=entry['idempotency_key'])
+                JobQueue.drop_outbox(collection_name, doc_id, [entry])
+                flushed += 1
+            except Exception as e:
+                logger.warning(f"Job {entry['name']} left in {collection_name} {doc_id} outbox: {e}")
+        return flushed
+
+    @staticmethod
+    def drop_outbox(collection_name, doc_id, entries):
+        """Remove pending jobs from a document without enqueueing them"""
+        if entries:
+            get_collection(collection_name).update_one(
+                {'_id': doc_id},
+                {'$pull': {'pending_jobs': {'idempotency_key': {'$in': [e['idempotency_key'] for e in entries]}}}}
+            )
+
+    @staticmethod
+    def sweep_outboxes(grace_seconds=None, limit=100):
+        """
+        Enqueue pending jobs whose writer did not flush them.
+
+        Args:
+            grace_seconds: Only sweep entries older than this, leaving
+                writers time to flush their own (default JOB_OUTBOX_GRACE_SECONDS)
+            limit: Maximum documents per collection
+
+        Returns:
+            Number of entries enqueued
+        """
+        grace = grace_seconds if grace_seconds is not None else Config.JOB_OUTBOX_GRACE_SECONDS
+        cutoff = datetime.utcnow() - timedelta(seconds=grace)
+        flushed = 0
+        for collection_name in JobQueue._outboxes:
+            docs = get_collection(collection_name).find(
+                {'pending_jobs.created_at': {'$lte': cutoff}}, {'pending_jobs': 1}
+            ).limit(limit)
+            for doc in docs:
+                stale = [e for e in doc['pending_jobs'] if e['created_at'] <= cutoff]
+                flushed += JobQueue.flush_outbox(collection_name, doc['_id'], stale)
+        if flushed:
+            logger.info(f"Outbox sweep enqueued {flushed} jobs")
+        return flushed
+
+    @staticmethod
+    def enqueue(name, payload=None, idempotency_key=None, delay=0, max_attempts=None):
+        """
+        Add a job to the queue.
+
+        When the queue is disabled the handler runs inline instead.
+
+        Args:
+            name: Registered handler name
+            payload: Keyword arguments for the handler (BSON-serializable)
+            idempotency_key: Optional key; a second job with the same key
+                is not created
+            delay: Seconds to wait before the job becomes runnable
+            max_attempts: Attempts before the job is marked failed
+
+        Returns:
+            Job document (the existing one for a duplicate key), or None
+            if the handler ran inline
+        """
+        if name not in JobQueue._handlers:
+            raise ValueError(f"No handler registered for job '{name}'")
+        payload = payload or {}
+
+        if not Config.JOB_QUEUE_ENABLED:
+            JobQueue._handlers[name](**payload)
+            return None
+
+        jobs_collection = get_collection('jobs')
+        now = datetime.utcnow()
+        job = {
+            'name': name,
+            'payload': payload,
+            'status': 'queued',  # queued, running, done, failed
+            'attempts': 0,
+            'max_attempts': max_attempts or Config.JOB_MAX_ATTEMPTS,
+            'run_at': now + timedelta(seconds=delay),
+            'created_at': now,
+            'updated_at': now
+        }
+        if idempotency_key:
+            job['idempotency_key'] = idempotency_key
+
+        try:
+            jobs_collection.insert_one(job)
+        except DuplicateKeyError:
+            logger.info(f"Job {name} with key {idempotency_key} already enqueued")
+            return jobs_collection.find_one({'idempotency_key': idempotency_key})
+        JobQueue._wakeup.set()
+        return job
+
+    @staticmethod
+    def claim(worker_id):
+        """
+        Claim the next runnable job.
+
+        A job is runnable when it is queued and due, or when it is running
+        but its lease has expired (its worker died).
+
+        Args:
+            worker_id: Identifier of the claiming worker
+
+        Returns:
+            Claimed job document, None if there is nothing to run
+        """
+        jobs_collection = get_collection('jobs')
+        now = datetime.utcnow()
+        return jobs_collection.find_one_and_update(
+            {'$or': [
+                {'status': 'queued', 'run_at': {'$lte': now}},
+                {'status': 'running', 'locked_until': {'$lt': now}},
+            ]},
+            {
+                '$set': {
+                    'status': 'running',
+                    'locked_by': worker_id,
+                    'locked_until': now + timedelta(seconds=Config.JOB_LEASE_SECONDS),
+                    'updated_at': now
+                },
+                '$inc': {'attempts': 1}
+            },
+            sort=[('run_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def complete(job, worker_id):
+        """Mark a claimed job as done"""
+        now = datetime.utcnow()
+        get_collection('jobs').update_one(
+            {'_id': job['_id'], 'locked_by': worker_id},
+            {'$set': {'status': 'done', 'completed_at': now, 'updated_at': now},
+             '$unset': {'locked_until': ''}}
+        )
+
+    @staticmethod
+    def fail(job, worker_id, error):
+        """
+        Record a failed attempt, scheduling a retry with exponential backoff
+        or marking the job failed once it is out of attempts.
+        """
+        now = datetime.utcnow()
+        update = {'last_error': str(error)[:1000], 'updated_at': now}
+        if job['attempts'] >= job.get('max_attempts', Config.JOB_MAX_ATTEMPTS):
+            update['status'] = 'failed'
+            # Failed jobs expire through the completed_at TTL index too
+            update['completed_at'] = now
+            logger.error(f"Job {job['name']} {job['_id']} failed permanently: {error}")
+        else:
+            backoff = Config.JOB_RETRY_BASE_SECONDS * (2 ** (job['attempts'] - 1))
+            update['status'] = 'queued'
+            update['run_at'] = now + timedelta(seconds=backoff)
+            logger.warning(f"Job {job['name']} {job['_id']} attempt {job['attempts']} failed, "
+                           f"retrying in {backoff}s: {error}")
+        get_collection('jobs').update_one(
+            {'_id': job['_id'], 'locked_by': worker_id},
+            {'$set': update, '$unset': {'locked_until': ''}}
+        )
+
+    @staticmethod
+    def run(job, worker_id):
+        """
+        Execute a claimed job and record the outcome.
+
+        Returns:
+            True if the handler succeeded
+        """
+        handler = JobQueue._handlers.get(job['name'])
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job '{job['name']}'")
+            handler(**job.get('payload', {}))
+        except Exception as e:
+            JobQueue.fail(job, worker_id, e)
+            return False
+        JobQueue.complete(job, worker_id)
+        return True
+
+    @staticmethod
+    def counts():
+        """Get the number of jobs per status"""
+        return {row['_id']: row['count'] for row in get_collection('jobs').aggregate([
+            {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+        ])}
+
+
+class JobWorker:
+    """Pool of threads that claim and run jobs"""
+
+    def __init__(self, threads=None, poll_interval=None):
+        self.threads = threads if threads is not None else Config.JOB_WORKERS_IN_APP
+        self.poll_interval = poll_interval if poll_interval is not None else Config.JOB_POLL_INTERVAL
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._threads = []
+        self._sweep_lock = threading.Lock()
+        self._next_sweep = 0
+        self.processed = 0
+        self.failed = 0
+
+    def _maybe_sweep(self):
+        """Sweep the outboxes every JOB_OUTBOX_SWEEP_SECONDS, from one thread at a time"""
+        now = time.monotonic()
+        with self._sweep_lock:
+            if now < self._next_sweep:
+                return
+            self._next_sweep = now + Config.JOB_OUTBOX_SWEEP_SECONDS
+        try:
+            JobQueue.sweep_outboxes()
+        except Exception as e:
+            logger.warning(f"Outbox sweep failed: {e}")
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._maybe_sweep()
+            try:
+                job = JobQueue.claim(self.worker_id)
+            except Exception as e:
+                logger.warning(f"Job claim failed: {e}")
+                job = None
+            if job is None:
+                # Woken early when this process enqueues a job
+                JobQueue._wakeup.wait(self.poll_interval)
+                JobQueue._wakeup.clear()
+                continue
+            if JobQueue.run(job, self.worker_id):
+                self.processed += 1
+            else:
+                self.failed += 1
+
+    def start(self):
+        """Start the worker threads"""
+        for i in range(self.threads):
+            thread = threading.Thread(target=self._loop, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Job worker {self.worker_id} started with {self.threads} threads")
+        return self
+
+    def stop(self, timeout=None):
+        """Signal the threads to stop and wait for them"""
+        self._stop.set()
+        JobQueue._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def metrics(self):
+        return {
+            'worker_id': self.worker_id,
+            'threads': self.threads,
+            'processed': self.processed,
+            'failed': self.failed,
+        }
+
+
+_app_worker = None
+
+
+def start_app_worker():
+    """Start in-app job worker threads for this process, if configured"""
+    global _app_worker
+    if not Config.JOB_QUEUE_ENABLED or Config.JOB_WORKERS_IN_APP <= 0:
+        return None
+    if _app_worker is not None and _app_worker.worker_id.endswith(f":{os.getpid()}"):
+        return _app_worker
+    _app_worker = JobWorker().start()
+    return _app_worker
+
+
+def get_app_worker_metrics():
+    """Get metrics of the in-app worker, None if it is not running here"""
+    if _app_worker is None or not _app_worker.worker_id.endswith(f":{os.getpid()}"):
+        return None
+    return _app_worker.metrics()
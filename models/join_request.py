@@ -1,17 +1,46 @@
 """
 Join Request model for students to request PG accommodation.
 """
-from datetime import datetime
-from models.database import get_collection
+from datetime import datetime, timedelta
+from models.database import get_collection, resolve_projection
+from models import archive
+from models.stats import OwnerStats
+from models.job_queue import JobQueue
+from utils import invalidation
 from bson import ObjectId
+from pymongo import ReturnDocument
+from config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Listing fields copied onto each join request for the request inboxes
+PG_SNAPSHOT_FIELDS = ('name', 'address', 'city', 'rent')
+
+
+def _publish_change(request):
+    """Publish a join request change on the invalidation bus"""
+    invalidation.publish(
+        'join_request', request['_id'],
+        pg_id=str(request['pg_id']),
+        pg_owner_id=str(request['pg_owner_id']),
+        student_id=str(request['student_id']),
+        status=request.get('status')
+    )
+
 
 class JoinRequest:
     """Join Request model class"""
     
+    # Named projections for the finders' projection argument
+    PROJECTIONS = {
+        'card': {
+            'pg_id': 1, 'student_id': 1, 'pg_owner_id': 1, 'pg': 1, 'student': 1,
+            'status': 1, 'message': 1, 'response_message': 1, 'created_at': 1, 'updated_at': 1,
+        },
+        'detail': None,
+    }
+    
     @staticmethod
     def create(student_id, pg_id, message=None):
         """
@@ -47,11 +76,18 @@ class JoinRequest:
         if pg['available_rooms'] <= 0:
             raise ValueError("No rooms available in this PG")
         
+        from models.user import User
+        student = User.find_by_id(student_id)
+        if not student:
+            raise ValueError("Student not found")
+        
         # Create join request document
         request_data = {
             'student_id': ObjectId(student_id),
             'pg_id': ObjectId(pg_id),
             'pg_owner_id': pg['owner_id'],
+            'pg': JoinRequest.pg_snapshot(pg),  # Refreshed by refresh_pg_snapshot
+            'student': User.summary(student),  # Refreshed by sync_student_summary
             'message': message.strip() if message else '',
             'status': 'pending',  # pending, approved, rejected
             'created_at': datetime.utcnow(),
@@ -61,44 +97,85 @@ class JoinRequest:
         try:
             result = requests_collection.insert_one(request_data)
             logger.info(f"Join request created: student {student_id} for PG {pg_id}")
+            OwnerStats.apply(pg['owner_id'], pending_requests_delta=1)
+            _publish_change(request_data)
             return requests_collection.find_one({'_id': result.inserted_id})
         except Exception as e:
             logger.error(f"Error creating join request: {e}")
             raise
     
     @staticmethod
-    def find_by_id(request_id):
-        """Find join request by ID"""
+    def find_by_id(request_id, projection=None):
+        """Find join request by ID, optionally with a projection profile"""
         requests_collection = get_collection('join_requests')
+        projection = resolve_projection(JoinRequest.PROJECTIONS, projection)
         try:
-            return requests_collection.find_one({'_id': ObjectId(request_id)})
+            return requests_collection.find_one({'_id': ObjectId(request_id)}, projection)
         except Exception:
             return None
     
     @staticmethod
-    def find_by_student(student_id):
-        """Find all join requests by student ID"""
+    def find_by_student(student_id, projection=None, include_archived=False):
+        """Find all join requests by student ID, with archived ones if asked for history"""
         requests_collection = get_collection('join_requests')
+        projection = resolve_projection(JoinRequest.PROJECTIONS, projection)
         try:
-            return list(requests_collection.find({'student_id': ObjectId(student_id)}).sort('created_at', -1))
+            if include_archived:
+                return archive.find_with_archive('join_requests', {'student_id': ObjectId(student_id)}, projection)
+            return list(requests_collection.find({'student_id': ObjectId(student_id)}, projection).sort('created_at', -1))
         except Exception:
             return []
     
     @staticmethod
-    def find_by_pg_owner(owner_id):
-        """Find all join requests for PG owner"""
+    def find_by_pg_owner(owner_id, limit=None, projection=None, include_archived=False):
+        """Find join requests for PG owner, newest first, with archived ones if asked for history"""
         requests_collection = get_collection('join_requests')
+        projection = resolve_projection(JoinRequest.PROJECTIONS, projection)
         try:
-            return list(requests_collection.find({'pg_owner_id': ObjectId(owner_id)}).sort('created_at', -1))
+            if include_archived:
+                return archive.find_with_archive('join_requests', {'pg_owner_id': ObjectId(owner_id)},
+                                                 projection, limit=limit)
+            cursor = requests_collection.find({'pg_owner_id': ObjectId(owner_id)}, projection).sort('created_at', -1)
+            if limit:
+                cursor = cursor.limit(limit)
+            return list(cursor)
         except Exception:
             return []
     
     @staticmethod
-    def find_by_pg(pg_id):
+    def find_updated_for_owner(owner_id, since=None, request_ids=None, limit=100, projection=None):
+        """
+        Find an owner's join requests changed since a time, or by ID.
+        
+        Args:
+            owner_id: ID of the PG owner
+            since: Return requests updated at or after this time
+            request_ids: Return these requests (only the owner's)
+            limit: Maximum number of requests
+            projection: Projection profile or document
+            
+        Returns:
+            List of join requests, least recently updated first
+        """
+        requests_collection = get_collection('join_requests')
+        projection = resolve_projection(JoinRequest.PROJECTIONS, projection)
+        query = {'pg_owner_id': ObjectId(owner_id)}
+        if since is not None:
+            query['updated_at'] = {'$gte': since}
+        if request_ids is not None:
+            query['_id'] = {'$in': [ObjectId(request_id) for request_id in request_ids]}
+        try:
+            return list(requests_collection.find(query, projection).sort('updated_at', 1).limit(limit))
+        except Exception:
+            return []
+    
+    @staticmethod
+    def find_by_pg(pg_id, projection=None):
         """Find all join requests for a specific PG"""
         requests_collection = get_collection('join_requests')
+        projection = resolve_projection(JoinRequest.PROJECTIONS, projection)
         try:
-            return list(requests_collection.find({'pg_id': ObjectId(pg_id)}).sort('created_at', -1))
+            return list(requests_collection.find({'pg_id': ObjectId(pg_id)}, projection).sort('created_at', -1))
         except Exception:
             return []
     
@@ -126,23 +203,42 @@ class JoinRequest:
             update_data['response_message'] = message
         
         try:
-            result = requests_collection.update_one(
-                {'_id': ObjectId(request_id)},
-                {'$set': update_data}
-            )
+            before = None
+            pending = []
+            if status == 'approved':
+                # A newly approved request reserves a room in the background.
+                # The job goes into the request's outbox in the same write,
+                # so it survives a failed enqueue
+                current = requests_collection.find_one({'_id': ObjectId(request_id)}, {'pg_id': 1})
+                if current is None:
+                    return None
+                pending = [JobQueue.outbox_entry(
+                    'pg.reserve_room',
+                    {'pg_id': str(current['pg_id']), 'request_id': str(request_id)},
+                    idempotency_key=f"reserve_room:{request_id}"
+                )]
+                before = requests_collection.find_one_and_update(
+                    {'_id': ObjectId(request_id), 'status': {'$ne': 'approved'}},
+                    {'$set': update_data, '$push': {'pending_jobs': {'$each': pending}}},
+                    return_document=ReturnDocument.BEFORE
+                )
+            if before is None:
+                pending = []
+                before = requests_collection.find_one_and_update(
+                    {'_id': ObjectId(request_id)},
+                    {'$set': update_data},
+                    return_document=ReturnDocument.BEFORE
+                )
             
-            if result.modified_count > 0:
-                request = requests_collection.find_one({'_id': ObjectId(request_id)})
+            if before is not None:
+                request = {**before, **update_data}
+                JobQueue.flush_outbox('join_requests', before['_id'], pending)
                 
-                # If approved, decrease available rooms
-                if status == 'approved':
-                    from models.pg_listing import PGListing
-                    pg = PGListing.find_by_id(str(request['pg_id']))
-                    if pg and pg['available_rooms'] > 0:
-                        PGListing.update(str(request['pg_id']), 
-                                       available_rooms=pg['available_rooms'] - 1)
+                if before.get('status') == 'pending' and status != 'pending':
+                    OwnerStats.apply(before['pg_owner_id'], pending_requests_delta=-1)
                 
                 logger.info(f"Join request {request_id} status updated to {status}")
+                _publish_change(request)
                 return request
             return None
         except Exception as e:
@@ -158,5 +254,168 @@ class JoinRequest:
     def reject(request_id, message=None):
         """Reject a join request"""
         return JoinRequest.update_status(request_id, 'rejected', message)
+    
+    @staticmethod
+    def archive_settled(batch_size=None, max_batches=None):
+        """
+        Move join requests approved or rejected more than
+        ARCHIVE_REQUESTS_AFTER_DAYS ago to the archive.
+        
+        Returns:
+            Number of join requests archived
+        """
+        cutoff = datetime.utcnow() - timedelta(days=Config.ARCHIVE_REQUESTS_AFTER_DAYS)
+        return archive.move_all(
+            'join_requests',
+            {'status': {'$in': ['approved', 'rejected']}, 'updated_at': {'$lt': cutoff}},
+            batch_size=batch_size,
+            max_batches=max_batches
+        )
+    
+    @staticmethod
+    def pg_snapshot(pg):
+        """
+        Build the compact listing snapshot stored on join requests.
+        
+        Args:
+            pg: PG listing document
+            
+        Returns:
+            Dictionary of the PG_SNAPSHOT_FIELDS
+        """
+        return {field: pg.get(field) for field in PG_SNAPSHOT_FIELDS}
+    
+    @staticmethod
+    def get_pg_snapshot(request):
+        """
+        Get the listing snapshot for a join request.
+        
+        Falls back to a listing lookup for requests created before
+        snapshots existed.
+        
+        Args:
+            request: Join request document
+            
+        Returns:
+            Snapshot dictionary, None if the listing no longer exists
+        """
+        if request.get('pg'):
+            return request['pg']
+        from models.pg_listing import PGListing
+        pg = PGListing.find_by_id(request['pg_id'])
+        return JoinRequest.pg_snapshot(pg) if pg else None
+    
+    @staticmethod
+    def get_student_summary(request):
+        """
+        Get the student summary for a join request.
+        
+        Args:
+            request: Join request document
+            
+        Returns:
+            Student summary dictionary, None if the student no longer exists
+        """
+        if request.get('student'):
+            return request['student']
+        from models.user import User
+        student = User.find_by_id(request['student_id'])
+        return User.summary(student) if student else None
+    
+    @staticmethod
+    def refresh_pg_snapshot(pg):
+        """
+        Propagate a listing's current snapshot fields to its join requests.
+        
+        Args:
+            pg: PG listing document
+            
+        Returns:
+            Number of join requests updated
+        """
+        requests_collection = get_collection('join_requests')
+        try:
+            result = requests_collection.update_many(
+                {'pg_id': pg['_id']},
+                {'$set': {'pg': JoinRequest.pg_snapshot(pg)}}
+            )
+            if result.modified_count:
+                logger.info(f"PG snapshot refreshed on {result.modified_count} join requests for {pg['_id']}")
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Error refreshing PG snapshot: {e}")
+            raise
+    
+    @staticmethod
+    def sync_student_summary(user):
+        """
+        Fan out a student's current name and email to their join requests.
+        
+        Args:
+            user: User document
+            
+        Returns:
+            Number of join requests updated
+        """
+        from models.user import User
+        requests_collection = get_collection('join_requests')
+        try:
+            result = requests_collection.update_many(
+                {'student_id': user['_id']},
+                {'$set': {'student': User.summary(user)}}
+            )
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Error syncing student summary: {e}")
+            raise
+    
+    @staticmethod
+    def backfill_snapshots(batch_size=500):
+        """
+        Store listing and student snapshots on join requests missing them.
+        
+        Args:
+            batch_size: Number of listings or students fetched per query
+            
+        Returns:
+            Number of join requests updated
+        """
+        from models.user import User
+        requests_collection = get_collection('join_requests')
+        pg_collection = get_collection('pg_listings')
+        users_collection = get_collection('users')
+        updated = 0
+        
+        pg_ids = requests_collection.distinct('pg_id', {'pg': {'$exists': False}})
+        projection = {field: 1 for field in PG_SNAPSHOT_FIELDS}
+        for start in range(0, len(pg_ids), batch_size):
+            for pg in pg_collection.find({'_id': {'$in': pg_ids[start:start + batch_size]}}, projection):
+                result = requests_collection.update_many(
+                    {'pg_id': pg['_id'], 'pg': {'$exists': False}},
+                    {'$set': {'pg': JoinRequest.pg_snapshot(pg)}}
+                )
+                updated += result.modified_count
+        
+        student_ids = requests_collection.distinct('student_id', {'student': {'$exists': False}})
+        for start in range(0, len(student_ids), batch_size):
+            batch = student_ids[start:start + batch_size]
+            for user in users_collection.find({'_id': {'$in': batch}}, {'name': 1, 'email': 1}):
+                result = requests_collection.update_many(
+                    {'student_id': user['_id'], 'student': {'$exists': False}},
+                    {'$set': {'student': User.summary(user)}}
+                )
+                updated += result.modified_count
+        
+        logger.info(f"Backfilled snapshots on {updated} join requests")
+        return updated
+
+
+JobQueue.register_outbox('join_requests')
 
 
+@JobQueue.handler('join_request.refresh_pg_snapshot')
+def _refresh_pg_snapshot_job(pg_id):
+    from models.pg_listing import PGListing
+    pg = PGListing.find_by_id(pg_id)
+    if pg:
+        JoinRequest.refresh_pg_snapshot(pg)
@@ -1,17 +1,114 @@
 """
 PG Listing model for database operations.
 """
-from datetime import datetime
-from models.database import get_collection
+from datetime import datetime, timedelta
+from models.database import get_collection, resolve_projection
+from models import archive
+from models.stats import ListingStats, OwnerStats
+from models import facilities as facility_registry
+from models.job_queue import JobQueue
+from models import saved_search  # noqa: F401 (registers the saved_search.percolate job)
+from utils.cache import cache, entity_tag
+from utils import invalidation, resilience
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument, UpdateOne
+from config import Config
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Weights of the relevance score components (see _relevance_score)
+RELEVANCE_WEIGHTS = {
+    'facilities': 0.4,
+    'rent': 0.3,
+    'availability': 0.2,
+    'recency': 0.1,
+}
+RELEVANCE_RECENCY_DAYS = 30
+
+
+def _publish_change(pg, **extra):
+    """Publish a listing change on the invalidation bus"""
+    invalidation.publish(
+        'pg_listing', pg['_id'],
+        owner_id=str(pg.get('owner_id')),
+        city=pg.get('city'),
+        status=pg.get('status'),
+        available_rooms=pg.get('available_rooms'),
+        total_rooms=pg.get('total_rooms'),
+        **extra
+    )
+
+
+def _relevance_score(facilities=None, min_rent=None, max_rent=None, now=None):
+    """
+    Build the aggregation expression scoring a listing for a search.
+    
+    Each component is in [0, 1] and weighted by RELEVANCE_WEIGHTS:
+    - facilities: share of the requested facilities the listing has
+    - rent: how well the rent fits the requested range (the middle of a
+      min-max range, or the cheaper end of a max-only budget)
+    - availability: available rooms as a share of total rooms
+    - recency: 1 for a new listing, 0.5 at RELEVANCE_RECENCY_DAYS old
+    """
+    components = {}
+    
+    if facilities:
+        requested = list(dict.fromkeys(facilities))
+        components['facilities'] = {'$divide': [
+            {'$add': [
+                {'$cond': [{'$in': [facility, {'$ifNull': ['$facilities', []]}]}, 1, 0]}
+                for facility in requested
+            ]},
+            len(requested)
+        ]}
+    
+    if min_rent is not None and max_rent is not None and float(max_rent) > float(min_rent):
+        middle = (float(min_rent) + float(max_rent)) / 2
+        half_range = (float(max_rent) - float(min_rent)) / 2
+        components['rent'] = {'$max': [0, {'$subtract': [
+            1, {'$divide': [{'$abs': {'$subtract': ['$rent', middle]}}, half_range]}
+        ]}]}
+    elif max_rent is not None and float(max_rent) > 0:
+        components['rent'] = {'$max': [0, {'$subtract': [1, {'$divide': ['$rent', float(max_rent)]}]}]}
+    
+    components['availability'] = {'$min': [1, {'$divide': [
+        '$available_rooms', {'$max': [1, {'$ifNull': ['$total_rooms', 1]}]}
+    ]}]}
+    
+    age_days = {'$divide': [{'$subtract': [now or datetime.utcnow(), '$created_at']}, 86400000]}
+    components['recency'] = {'$divide': [
+        RELEVANCE_RECENCY_DAYS,
+        {'$add': [RELEVANCE_RECENCY_DAYS, {'$max': [0, age_days]}]}
+    ]}
+    
+    return {'$add': [
+        {'$multiply': [RELEVANCE_WEIGHTS[name], expression]}
+        for name, expression in components.items()
+    ]}
+
 
 class PGListing:
     """PG Listing model class"""
     
+    # Named projections for the finders' projection argument. List views
+    # skip the description, contact details, location and room holds.
+    PROJECTIONS = {
+        'card': {
+            'name': 1, 'address': 1, 'city': 1, 'state': 1, 'rent': 1, 'deposit': 1,
+            'available_rooms': 1, 'total_rooms': 1, 'facilities': 1, 'status': 1,
+            'nearby_colleges': 1, 'nearby_workplaces': 1, 'created_at': 1, 'updated_at': 1,
+        },
+        'admin_row': {
+            'name': 1, 'city': 1, 'state': 1, 'rent': 1, 'available_rooms': 1,
+            'total_rooms': 1, 'status': 1, 'owner': 1, 'owner_id': 1,
+            'created_at': 1, 'updated_at': 1,
+        },
+        'detail': {'room_holds': 0, 'pending_jobs': 0},
+        'availability': {'available_rooms': 1, 'total_rooms': 1, 'status': 1, 'owner_id': 1},
+    }
+    
     @staticmethod
     def create(owner_id, name, address, city, state, pincode, rent, deposit, 
                available_rooms, total_rooms, facilities, description, 
@@ -49,6 +146,10 @@ class PGListing:
         pg_collection = get_collection('pg_listings')
         
         # Validate required fields
+        from models.user import User
+        owner = User.find_by_id(owner_id)
+        if not owner:
+            raise ValueError("PG owner not found")
         if not name or not name.strip():
             raise ValueError("PG name is required")
         if not address or not address.strip():
@@ -64,9 +165,12 @@ class PGListing:
         if available_rooms > total_rooms:
             raise ValueError("Available rooms cannot exceed total rooms")
         
+        facilities = facility_registry.normalize(facilities if isinstance(facilities, list) else [])
+        
         # Create PG listing document
         pg_data = {
             'owner_id': ObjectId(owner_id),
+            'owner': User.summary(owner),  # Snapshot kept in sync by sync_owner_summary
             'name': name.strip(),
             'address': address.strip(),
             'city': city.strip(),
@@ -76,7 +180,8 @@ class PGListing:
             'deposit': float(deposit) if deposit else 0,
             'available_rooms': int(available_rooms),
             'total_rooms': int(total_rooms),
-            'facilities': facilities if isinstance(facilities, list) else [],
+            'facilities': facilities,
+            'facilities_mask': facility_registry.to_mask(facilities),
             'description': description.strip() if description else '',
             'contact_phone': contact_phone.strip() if contact_phone else '',
             'contact_email': contact_email.strip().lower() if contact_email else '',
@@ -93,41 +198,128 @@ class PGListing:
         try:
             result = pg_collection.insert_one(pg_data)
             logger.info(f"PG listing created: {name} by owner {owner_id}")
+            ListingStats.record_transition(None, pg_data['status'])
+            OwnerStats.apply(pg_data['owner_id'], new_status=pg_data['status'],
+                             rooms_delta=pg_data['available_rooms'])
+            _publish_change(pg_data)
             return pg_collection.find_one({'_id': result.inserted_id})
         except Exception as e:
             logger.error(f"Error creating PG listing: {e}")
             raise
     
     @staticmethod
-    def find_by_id(pg_id):
-        """Find PG listing by ID"""
+    def find_by_id(pg_id, projection=None, include_archived=False, allow_stale=False):
+        """
+        Find PG listing by ID, optionally with a projection profile.
+        
+        With include_archived, an archived listing is returned with
+        archived=True when the listing is not in the hot collection.
+        
+        With allow_stale, the last good copy of the listing is returned
+        while the database is unavailable (for pages, never for writes).
+        
+        Raises:
+            ReadUnavailable: If the database is unavailable
+        """
+        key = ('pg_listing:find_by_id', str(pg_id), repr(projection), include_archived)
         pg_collection = get_collection('pg_listings')
+        projection = resolve_projection(PGListing.PROJECTIONS, projection)
         try:
-            return pg_collection.find_one({'_id': ObjectId(pg_id)})
-        except Exception:
+            pg_id = ObjectId(pg_id)
+        except (InvalidId, TypeError):
             return None
+        
+        def load():
+            pg = pg_collection.find_one({'_id': pg_id}, projection)
+            if pg is None and include_archived:
+                pg = get_collection(archive.archive_name('pg_listings')).find_one({'_id': pg_id}, projection)
+                if pg is not None:
+                    pg['archived'] = True
+            return pg
+        
+        return resilience.read(key, load, allow_stale=allow_stale)
     
     @staticmethod
-    def find_by_owner(owner_id):
-        """Find all PG listings by owner ID"""
+    def find_by_ids(pg_ids, projection=None):
+        """Find several PG listings by ID, optionally with a projection profile"""
         pg_collection = get_collection('pg_listings')
+        projection = resolve_projection(PGListing.PROJECTIONS, projection)
         try:
-            return list(pg_collection.find({'owner_id': ObjectId(owner_id)}))
+            return list(pg_collection.find({'_id': {'$in': [ObjectId(pg_id) for pg_id in pg_ids]}}, projection))
         except Exception:
             return []
     
     @staticmethod
-    def find_approved():
-        """Find all approved PG listings"""
+    def find_by_owner(owner_id, limit=None, projection=None, include_archived=False):
+        """Find PG listings by owner ID, newest first, with archived ones if asked for history"""
         pg_collection = get_collection('pg_listings')
-        return list(pg_collection.find({'status': 'approved', 'available_rooms': {'$gt': 0}}))
+        projection = resolve_projection(PGListing.PROJECTIONS, projection)
+        try:
+            if include_archived:
+                return archive.find_with_archive('pg_listings', {'owner_id': ObjectId(owner_id)},
+                                                 projection, limit=limit)
+            cursor = pg_collection.find({'owner_id': ObjectId(owner_id)}, projection).sort('created_at', -1)
+            if limit:
+                cursor = cursor.limit(limit)
+            return list(cursor)
+        except Exception:
+            return []
+    
+    @staticmethod
+    def find_approved(limit=None, projection=None):
+        """Find approved PG listings with available rooms, newest first"""
+        pg_collection = get_collection('pg_listings')
+        projection = resolve_projection(PGListing.PROJECTIONS, projection)
+        cursor = pg_collection.find(
+            {'status': 'approved', 'available_rooms': {'$gt': 0}}, projection
+        ).sort('created_at', -1)
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+    
+    @staticmethod
+    def find_featured(limit=6):
+        """
+        Find the newest approved listings for the home page.
+        
+        Cached per process and evicted on any listing change. While the
+        database is unavailable the last good list is returned, uncached.
+        
+        Returns:
+            List of PG listing documents (shared, do not modify)
+        """
+        return resilience.cached_read(
+            cache,
+            f'pg_listing:featured:{limit}',
+            lambda: PGListing.find_approved(limit=limit, projection='card'),
+            tags=[entity_tag('pg_listing')]
+        )
+    
+    @staticmethod
+    def facility_options():
+        """
+        Get the sorted facilities offered by approved listings.
+        
+        Cached per process and evicted on any listing change.
+        """
+        def load():
+            pg_collection = get_collection('pg_listings')
+            return sorted(pg_collection.distinct(
+                'facilities', {'status': 'approved', 'available_rooms': {'$gt': 0}}
+            ))
+        
+        return list(resilience.cached_read(cache, 'pg_listing:facility_options', load, tags=[entity_tag('pg_listing')]))
     
     @staticmethod
     def search(city=None, max_rent=None, min_rent=None, facilities=None, 
-               nearby_college=None, nearby_workplace=None):
+               nearby_college=None, nearby_workplace=None, sort='recent', limit=None,
+               projection=None, after=None, now=None):
         """
         Search PG listings with filters.
         
+        While the database is unavailable, the last good result of the
+        same search is returned instead (see utils.resilience).
+        
         Args:
             city: Filter by city
             max_rent: Maximum rent
@@ -135,11 +327,23 @@ class PGListing:
             facilities: List of required facilities
             nearby_college: Filter by nearby college
             nearby_workplace: Filter by nearby workplace
+            sort: 'recent' (newest first) or 'relevance' (see _relevance_score)
+            limit: Maximum number of listings to return; relevance
+                searches default to SEARCH_TOP_K
+            projection: Projection profile name (see PROJECTIONS) or
+                projection document
+            after: Sort key of the last listing of the previous page, as
+                returned by search_sort_key(), to continue after it
+            now: Reference time for the recency score; pass the same value
+                for every page of a relevance search
             
         Returns:
             List of matching PG listings
         """
         pg_collection = get_collection('pg_listings')
+        # The resolved projection is a shared dict; key reads by the argument
+        read_key = repr(projection)
+        projection = resolve_projection(PGListing.PROJECTIONS, projection)
         query = {'status': 'approved', 'available_rooms': {'$gt': 0}}
         
         if city:
@@ -154,8 +358,17 @@ class PGListing:
             else:
                 query['rent'] = {'$gte': float(min_rent)}
         
+        # In relevance mode facilities are ranked rather than required.
+        # Registered facilities are matched with one bitmask test; others
+        # fall back to the string array.
         if facilities and isinstance(facilities, list):
-            query['facilities'] = {'$all': facilities}
+            facilities = facility_registry.normalize(facilities)
+            if sort != 'relevance':
+                mask, unregistered = facility_registry.split(facilities)
+                if mask:
+                    query['facilities_mask'] = {'$bitsAllSet': mask}
+                if unregistered:
+                    query['facilities'] = {'$all': unregistered}
         
         if nearby_college:
             query['nearby_colleges'] = {'$regex': nearby_college, '$options': 'i'}
@@ -163,7 +376,55 @@ class PGListing:
         if nearby_workplace:
             query['nearby_workplaces'] = {'$regex': nearby_workplace, '$options': 'i'}
         
-        return list(pg_collection.find(query).sort('created_at', -1))
+        if sort == 'relevance':
+            # Scored, sorted and cut to the top k on the server
+            pipeline = [
+                {'$match': query},
+                {'$addFields': {'relevance': _relevance_score(facilities, min_rent, max_rent, now)}},
+            ]
+            if after:
+                relevance, last_id = after
+                pipeline.append({'$match': {'$or': [
+                    {'relevance': {'$lt': relevance}},
+                    {'relevance': relevance, '_id': {'$lt': last_id}},
+                ]}})
+            pipeline += [
+                {'$sort': {'relevance': -1, '_id': -1}},
+                {'$limit': limit or Config.SEARCH_TOP_K},
+            ]
+            if projection:
+                if any(projection.values()):
+                    projection = {**projection, 'relevance': 1}
+                pipeline.append({'$project': projection})
+            # The key leaves out `now`, which only shifts the recency scores
+            key = ('pg_listing:search', repr((query, facilities, min_rent, max_rent, after, limit, read_key)))
+            return resilience.read(key, lambda: list(pg_collection.aggregate(pipeline)))
+        
+        if after:
+            created_at, last_id = after
+            query['$or'] = [
+                {'created_at': {'$lt': created_at}},
+                {'created_at': created_at, '_id': {'$lt': last_id}},
+            ]
+        
+        def load():
+            cursor = pg_collection.find(query, projection).sort([('created_at', -1), ('_id', -1)])
+            if limit:
+                cursor = cursor.limit(limit)
+            return list(cursor)
+        return resilience.read(('pg_listing:search', repr((query, read_key, limit))), load)
+    
+    @staticmethod
+    def search_sort_key(pg, sort='recent'):
+        """
+        Get a listing's position in search results, for the after argument.
+        
+        Returns:
+            Tuple of (relevance or created_at, _id)
+        """
+        if sort == 'relevance':
+            return (pg['relevance'], pg['_id'])
+        return (pg['created_at'], pg['_id'])
     
     @staticmethod
     def update(pg_id, **kwargs):
@@ -178,36 +439,179 @@ class PGListing:
         if 'status' in update_data and update_data['status'] != 'approved':
             update_data['is_verified'] = False
         
+        # Keep the facility bitmask in step with the list
+        if 'facilities' in update_data:
+            update_data['facilities'] = facility_registry.normalize(update_data['facilities'])
+            update_data['facilities_mask'] = facility_registry.to_mask(update_data['facilities'])
+        
+        # Follow-up jobs go into the listing's outbox in the same write, so a
+        # failed enqueue cannot lose them (see models/job_queue.py). Whether
+        # saved searches need matching depends on the before-image, so that
+        # job is recorded whenever it may be needed and dropped if not
+        version = update_data['updated_at'].isoformat()
+        percolate = []
+        if 'status' in update_data or 'available_rooms' in update_data:
+            percolate = [JobQueue.outbox_entry(
+                'saved_search.percolate', {'pg_id': str(pg_id)},
+                idempotency_key=f"percolate:{pg_id}:{version}"
+            )]
+        # Keep the listing snapshot on join requests current
+        from models.join_request import PG_SNAPSHOT_FIELDS
+        refresh = []
+        if any(field in update_data for field in PG_SNAPSHOT_FIELDS):
+            refresh = [JobQueue.outbox_entry(
+                'join_request.refresh_pg_snapshot', {'pg_id': str(pg_id)},
+                idempotency_key=f"refresh_pg_snapshot:{pg_id}:{version}"
+            )]
+        update = {'$set': update_data}
+        if percolate or refresh:
+            update['$push'] = {'pending_jobs': {'$each': percolate + refresh}}
+        
         try:
-            result = pg_collection.update_one(
+            # The before-image gives the previous status for the counters;
+            # $set only touches top-level fields, so the after-image is the
+            # before-image with update_data applied
+            before = pg_collection.find_one_and_update(
                 {'_id': ObjectId(pg_id)},
-                {'$set': update_data}
+                update,
+                return_document=ReturnDocument.BEFORE,
+                projection={'pending_jobs': 0}
             )
-            if result.modified_count > 0:
-                logger.info(f"PG listing updated: {pg_id}")
-                return pg_collection.find_one({'_id': ObjectId(pg_id)})
-            return None
+            if before is None:
+                return None
+            pg = {**before, **update_data}
+            logger.info(f"PG listing updated: {pg_id}")
+            
+            # Newly approved listings, and listings that gained rooms, are
+            # matched against saved searches in the background
+            if not (pg.get('status') == 'approved' and (
+                before.get('status') != 'approved'
+                or pg.get('available_rooms', 0) > before.get('available_rooms', 0)
+            )):
+                JobQueue.drop_outbox('pg_listings', before['_id'], percolate)
+                percolate = []
+            JobQueue.flush_outbox('pg_listings', before['_id'], percolate + refresh)
+            
+            ListingStats.record_transition(before.get('status'), pg.get('status'))
+            OwnerStats.apply(
+                before['owner_id'],
+                old_status=before.get('status'),
+                new_status=pg.get('status'),
+                rooms_delta=pg.get('available_rooms', 0) - before.get('available_rooms', 0)
+            )
+            extra = {}
+            if before.get('city') != pg.get('city'):
+                extra['previous_city'] = before.get('city')
+            _publish_change(pg, fields=sorted(update_data), **extra)
+            return pg
         except Exception as e:
             logger.error(f"Error updating PG listing: {e}")
             raise
     
+    @staticmethod
+    def reserve_room(pg_id, request_id):
+        """
+        Take one available room for an approved join request.
+        
+        Idempotent: the request ID is recorded in room_holds, so a retried
+        job never takes a second room for the same request.
+        
+        Args:
+            pg_id: ID of the PG listing
+            request_id: ID of the approved join request
+            
+        Returns:
+            Updated PG listing document, None if no room was taken
+        """
+        pg_collection = get_collection('pg_listings')
+        now = datetime.utcnow()
+        before = pg_collection.find_one_and_update(
+            {
+                '_id': ObjectId(pg_id),
+                'available_rooms': {'$gt': 0},
+                'room_holds': {'$ne': ObjectId(request_id)}
+            },
+            {
+                '$inc': {'available_rooms': -1},
+                '$push': {'room_holds': ObjectId(request_id)},
+                '$set': {'updated_at': now}
+            },
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            logger.info(f"No room reserved in PG {pg_id} for request {request_id}")
+            return None
+        
+        pg = {**before, 'available_rooms': before['available_rooms'] - 1, 'updated_at': now}
+        logger.info(f"Room reserved in PG {pg_id} for request {request_id}")
+        OwnerStats.apply(before['owner_id'], rooms_delta=-1)
+        _publish_change(pg, fields=['available_rooms'])
+        return pg
+    
+    @staticmethod
+    def archive_rejected(batch_size=None, max_batches=None):
+        """
+        Move listings rejected more than ARCHIVE_LISTINGS_AFTER_DAYS ago to
+        the archive.
+        
+        Archived listings leave the counters as if deleted, so the counters
+        still match a rebuild from the hot collection.
+        
+        Returns:
+            Number of listings archived
+        """
+        def on_moved(batch):
+            for pg in batch:
+                ListingStats.record_transition(pg.get('status'), None)
+                OwnerStats.apply(pg['owner_id'], old_status=pg.get('status'),
+                                 rooms_delta=-pg.get('available_rooms', 0))
+                _publish_change(pg, deleted=True)
+        
+        cutoff = datetime.utcnow() - timedelta(days=Config.ARCHIVE_LISTINGS_AFTER_DAYS)
+        return archive.move_all(
+            'pg_listings',
+            {'status': 'rejected', 'updated_at': {'$lt': cutoff}},
+            batch_size=batch_size,
+            max_batches=max_batches,
+            on_moved=on_moved
+        )
+    
     @staticmethod
     def delete(pg_id):
         """Delete PG listing"""
         pg_collection = get_collection('pg_listings')
         try:
-            result = pg_collection.delete_one({'_id': ObjectId(pg_id)})
+            deleted = pg_collection.find_one_and_delete(
+                {'_id': ObjectId(pg_id)},
+                projection={'status': 1, 'owner_id': 1, 'available_rooms': 1, 'city': 1}
+            )
             logger.info(f"PG listing deleted: {pg_id}")
-            return result.deleted_count > 0
+            if deleted is None:
+                return False
+            ListingStats.record_transition(deleted.get('status'), None)
+            OwnerStats.apply(deleted['owner_id'], old_status=deleted.get('status'),
+                             rooms_delta=-deleted.get('available_rooms', 0))
+            _publish_change(deleted, deleted=True)
+            return True
         except Exception as e:
             logger.error(f"Error deleting PG listing: {e}")
             raise
     
     @staticmethod
-    def find_pending():
-        """Find all pending PG listings for admin approval"""
+    def find_pending(limit=None, projection=None):
+        """Find pending PG listings for admin approval, newest first"""
+        return PGListing.find_all(status='pending', limit=limit, projection=projection)
+    
+    @staticmethod
+    def find_all(status=None, limit=None, projection=None):
+        """Find PG listings of any owner, optionally by status, newest first"""
         pg_collection = get_collection('pg_listings')
-        return list(pg_collection.find({'status': 'pending'}).sort('created_at', -1))
+        projection = resolve_projection(PGListing.PROJECTIONS, projection)
+        query = {'status': status} if status else {}
+        cursor = pg_collection.find(query, projection).sort('created_at', -1)
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
     
     @staticmethod
     def approve(pg_id):
@@ -221,5 +625,113 @@ class PGListing:
         if reason:
             update_data['rejection_reason'] = reason
         return PGListing.update(pg_id, **update_data)
+    
+    @staticmethod
+    def get_owner_summary(pg):
+        """
+        Get the owner summary for a listing.
+        
+        Uses the embedded snapshot, falling back to a user lookup for
+        listings created before snapshots existed.
+        
+        Args:
+            pg: PG listing document
+            
+        Returns:
+            Owner summary dictionary, None if the owner no longer exists
+        """
+        if pg.get('owner'):
+            return pg['owner']
+        from models.user import User
+        owner = User.find_by_id(pg['owner_id'])
+        return User.summary(owner) if owner else None
+    
+    @staticmethod
+    def sync_owner_summary(user):
+        """
+        Fan out a user's current name and email to their listings.
+        
+        Args:
+            user: User document
+            
+        Returns:
+            Number of listings updated
+        """
+        from models.user import User
+        pg_collection = get_collection('pg_listings')
+        try:
+            result = pg_collection.update_many(
+                {'owner_id': user['_id']},
+                {'$set': {'owner': User.summary(user)}}
+            )
+            if result.modified_count:
+                logger.info(f"Owner summary synced to {result.modified_count} listings for {user['_id']}")
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Error syncing owner summary: {e}")
+            raise
+    
+    @staticmethod
+    def backfill_owner_summaries(batch_size=500):
+        """
+        Embed owner summaries in listings that do not have one.
+        
+        Args:
+            batch_size: Number of owners fetched per query
+            
+        Returns:
+            Number of listings updated
+        """
+        from models.user import User
+        pg_collection = get_collection('pg_listings')
+        users_collection = get_collection('users')
+        
+        owner_ids = pg_collection.distinct('owner_id', {'owner': {'$exists': False}})
+        updated = 0
+        for start in range(0, len(owner_ids), batch_size):
+            batch = owner_ids[start:start + batch_size]
+            for user in users_collection.find({'_id': {'$in': batch}}, {'name': 1, 'email': 1}):
+                result = pg_collection.update_many(
+                    {'owner_id': user['_id'], 'owner': {'$exists': False}},
+                    {'$set': {'owner': User.summary(user)}}
+                )
+                updated += result.modified_count
+        logger.info(f"Backfilled owner summaries on {updated} listings")
+        return updated
+    
+    @staticmethod
+    def backfill_facility_masks(batch_size=500):
+        """
+        Normalize facilities and store facilities_mask on listings without one.
+        
+        Args:
+            batch_size: Number of listings updated per bulk write
+            
+        Returns:
+            Number of listings updated
+        """
+        pg_collection = get_collection('pg_listings')
+        updated = 0
+        batch = []
+        cursor = pg_collection.find({'facilities_mask': {'$exists': False}}, {'facilities': 1})
+        for pg in cursor:
+            facilities = facility_registry.normalize(pg.get('facilities'))
+            batch.append(UpdateOne(
+                {'_id': pg['_id']},
+                {'$set': {'facilities': facilities, 'facilities_mask': facility_registry.to_mask(facilities)}}
+            ))
+            if len(batch) >= batch_size:
+                updated += pg_collection.bulk_write(batch, ordered=False).modified_count
+                batch = []
+        if batch:
+            updated += pg_collection.bulk_write(batch, ordered=False).modified_count
+        logger.info(f"Backfilled facility masks on {updated} listings")
+        return updated
+
+
+JobQueue.register_outbox('pg_listings')
 
 
+@JobQueue.handler('pg.reserve_room')
+def _reserve_room_job(pg_id, request_id):
+    PGListing.reserve_room(pg_id, request_id)
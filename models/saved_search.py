@@ -0,0 +1,267 @@
+"""
+Saved searches and the per-user match feed.
+
+Each saved search is filed under one index key taken from its most
+selective predicate: the city, else one required facility bit, else the
+rent bucket when its range fits in one bucket, else 'any'. When a listing
+is approved or gains rooms, a background job builds the keys that listing
+can satisfy, loads only the saved searches filed under them, checks the
+full criteria and adds matches to the owners' feeds.
+"""
+from datetime import datetime
+from models.database import get_collection
+from models.job_queue import JobQueue
+from models import facilities as facility_registry
+from bson import ObjectId
+from pymongo import UpdateOne
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+CRITERIA_FIELDS = ('city', 'min_rent', 'max_rent', 'facilities', 'nearby_college', 'nearby_workplace')
+
+
+def _rent_bucket(rent):
+    return int(float(rent) // Config.SAVED_SEARCH_RENT_BUCKET)
+
+
+def _index_key(criteria, facilities_mask):
+    """Pick the index key of a saved search's most selective predicate"""
+    if criteria.get('city'):
+        return f"city:{criteria['city'].casefold()}"
+    if facilities_mask:
+        # Any required bit works: a match must have all of them
+        return f"facility:{facilities_mask.bit_length() - 1}"
+    min_rent, max_rent = criteria.get('min_rent'), criteria.get('max_rent')
+    if min_rent is not None and max_rent is not None and _rent_bucket(min_rent) == _rent_bucket(max_rent):
+        return f"rent:{_rent_bucket(min_rent)}"
+    return 'any'
+
+
+def _candidate_keys(pg):
+    """Index keys of every saved search a listing could match"""
+    keys = ['any', f"rent:{_rent_bucket(pg.get('rent', 0))}"]
+    if pg.get('city'):
+        keys.append(f"city:{pg['city'].strip().casefold()}")
+    mask = pg.get('facilities_mask')
+    if mask is None:
+        mask = facility_registry.to_mask(pg.get('facilities'))
+    keys.extend(f"facility:{bit}" for bit in range(mask.bit_length()) if mask & (1 << bit))
+    return keys
+
+
+def _contains(values, text):
+    text = text.casefold()
+    return any(isinstance(v, str) and text in v.casefold() for v in values or [])
+
+
+class SavedSearch:
+    """Saved search model class"""
+
+    @staticmethod
+    def create(user_id, name=None, **criteria):
+        """
+        Save a search for a user.
+
+        Args:
+            user_id: ID of the user
+            name: Optional label, defaults to a summary of the criteria
+            **criteria: Search filters (see CRITERIA_FIELDS)
+
+        Returns:
+            Saved search document
+
+        Raises:
+            ValueError: If no filter is given or the user has too many
+        """
+        searches_collection = get_collection('saved_searches')
+
+        criteria = {k: v for k, v in criteria.items() if k in CRITERIA_FIELDS and v not in (None, '', [])}
+        if not criteria:
+            raise ValueError("Choose at least one filter to save a search")
+        if 'city' in criteria:
+            criteria['city'] = criteria['city'].strip()
+        for field in ('min_rent', 'max_rent'):
+            if field in criteria:
+                criteria[field] = float(criteria[field])
+        facilities_mask, unregistered = 0, []
+        if 'facilities' in criteria:
+            criteria['facilities'] = facility_registry.normalize(criteria['facilities'])
+            facilities_mask, unregistered = facility_registry.split(criteria['facilities'])
+
+        if searches_collection.count_documents({'user_id': ObjectId(user_id)}) >= Config.SAVED_SEARCH_MAX_PER_USER:
+            raise ValueError(f"You can save up to {Config.SAVED_SEARCH_MAX_PER_USER} searches")
+
+        search = {
+            'user_id': ObjectId(user_id),
+            'name': (name or '').strip() or SavedSearch.describe(criteria),
+            'criteria': criteria,
+            'facilities_mask': facilities_mask,
+            'other_facilities': unregistered,
+            'index_key': _index_key(criteria, facilities_mask),
+            'created_at': datetime.utcnow()
+        }
+        result = searches_collection.insert_one(search)
+        search['_id'] = result.inserted_id
+        logger.info(f"Saved search created for user {user_id}: {search['index_key']}")
+        return search
+
+    @staticmethod
+    def describe(criteria):
+        """Build a short label for search criteria"""
+        parts = []
+        if criteria.get('city'):
+            parts.append(criteria['city'])
+        if criteria.get('min_rent') is not None or criteria.get('max_rent') is not None:
+            low = f"₹{criteria['min_rent']:.0f}" if criteria.get('min_rent') is not None else ''
+            high = f"₹{criteria['max_rent']:.0f}" if criteria.get('max_rent') is not None else ''
+            parts.append(f"{low}–{high}")
+        if criteria.get('facilities'):
+            parts.append(', '.join(criteria['facilities']))
+        if criteria.get('nearby_college'):
+            parts.append(f"near {criteria['nearby_college']}")
+        if criteria.get('nearby_workplace'):
+            parts.append(f"near {criteria['nearby_workplace']}")
+        return ' · '.join(parts)
+
+    @staticmethod
+    def find_by_user(user_id):
+        """Find a user's saved searches, newest first"""
+        searches_collection = get_collection('saved_searches')
+        try:
+            return list(searches_collection.find({'user_id': ObjectId(user_id)}).sort('created_at', -1))
+        except Exception:
+            return []
+
+    @staticmethod
+    def delete(search_id, user_id):
+        """
+        Delete a user's saved search and its feed entries.
+
+        Returns:
+            True if deleted
+        """
+        try:
+            result = get_collection('saved_searches').delete_one(
+                {'_id': ObjectId(search_id), 'user_id': ObjectId(user_id)}
+            )
+        except Exception:
+            return False
+        if result.deleted_count:
+            get_collection('search_feed').delete_many({'search_id': ObjectId(search_id)})
+            return True
+        return False
+
+    @staticmethod
+    def matches(search, pg):
+        """
+        Check a listing against a saved search's full criteria.
+
+        Uses the same rules as PGListing.search, except that the city must
+        match exactly (ignoring case).
+        """
+        if pg.get('status') != 'approved' or pg.get('available_rooms', 0) <= 0:
+            return False
+        criteria = search['criteria']
+        if criteria.get('city') and criteria['city'].casefold() != (pg.get('city') or '').strip().casefold():
+            return False
+        if criteria.get('min_rent') is not None and pg.get('rent', 0) < criteria['min_rent']:
+            return False
+        if criteria.get('max_rent') is not None and pg.get('rent', 0) > criteria['max_rent']:
+            return False
+        mask = search.get('facilities_mask', 0)
+        if mask:
+            pg_mask = pg.get('facilities_mask')
+            if pg_mask is None:
+                pg_mask = facility_registry.to_mask(pg.get('facilities'))
+            if pg_mask & mask != mask:
+                return False
+        if search.get('other_facilities'):
+            listed = {f.casefold() for f in pg.get('facilities') or [] if isinstance(f, str)}
+            if any(f.casefold() not in listed for f in search['other_facilities']):
+                return False
+        if criteria.get('nearby_college') and not _contains(pg.get('nearby_colleges'), criteria['nearby_college']):
+            return False
+        if criteria.get('nearby_workplace') and not _contains(pg.get('nearby_workplaces'), criteria['nearby_workplace']):
+            return False
+        return True
+
+    @staticmethod
+    def percolate(pg_id):
+        """
+        Add a listing to the feeds of the saved searches it matches.
+
+        Only saved searches filed under the listing's candidate index keys
+        are loaded. Feed entries are unique per search and listing, so
+        running this again for the same listing adds nothing.
+
+        Args:
+            pg_id: ID of the PG listing
+
+        Returns:
+            Number of new feed entries
+        """
+        from models.pg_listing import PGListing
+        pg = PGListing.find_by_id(pg_id, projection='card')
+        if not pg or pg.get('status') != 'approved' or pg.get('available_rooms', 0) <= 0:
+            return 0
+
+        now = datetime.utcnow()
+        snapshot = {field: pg.get(field) for field in ('name', 'city', 'rent', 'available_rooms')}
+        writes = []
+        candidates = get_collection('saved_searches').find({'index_key': {'$in': _candidate_keys(pg)}})
+        for search in candidates:
+            if not SavedSearch.matches(search, pg):
+                continue
+            writes.append(UpdateOne(
+                {'search_id': search['_id'], 'pg_id': pg['_id']},
+                {'$setOnInsert': {
+                    'user_id': search['user_id'],
+                    'search_name': search.get('name'),
+                    'pg': snapshot,
+                    'read': False,
+                    'created_at': now
+                }},
+                upsert=True
+            ))
+        if not writes:
+            return 0
+        added = get_collection('search_feed').bulk_write(writes, ordered=False).upserted_count
+        logger.info(f"PG {pg_id} matched {len(writes)} saved searches, {added} new feed entries")
+        return added
+
+    @staticmethod
+    def feed(user_id, limit=50):
+        """Get a user's saved search matches, newest first"""
+        try:
+            return list(get_collection('search_feed').find(
+                {'user_id': ObjectId(user_id)}
+            ).sort('created_at', -1).limit(limit))
+        except Exception:
+            return []
+
+    @staticmethod
+    def unread_count(user_id):
+        """Count a user's unread feed entries"""
+        return get_collection('search_feed').count_documents({'user_id': ObjectId(user_id), 'read': False})
+
+    @staticmethod
+    def mark_read(user_id, entry_ids):
+        """
+        Mark feed entries of a user as read.
+
+        Args:
+            user_id: User's ID
+            entry_ids: IDs of the entries the user was shown; matches added
+                since, or beyond the page, stay unread
+        """
+        get_collection('search_feed').update_many(
+            {'user_id': ObjectId(user_id), '_id': {'$in': list(entry_ids)}, 'read': False},
+            {'$set': {'read': True}}
+        )
+
+
+@JobQueue.handler('saved_search.percolate')
+def _percolate_job(pg_id):
+    SavedSearch.percolate(pg_id)
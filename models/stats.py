@@ -0,0 +1,395 @@
+"""
+Statistics for dashboards and search.
+
+Counts come from a single aggregation, or from a materialized counters
+document that is updated with $inc on every status transition, making
+dashboard reads O(1) regardless of collection size. Per-city rent
+distributions are cached and recomputed only for cities whose listings
+changed.
+
+Counter updates upsert, so none is lost while a document is missing, and
+bump the document's version. A rebuild replaces the document only if its
+version did not move while the counts were computed, and computes them
+again otherwise. A document an update created, which holds increments
+but no base counts, is rebuilt on the next read.
+"""
+import re
+from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+from models.database import get_collection
+from utils.cache import cache
+from utils import invalidation, resilience
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+LISTING_STATUSES = ('pending', 'approved', 'rejected')
+REBUILD_ATTEMPTS = 3
+
+
+def _increment(collection_name, doc_id, inc):
+    """Apply $inc to a counters document, creating it if missing"""
+    get_collection(collection_name).update_one(
+        {'_id': doc_id}, {'$inc': {**inc, 'version': 1}}, upsert=True
+    )
+
+
+def _needs_rebuild(doc):
+    """Check whether a counters document is missing or holds only increments"""
+    return doc is None or 'rebuilt_at' not in doc
+
+
+def _rebuild(collection_name, doc_id, compute):
+    """
+    Replace a counters document with freshly computed values.
+
+    The replace is conditional on the version read before computing, so
+    increments that land during the computation are not overwritten; the
+    values are computed again instead.
+
+    Args:
+        collection_name: Counters collection
+        doc_id: Document ID
+        compute: Callable returning the values to store
+
+    Returns:
+        The stored values
+    """
+    collection = get_collection(collection_name)
+    for _ in range(REBUILD_ATTEMPTS):
+        current = collection.find_one({'_id': doc_id}, {'version': 1})
+        values = compute()
+        version = current.get('version') if current else None
+        doc = {**values, 'version': (version or 0) + 1, 'rebuilt_at': datetime.utcnow()}
+        if current is None:
+            try:
+                collection.insert_one({'_id': doc_id, **doc})
+                return values
+            except DuplicateKeyError:
+                continue
+        if collection.replace_one({'_id': doc_id, 'version': version}, doc).matched_count:
+            return values
+    # Writes keep landing; store the latest values and let them drift
+    # until the next rebuild
+    logger.warning(f"Counters {collection_name} {doc_id} changed during every rebuild attempt")
+    collection.replace_one({'_id': doc_id}, doc, upsert=True)
+    return values
+
+
+class ListingStats:
+    """Site-wide PG listing counts by status"""
+
+    DOC_ID = 'pg_listing_status'
+
+    @staticmethod
+    def aggregate():
+        """
+        Count listings by status in one pass over the collection.
+
+        Returns:
+            Dictionary with a count per status plus 'total'
+        """
+        pg_collection = get_collection('pg_listings')
+        counts = {status: 0 for status in LISTING_STATUSES}
+        for row in pg_collection.aggregate([
+            {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+        ]):
+            if row['_id'] in counts:
+                counts[row['_id']] = row['count']
+        # Same total as get(): listings in a known status
+        counts['total'] = sum(counts.values())
+        return counts
+
+    @staticmethod
+    def get():
+        """
+        Get listing counts by status.
+
+        Reads the materialized counters document when enabled, rebuilding
+        it if it does not exist yet or holds only increments.
+
+        Returns:
+            Dictionary with a count per status plus 'total'
+        """
+        if not Config.USE_MATERIALIZED_COUNTERS:
+            return ListingStats.aggregate()
+
+        doc = get_collection('counters').find_one({'_id': ListingStats.DOC_ID})
+        if _needs_rebuild(doc):
+            return ListingStats.rebuild()
+        counts = {status: max(0, doc.get(status, 0)) for status in LISTING_STATUSES}
+        counts['total'] = sum(counts.values())
+        return counts
+
+    @staticmethod
+    def rebuild():
+        """
+        Recompute the materialized counters from the listings collection.
+
+        Returns:
+            Dictionary with a count per status plus 'total'
+        """
+        def compute():
+            counts = ListingStats.aggregate()
+            return {status: counts[status] for status in LISTING_STATUSES}
+
+        counts = _rebuild('counters', ListingStats.DOC_ID, compute)
+        counts['total'] = sum(counts.values())
+        logger.info(f"Listing counters rebuilt: {counts}")
+        return counts
+
+    @staticmethod
+    def record_transition(old_status, new_status):
+        """
+        Apply a listing status change to the materialized counters.
+
+        Args:
+            old_status: Previous status, None for a new listing
+            new_status: New status, None for a deleted listing
+        """
+        if old_status == new_status:
+            return
+        inc = {}
+        if old_status:
+            inc[old_status] = -1
+        if new_status:
+            inc[new_status] = inc.get(new_status, 0) + 1
+        try:
+            _increment('counters', ListingStats.DOC_ID, inc)
+        except Exception as e:
+            # Counters are derived data; never fail the listing write
+            logger.error(f"Error updating listing counters: {e}")
+
+
+class OwnerStats:
+    """Per-owner listing and join request counts"""
+
+    @staticmethod
+    def aggregate(owner_id):
+        """
+        Compute an owner's stats from the listings and join requests.
+
+        Args:
+            owner_id: Owner's ObjectId
+
+        Returns:
+            Stats dictionary (see get())
+        """
+        stats = {
+            'listings': {status: 0 for status in LISTING_STATUSES},
+            'pending_requests': 0,
+            'available_rooms': 0,
+        }
+        for row in get_collection('pg_listings').aggregate([
+            {'$match': {'owner_id': owner_id}},
+            {'$group': {
+                '_id': '$status',
+                'count': {'$sum': 1},
+                'rooms': {'$sum': '$available_rooms'},
+            }},
+        ]):
+            if row['_id'] in stats['listings']:
+                stats['listings'][row['_id']] = row['count']
+            stats['available_rooms'] += row['rooms']
+        stats['pending_requests'] = get_collection('join_requests').count_documents(
+            {'pg_owner_id': owner_id, 'status': 'pending'}
+        )
+        return stats
+
+    @staticmethod
+    def get(owner_id):
+        """
+        Get an owner's stats.
+
+        Args:
+            owner_id: Owner's ID (string or ObjectId)
+
+        Returns:
+            Dictionary with 'listings' (count per status plus 'total'),
+            'pending_requests' and 'available_rooms'
+        """
+        from bson import ObjectId
+        owner_id = ObjectId(owner_id)
+        if Config.USE_MATERIALIZED_COUNTERS:
+            doc = get_collection('owner_stats').find_one({'_id': owner_id})
+            stats = OwnerStats.rebuild(owner_id) if _needs_rebuild(doc) else doc
+        else:
+            stats = OwnerStats.aggregate(owner_id)
+
+        listings = {status: max(0, stats.get('listings', {}).get(status, 0)) for status in LISTING_STATUSES}
+        listings['total'] = sum(listings.values())
+        return {
+            'listings': listings,
+            'pending_requests': max(0, stats.get('pending_requests', 0)),
+            'available_rooms': max(0, stats.get('available_rooms', 0)),
+        }
+
+    @staticmethod
+    def rebuild(owner_id):
+        """
+        Recompute and store an owner's materialized stats.
+
+        Args:
+            owner_id: Owner's ObjectId
+
+        Returns:
+            Stats dictionary
+        """
+        return _rebuild('owner_stats', owner_id, lambda: OwnerStats.aggregate(owner_id))
+
+    @staticmethod
+    def rebuild_all():
+        """
+        Recompute materialized stats for every owner with listings.
+
+        Returns:
+            Number of owners rebuilt
+        """
+        owner_ids = get_collection('pg_listings').distinct('owner_id')
+        for owner_id in owner_ids:
+            OwnerStats.rebuild(owner_id)
+        logger.info(f"Owner stats rebuilt for {len(owner_ids)} owners")
+        return len(owner_ids)
+
+    @staticmethod
+    def apply(owner_id, old_status=None, new_status=None, rooms_delta=0, pending_requests_delta=0):
+        """
+        Atomically apply a change to an owner's materialized stats.
+
+        Args:
+            owner_id: Owner's ObjectId
+            old_status: Previous listing status, None for a new listing
+            new_status: New listing status, None for a deleted listing
+            rooms_delta: Change in the owner's total available rooms
+            pending_requests_delta: Change in pending join requests
+        """
+        inc = {}
+        if old_status != new_status:
+            if old_status:
+                inc[f'listings.{old_status}'] = -1
+            if new_status:
+                inc[f'listings.{new_status}'] = 1
+        if rooms_delta:
+            inc['available_rooms'] = rooms_delta
+        if pending_requests_delta:
+            inc['pending_requests'] = pending_requests_delta
+        if not inc:
+            return
+        try:
+            _increment('owner_stats', owner_id, inc)
+        except Exception as e:
+            logger.error(f"Error updating owner stats: {e}")
+
+
+class RentStats:
+    """Rent distribution of searchable listings, per city"""
+
+    PERCENTILES = (10, 25, 50, 75, 90)
+
+    @staticmethod
+    def _key(city):
+        return city.strip().casefold()
+
+    @staticmethod
+    def compute(city):
+        """
+        Compute the rent distribution for a city.
+
+        A single aggregation returns the city's rents already sorted, so
+        percentiles and buckets are read off the array in one pass.
+
+        Args:
+            city: City name (case-insensitive)
+
+        Returns:
+            Dictionary with 'count', 'min', 'max', 'mean', 'percentiles'
+            ({'p10': ..., 'p90': ...}) and 'histogram' (list of
+            {'from', 'to', 'count'}); values are None for no listings
+        """
+        rows = list(get_collection('pg_listings').aggregate([
+            {'$match': {
+                'status': 'approved',
+                'available_rooms': {'$gt': 0},
+                'city': {'$regex': f'^{re.escape(city.strip())}$', '$options': 'i'},
+            }},
+            {'$sort': {'rent': 1}},
+            {'$group': {'_id': None, 'rents': {'$push': '$rent'}}},
+        ]))
+        rents = rows[0]['rents'] if rows else []
+
+        stats = {
+            'city': city.strip(),
+            'count': len(rents),
+            'min': None,
+            'max': None,
+            'mean': None,
+            'percentiles': {f'p{p}': None for p in RentStats.PERCENTILES},
+            'histogram': [],
+        }
+        if not rents:
+            return stats
+
+        stats['min'] = rents[0]
+        stats['max'] = rents[-1]
+        stats['mean'] = round(sum(rents) / len(rents), 2)
+        for p in RentStats.PERCENTILES:
+            # Linear interpolation between the closest ranks
+            position = (len(rents) - 1) * p / 100
+            lower = int(position)
+            upper = min(lower + 1, len(rents) - 1)
+            value = rents[lower] + (rents[upper] - rents[lower]) * (position - lower)
+            stats['percentiles'][f'p{p}'] = round(value, 2)
+
+        # All rents equal: one bucket rather than several of width 1
+        buckets = max(1, Config.RENT_HISTOGRAM_BUCKETS) if rents[-1] > rents[0] else 1
+        width = (rents[-1] - rents[0]) / buckets
+        counts = [0] * buckets
+        for rent in rents:
+            counts[min(int((rent - rents[0]) / width), buckets - 1) if width else 0] += 1
+        stats['histogram'] = [
+            {
+                'from': round(rents[0] + i * width, 2),
+                'to': round(rents[0] + (i + 1) * width, 2),
+                'count': count,
+            }
+            for i, count in enumerate(counts)
+        ]
+        return stats
+
+    @staticmethod
+    def get(city):
+        """
+        Get the cached rent distribution for a city.
+
+        Cached per process and evicted when a listing in the city changes.
+
+        Args:
+            city: City name (case-insensitive)
+
+        Returns:
+            Statistics dictionary (see compute()), shared, do not modify
+        """
+        key = RentStats._key(city)
+        return resilience.cached_read(
+            cache,
+            f'rent_stats:{key}',
+            lambda: RentStats.compute(city),
+            ttl=Config.RENT_STATS_TTL,
+            tags=[f'rent_stats:{key}']
+        )
+
+
+@invalidation.subscribe
+def _evict_rent_stats(event):
+    """Evict the rent stats of the cities a listing change touches"""
+    if event['entity'] != 'pg_listing':
+        return
+    data = event.get('data', {})
+    tags = [
+        f'rent_stats:{RentStats._key(city)}'
+        for city in (data.get('city'), data.get('previous_city'))
+        if isinstance(city, str)
+    ]
+    if tags:
+        cache.invalidate_tags(tags)
@@ -2,8 +2,10 @@
 User model for database operations.
 """
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from pymongo import ReturnDocument
 from models.database import get_collection
+from models.job_queue import JobQueue
+from utils.passwords import get_hasher, HasherBusyError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -36,6 +38,7 @@ class User:
             
         Raises:
             ValueError: If user already exists or validation fails
+            HasherBusyError: If the password hashing pool is saturated
         """
         users_collection = get_collection('users')
         
@@ -60,7 +63,7 @@ class User:
         user_data = {
             'name': name.strip(),
             'email': email.strip().lower(),
-            'password': generate_password_hash(password),
+            'password': get_hasher().hash(password),
             'role': role,
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
@@ -99,11 +102,33 @@ class User:
             
         Returns:
             User document if authenticated, None otherwise
+            
+        Raises:
+            HasherBusyError: If the password hashing pool is saturated
         """
         user = User.find_by_email(email)
-        if user and check_password_hash(user['password'], password):
-            return user
-        return None
+        if not user:
+            return None
+        
+        hasher = get_hasher()
+        if not hasher.verify(user['password'], password):
+            return None
+        
+        # Upgrade hashes made with outdated parameters while the plain
+        # password is available
+        if hasher.needs_rehash(user['password']):
+            try:
+                new_hash = hasher.hash(password)
+                get_collection('users').update_one(
+                    {'_id': user['_id'], 'password': user['password']},
+                    {'$set': {'password': new_hash, 'updated_at': datetime.utcnow()}}
+                )
+                logger.info(f"Password hash upgraded for user {user['_id']}")
+            except HasherBusyError:
+                pass  # Retried on the next login
+            except Exception as e:
+                logger.error(f"Error upgrading password hash: {e}")
+        return user
     
     @staticmethod
     def find_by_id(user_id):
@@ -122,4 +147,95 @@ class User:
             return users_collection.find_one({'_id': ObjectId(user_id)})
         except Exception:
             return None
+    
+    @staticmethod
+    def summary(user):
+        """
+        Build the owner summary snapshot embedded in other documents.
+        
+        Args:
+            user: User document
+            
+        Returns:
+            Dictionary with the user's _id, name and email
+        """
+        return {
+            '_id': user['_id'],
+            'name': user.get('name', ''),
+            'email': user.get('email', '')
+        }
+    
+    @staticmethod
+    def update_profile(user_id, name=None, email=None):
+        """
+        Update a user's name and/or email.
+        
+        Listings and join requests embed a snapshot of the user's name and
+        email, so the new values are fanned out to those documents by a
+        background job.
+        
+        Args:
+            user_id: User's ID
+            name: New name
+            email: New email address
+            
+        Returns:
+            Updated user document, None if the user was not found
+            
+        Raises:
+            ValueError: If validation fails or the email is taken
+        """
+        from bson import ObjectId
+        users_collection = get_collection('users')
+        
+        update_data = {}
+        if name is not None:
+            if not name.strip():
+                raise ValueError("Name is required")
+            update_data['name'] = name.strip()
+        if email is not None:
+            email = email.strip().lower()
+            if not email:
+                raise ValueError("Email is required")
+            if users_collection.find_one({'email': email, '_id': {'$ne': ObjectId(user_id)}}):
+                raise ValueError("Email already registered")
+            update_data['email'] = email
+        
+        if not update_data:
+            return User.find_by_id(user_id)
+        update_data['updated_at'] = datetime.utcnow()
+        
+        # Recorded in the user's job outbox with the write (see models/job_queue.py)
+        pending = [JobQueue.outbox_entry(
+            'user.sync_summaries',
+            {'user_id': str(user_id)},
+            idempotency_key=f"sync_summaries:{user_id}:{update_data['updated_at'].isoformat()}"
+        )]
+        
+        try:
+            user = users_collection.find_one_and_update(
+                {'_id': ObjectId(user_id)},
+                {'$set': update_data, '$push': {'pending_jobs': {'$each': pending}}},
+                return_document=ReturnDocument.AFTER,
+                projection={'pending_jobs': 0}
+            )
+            if user:
+                JobQueue.flush_outbox('users', user['_id'], pending)
+                logger.info(f"User profile updated: {user_id}")
+            return user
+        except Exception as e:
+            logger.error(f"Error updating user profile: {e}")
+            raise
+
+
+JobQueue.register_outbox('users')
+
 
+@JobQueue.handler('user.sync_summaries')
+def _sync_summaries_job(user_id):
+    from models.pg_listing import PGListing
+    from models.join_request import JoinRequest
+    user = User.find_by_id(user_id)
+    if user:
+        PGListing.sync_owner_summary(user)
+        JoinRequest.sync_student_summary(user)
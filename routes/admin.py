@@ -1,10 +1,11 @@
 """
 Admin routes for verifying and approving PG listings.
 """
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
 from models.pg_listing import PGListing
-from models.user import User
+from models.stats import ListingStats
 from utils.decorators import login_required, admin_required
+from utils.views import present
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,32 +19,17 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 def dashboard():
     """Admin dashboard"""
     # Get statistics
-    from models.database import get_collection
-    pg_collection = get_collection('pg_listings')
+    counts = ListingStats.get()
     
-    total_listings = pg_collection.count_documents({})
-    pending_listings = pg_collection.count_documents({'status': 'pending'})
-    approved_listings = pg_collection.count_documents({'status': 'approved'})
-    rejected_listings = pg_collection.count_documents({'status': 'rejected'})
-    
-    # Get pending listings
-    pending = PGListing.find_pending()
-    for pg in pending:
-        pg['_id'] = str(pg['_id'])
-        pg['owner_id'] = str(pg['owner_id'])
-        
-        # Get owner info
-        owner = User.find_by_id(pg['owner_id'])
-        if owner:
-            owner['_id'] = str(owner['_id'])
-            pg['owner_details'] = owner
+    # Get the most recent pending listings, with the details needed to review them
+    pending = PGListing.find_pending(limit=current_app.config.get('ADMIN_PENDING_LIMIT'), projection='detail')
     
     return render_template('admin/dashboard.html',
-                         total_listings=total_listings,
-                         pending_listings=pending_listings,
-                         approved_listings=approved_listings,
-                         rejected_listings=rejected_listings,
-                         pending=pending)
+                         total_listings=counts['total'],
+                         pending_listings=counts['pending'],
+                         approved_listings=counts['approved'],
+                         rejected_listings=counts['rejected'],
+                         pending=present(pending, owner_details=PGListing.get_owner_summary))
 
 
 @admin_bp.route('/listings', methods=['GET'])
@@ -53,26 +39,12 @@ def listings():
     """View all PG listings"""
     status = request.args.get('status', 'all')
     
-    from models.database import get_collection
-    pg_collection = get_collection('pg_listings')
-    
-    query = {}
-    if status != 'all':
-        query['status'] = status
-    
-    all_listings = list(pg_collection.find(query).sort('created_at', -1))
+    all_listings = PGListing.find_all(status=status if status != 'all' else None, projection='admin_row')
     
-    # Convert ObjectId to string and get owner details
-    for pg in all_listings:
-        pg['_id'] = str(pg['_id'])
-        pg['owner_id'] = str(pg['owner_id'])
-        
-        owner = User.find_by_id(pg['owner_id'])
-        if owner:
-            owner['_id'] = str(owner['_id'])
-            pg['owner_details'] = owner
-    
-    return render_template('admin/listings.html', listings=all_listings, status=status)
+    # Owner details are embedded on the listing
+    return render_template('admin/listings.html',
+                         listings=present(all_listings, owner_details=PGListing.get_owner_summary),
+                         status=status)
 
 
 @admin_bp.route('/listings/<pg_id>/approve', methods=['POST'])
@@ -122,20 +94,14 @@ def reject_listing(pg_id):
 @admin_required
 def view_listing(pg_id):
     """View a specific PG listing for admin"""
-    pg = PGListing.find_by_id(pg_id)
+    pg = PGListing.find_by_id(pg_id, projection='detail')
     if not pg:
         flash('PG listing not found.', 'danger')
         return redirect(url_for('admin.listings'))
     
-    # Convert ObjectId to string
-    pg['_id'] = str(pg['_id'])
-    pg['owner_id'] = str(pg['owner_id'])
-    
-    # Get owner info
-    owner = User.find_by_id(pg['owner_id'])
-    if owner:
-        owner['_id'] = str(owner['_id'])
+    # Owner info is embedded on the listing
+    owner = PGListing.get_owner_summary(pg)
     
-    return render_template('admin/view_listing.html', pg=pg, owner=owner)
+    return render_template('admin/view_listing.html', pg=present(pg), owner=present(owner))
 
 
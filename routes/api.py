@@ -0,0 +1,109 @@
+"""
+Versioned JSON API for PG listings.
+"""
+import base64
+import json
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Blueprint, request, jsonify
+from models.pg_listing import PGListing
+import logging
+
+logger = logging.getLogger(__name__)
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Listing detail without the owner's email
+DETAIL_PROJECTION = {**PGListing.PROJECTIONS['detail'], 'owner.email': 0}
+
+
+def _encode_token(sort, key, now=None):
+    """Encode the position after a page as an opaque token"""
+    value, last_id = key
+    payload = {
+        's': sort,
+        'v': value.isoformat() if isinstance(value, datetime) else value,
+        'id': str(last_id),
+    }
+    if now is not None:
+        payload['n'] = now.isoformat()
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def _decode_token(token, sort):
+    """
+    Decode a page token.
+
+    Returns:
+        Tuple of (sort key, reference time or None)
+
+    Raises:
+        ValueError: If the token is malformed or from a different sort
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        token_sort = payload['s']
+        value = payload['v'] if token_sort == 'relevance' else datetime.fromisoformat(payload['v'])
+        key = (value, ObjectId(payload['id']))
+        now = datetime.fromisoformat(payload['n']) if 'n' in payload else None
+    except (KeyError, TypeError, ValueError, InvalidId) as e:
+        raise ValueError('Invalid page token') from e
+    if token_sort != sort:
+        raise ValueError('Page token does not match the sort order')
+    return key, now
+
+
+@api_bp.route('/pg/search', methods=['GET'])
+def search_pgs():
+    """
+    Search approved PG listings.
+
+    Accepts the same filters as /pg/search plus limit and page_token.
+    Returns the results and a next_page_token (null on the last page).
+    """
+    sort = 'relevance' if request.args.get('sort') == 'relevance' else 'recent'
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+    after, now = None, None
+    token = request.args.get('page_token')
+    if token:
+        try:
+            after, now = _decode_token(token, sort)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    if sort == 'relevance' and now is None:
+        # Fix the recency reference so scores are stable across pages
+        now = datetime.utcnow()
+
+    results = PGListing.search(
+        city=request.args.get('city', '').strip() or None,
+        max_rent=request.args.get('max_rent', type=float),
+        min_rent=request.args.get('min_rent', type=float),
+        facilities=request.args.getlist('facilities') or None,
+        nearby_college=request.args.get('nearby_college', '').strip() or None,
+        nearby_workplace=request.args.get('nearby_workplace', '').strip() or None,
+        sort=sort,
+        limit=limit,
+        projection='card',
+        after=after,
+        now=now
+    )
+
+    next_page_token = None
+    if len(results) == limit:
+        next_page_token = _encode_token(sort, PGListing.search_sort_key(results[-1], sort), now)
+
+    return jsonify({'results': results, 'next_page_token': next_page_token})
+
+
+@api_bp.route('/pg/<pg_id>', methods=['GET'])
+def get_pg(pg_id):
+    """Get an approved PG listing"""
+    pg = PGListing.find_by_id(pg_id, projection=DETAIL_PROJECTION, allow_stale=True)
+    if not pg or pg.get('status') != 'approved':
+        return jsonify({'error': 'PG listing not found'}), 404
+    return jsonify(pg)
@@ -1,8 +1,10 @@
 """
 Authentication routes (login, signup, logout).
 """
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
 from models.user import User
+from utils.passwords import HasherBusyError
+from utils.rate_limit import get_limiter
 from utils.validators import validate_email, validate_password, validate_name
 import logging
 
@@ -48,6 +50,9 @@ def signup():
         except ValueError as e:
             flash(str(e), 'danger')
             return render_template('signup.html', name=name, email=email, role=role)
+        except HasherBusyError:
+            flash('The server is busy. Please try again in a moment.', 'warning')
+            return render_template('signup.html', name=name, email=email, role=role), 503
         except Exception as e:
             logger.error(f"Signup error: {e}")
             # expose error for debugging
@@ -57,6 +62,28 @@ def signup():
     return render_template('signup.html')
 
 
+def _check_login_rate(email):
+    """
+    Spend a login token for the client IP and for the email address.
+    
+    Returns:
+        Seconds to wait before retrying if throttled, None if allowed
+    """
+    cfg = current_app.config
+    if not cfg.get('LOGIN_RATE_LIMIT_ENABLED', True):
+        return None
+    
+    checks = (
+        (get_limiter('login_ip', cfg['LOGIN_IP_BURST'], cfg['LOGIN_IP_PER_MINUTE']), request.remote_addr),
+        (get_limiter('login_email', cfg['LOGIN_EMAIL_BURST'], cfg['LOGIN_EMAIL_PER_MINUTE']), email.lower()),
+    )
+    for limiter, key in checks:
+        allowed, retry_after = limiter.hit(key)
+        if not allowed:
+            return retry_after or 60
+    return None
+
+
 def login():
     """User login route"""
     if request.method == 'POST':
@@ -73,7 +100,20 @@ def login():
             flash(email_error, 'danger')
             return render_template('login.html', email=email)
         
-        user = User.authenticate(email, password)
+        # Throttle before doing any password hashing
+        retry_after = _check_login_rate(email)
+        if retry_after is not None:
+            flash(f'Too many login attempts. Please try again in {retry_after} seconds.', 'danger')
+            response = current_app.make_response((render_template('login.html', email=email), 429))
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+        
+        try:
+            user = User.authenticate(email, password)
+        except HasherBusyError:
+            flash('The server is busy. Please try again in a moment.', 'warning')
+            return render_template('login.html', email=email), 503
+        
         if user:
             session['user_id'] = str(user['_id'])
             session['user_name'] = user['name']
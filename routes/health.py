@@ -0,0 +1,66 @@
+"""
+Health check routes (liveness and readiness) and runtime metrics.
+
+The probes are public and say only whether the worker is up or ready;
+everything else (timings, warm-up errors, pool and limiter state) is in
+/metrics, which needs METRICS_TOKEN or an admin session.
+"""
+import hmac
+from flask import Blueprint, jsonify, request, session
+from models.database import get_pool_metrics
+from models.job_queue import get_app_worker_metrics
+from utils import startup
+from utils.passwords import get_hasher
+from utils import rate_limit, invalidation, autocomplete, resilience, deadlines, admission
+from utils.streams import availability_hub, inbox_hub
+from utils.cache import cache
+from utils.fragments import fragment_cache
+from config import Config
+
+health_bp = Blueprint('health', __name__)
+
+
+@health_bp.route('/healthz', methods=['GET'])
+def liveness():
+    """Liveness probe: the worker process is up"""
+    return jsonify({'status': 'alive'}), 200
+
+
+@health_bp.route('/readyz', methods=['GET'])
+def readiness():
+    """Readiness probe: the worker has completed its database warm-up"""
+    ready = startup.is_ready()
+    return jsonify({'status': 'ready' if ready else 'starting'}), 200 if ready else 503
+
+
+def _metrics_allowed():
+    """Check for 'Authorization: Bearer <METRICS_TOKEN>' or an admin session"""
+    if Config.METRICS_TOKEN:
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), Config.METRICS_TOKEN.encode()):
+            return True
+    return 'user_id' in session and session.get('user_role') == 'admin'
+
+
+@health_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Per-process runtime metrics"""
+    if not _metrics_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({
+        'pid': startup.state.pid,
+        'startup': startup.state.to_dict(),
+        'pool': get_pool_metrics(),
+        'password_hashing': get_hasher().metrics(),
+        'rate_limits': rate_limit.get_metrics(),
+        'cache': cache.metrics(),
+        'fragment_cache': fragment_cache.metrics(),
+        'invalidation_bus': invalidation.metrics.to_dict(),
+        'job_worker': get_app_worker_metrics(),
+        'autocomplete': autocomplete.index.metrics(),
+        'availability_streams': availability_hub.metrics(),
+        'inbox_streams': inbox_hub.metrics(),
+        'read_breaker': resilience.metrics(),
+        'deadlines': deadlines.metrics(),
+        'admission': admission.metrics(),
+    }), 200
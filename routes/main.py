@@ -1,10 +1,13 @@
 """
 Main application routes (home, dashboard).
 """
-from flask import Blueprint, render_template, session, redirect, url_for
+from flask import Blueprint, render_template, session, redirect, url_for, current_app
 from utils.decorators import login_required
 from models.pg_listing import PGListing
 from models.join_request import JoinRequest
+from models.stats import OwnerStats
+from models.saved_search import SavedSearch
+from utils.views import present
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,16 +22,13 @@ def home():
     user_role = session.get('user_role', 'student')
     
     # Get featured/approved PGs for homepage
-    featured_pgs = PGListing.find_approved()[:6]  # Show first 6 approved PGs
-    for pg in featured_pgs:
-        pg['_id'] = str(pg['_id'])
-        pg['owner_id'] = str(pg['owner_id'])
+    featured_pgs = PGListing.find_featured(6)  # Show 6 newest approved PGs
     
     return render_template('index.html', 
                          user_logged_in=user_logged_in, 
                          user_name=user_name,
                          user_role=user_role,
-                         featured_pgs=featured_pgs)
+                         featured_pgs=present(featured_pgs))
 
 
 @login_required
@@ -43,28 +43,26 @@ def dashboard():
     requests = None
     listings = None
     received_requests = None
+    owner_stats = None
+    saved_search_matches = None
     
     if user_role == 'student':
         # Get student's join requests
-        requests = JoinRequest.find_by_student(user_id)
-        for req in requests:
-            req['_id'] = str(req['_id'])
-            req['pg_id'] = str(req['pg_id'])
-            pg = PGListing.find_by_id(req['pg_id'])
-            if pg:
-                pg['_id'] = str(pg['_id'])
-                req['pg_details'] = pg
+        requests = present(JoinRequest.find_by_student(user_id, projection='card'),
+                           pg_details=JoinRequest.get_pg_snapshot)
+        saved_search_matches = SavedSearch.unread_count(user_id)
     elif user_role == 'pg_owner':
-        # Get PG owner's listings
-        listings = PGListing.find_by_owner(user_id)
-        for listing in listings:
-            listing['_id'] = str(listing['_id'])
+        # Totals come from the owner's stats document; only the most
+        # recent listings and requests are loaded
+        recent_limit = current_app.config.get('DASHBOARD_RECENT_LIMIT', 5)
+        owner_stats = OwnerStats.get(user_id)
         
-        # Get received requests
-        received_requests = JoinRequest.find_by_pg_owner(user_id)
-        for req in received_requests:
-            req['_id'] = str(req['_id'])
-            req['pg_id'] = str(req['pg_id'])
+        listings = present(PGListing.find_by_owner(user_id, limit=recent_limit, projection='card'))
+        
+        # Get recent received requests
+        received_requests = present(JoinRequest.find_by_pg_owner(user_id, limit=recent_limit, projection='card'),
+                                    pg_details=JoinRequest.get_pg_snapshot,
+                                    student_details=JoinRequest.get_student_summary)
     elif user_role == 'admin':
         # Redirect to admin dashboard
         return redirect(url_for('admin.dashboard'))
@@ -75,7 +73,9 @@ def dashboard():
                          user_role=user_role,
                          requests=requests,
                          listings=listings,
-                         received_requests=received_requests)
+                         received_requests=received_requests,
+                         owner_stats=owner_stats,
+                         saved_search_matches=saved_search_matches)
 
 
 # Register routes
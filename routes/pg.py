@@ -1,10 +1,19 @@
 """
 PG listing routes (create, update, delete, search).
 """
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Blueprint, Response, render_template, request, redirect, url_for, session, flash, jsonify
 from models.pg_listing import PGListing
-from models.user import User
+from models.facilities import FACILITIES
+from models.stats import RentStats
+from utils import autocomplete
+from utils.streams import WITHDRAWN_STATE, availability_hub, availability_state, streaming_supported
 from utils.decorators import login_required, pg_owner_required
+from utils.resilience import DeadlineExceeded, ReadUnavailable
+from utils.views import present
+from bson import ObjectId
+from config import Config
+import json
+import time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,70 +30,195 @@ def search():
     facilities = request.args.getlist('facilities')
     nearby_college = request.args.get('nearby_college', '').strip()
     nearby_workplace = request.args.get('nearby_workplace', '').strip()
+    sort = 'relevance' if request.args.get('sort') == 'relevance' else 'recent'
     
-    # Get all facilities for filter display
-    all_pgs = PGListing.find_approved()
-    all_facilities = set()
-    for pg in all_pgs:
-        all_facilities.update(pg.get('facilities', []))
+    # Get all facilities for filter display; the filters and rent guide are
+    # decoration, so a failed read falls back rather than failing the page
+    try:
+        all_facilities = PGListing.facility_options()
+    except ReadUnavailable:
+        all_facilities = list(FACILITIES)
     
-    # Perform search
-    results = PGListing.search(
-        city=city if city else None,
-        max_rent=max_rent,
-        min_rent=min_rent,
-        facilities=facilities if facilities else None,
-        nearby_college=nearby_college if nearby_college else None,
-        nearby_workplace=nearby_workplace if nearby_workplace else None
-    )
+    # Rent distribution of the searched city, as a guide for the rent filters
+    try:
+        rent_stats = RentStats.get(city) if city else None
+    except ReadUnavailable:
+        rent_stats = None
     
-    # Convert ObjectId to string for template rendering
-    for pg in results:
-        pg['_id'] = str(pg['_id'])
-        pg['owner_id'] = str(pg['owner_id'])
+    # Perform search
+    try:
+        results = PGListing.search(
+            city=city if city else None,
+            max_rent=max_rent,
+            min_rent=min_rent,
+            facilities=facilities if facilities else None,
+            nearby_college=nearby_college if nearby_college else None,
+            nearby_workplace=nearby_workplace if nearby_workplace else None,
+            sort=sort,
+            projection='card'
+        )
+    except DeadlineExceeded:
+        # Keep the filters on screen so the search can be narrowed
+        results = []
+        flash('This search took too long. Try a more specific city or fewer filters.', 'warning')
     
     user_logged_in = 'user_id' in session
     user_role = session.get('user_role', 'student')
     
     return render_template('pg/search.html', 
-                         pgs=results,
-                         all_facilities=sorted(all_facilities),
+                         pgs=present(results),
+                         rent_stats=rent_stats,
+                         all_facilities=all_facilities,
                          search_params={
                              'city': city,
                              'max_rent': max_rent,
                              'min_rent': min_rent,
                              'facilities': facilities,
                              'nearby_college': nearby_college,
-                             'nearby_workplace': nearby_workplace
+                             'nearby_workplace': nearby_workplace,
+                             'sort': sort
                          },
                          user_logged_in=user_logged_in,
                          user_role=user_role)
 
 
+@pg_bp.route('/api/autocomplete', methods=['GET'])
+def autocomplete_api():
+    """Suggest cities, colleges or workplaces for a typed prefix"""
+    field = autocomplete.FIELDS.get(request.args.get('field', ''))
+    if field is None:
+        return jsonify({'error': f"field must be one of {', '.join(autocomplete.FIELDS)}"}), 400
+    prefix = request.args.get('prefix', '')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 25)
+    return jsonify({
+        'field': request.args['field'],
+        'prefix': prefix,
+        'suggestions': autocomplete.index.suggest(field, prefix, limit) if prefix.strip() else []
+    })
+
+
+@pg_bp.route('/api/rent-stats', methods=['GET'])
+def rent_stats_api():
+    """Rent distribution (percentiles and histogram) of a city"""
+    city = request.args.get('city', '').strip()
+    if not city:
+        return jsonify({'error': 'city is required'}), 400
+    return jsonify(RentStats.get(city))
+
+
+def _sse(listing_id, state):
+    data = json.dumps({'pg_id': listing_id, **state}, separators=(',', ':'))
+    return f"event: availability\ndata: {data}\n\n"
+
+
+def _visible_state(listing_id, state, privileged, shown):
+    """
+    Get a listing's state as a stream's viewer may see it.
+
+    Only owners and admins (privileged) follow listings that are not
+    approved; anyone else gets WITHDRAWN_STATE once when a listing they
+    were shown leaves public view, then nothing until it is approved again.
+
+    Returns:
+        State to send, None to send nothing
+    """
+    if listing_id in privileged or state.get('status') == 'approved':
+        shown.add(listing_id)
+        return state
+    if listing_id in shown:
+        shown.discard(listing_id)
+        return state if state.get('status') == 'deleted' else WITHDRAWN_STATE
+    return None
+
+
+def _availability_events(listing_ids, keep_open, user_id=None, is_admin=False):
+    """Generate the SSE body: a snapshot, then changes until the stream expires"""
+    # Listen before reading the snapshot so no change falls in between
+    listener = availability_hub.listen(listing_ids) if keep_open else None
+    privileged = set(listing_ids) if is_admin else set()
+    shown = set()
+    try:
+        yield f"retry: {Config.SSE_RETRY_MS if keep_open else Config.SSE_POLL_RETRY_MS}\n\n"
+        for pg in PGListing.find_by_ids(listing_ids, projection='availability'):
+            listing_id = str(pg['_id'])
+            if user_id and str(pg.get('owner_id')) == user_id:
+                privileged.add(listing_id)
+            state = _visible_state(listing_id, availability_state(pg), privileged, shown)
+            if state is not None:
+                yield _sse(listing_id, state)
+        if not keep_open:
+            return
+        deadline = time.monotonic() + Config.SSE_MAX_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            changes = availability_hub.wait(listener, Config.SSE_HEARTBEAT_SECONDS)
+            if not changes:
+                # Keeps proxies from closing the idle connection, and finds
+                # disconnected clients
+                yield ": keep-alive\n\n"
+                continue
+            for listing_id, state in changes.items():
+                state = _visible_state(listing_id, state, privileged, shown)
+                if state is not None:
+                    yield _sse(listing_id, state)
+    finally:
+        if listener is not None:
+            availability_hub.close(listener)
+
+
+@pg_bp.route('/api/availability', methods=['GET'])
+def availability_stream():
+    """
+    Server-Sent Events stream of room availability for some listings.
+    
+    Listings that are not approved are streamed to their owner and admins
+    only.
+    """
+    listing_ids = []
+    for value in request.args.getlist('ids'):
+        listing_ids.extend(i for i in value.split(',') if ObjectId.is_valid(i))
+    listing_ids = list(dict.fromkeys(listing_ids))
+    if not listing_ids:
+        return jsonify({'error': 'ids must list one or more listing IDs'}), 400
+    if len(listing_ids) > Config.SSE_MAX_LISTINGS:
+        return jsonify({'error': f"at most {Config.SSE_MAX_LISTINGS} listings per stream"}), 400
+    
+    return Response(
+        _availability_events(
+            listing_ids,
+            keep_open=streaming_supported(request.environ),
+            # The generator runs after the request context is gone
+            user_id=session.get('user_id'),
+            is_admin=session.get('user_role') == 'admin'
+        ),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @pg_bp.route('/<pg_id>', methods=['GET'])
 def view(pg_id):
     """View a specific PG listing"""
-    pg = PGListing.find_by_id(pg_id)
+    history = request.args.get('history') == '1'
+    pg = PGListing.find_by_id(pg_id, projection='detail', include_archived=history, allow_stale=True)
+    # Archived listings are history for their owner and admins only
+    if pg and pg.get('archived') and not (
+        session.get('user_role') == 'admin' or str(pg['owner_id']) == session.get('user_id')
+    ):
+        pg = None
     if not pg:
         flash('PG listing not found.', 'danger')
         return redirect(url_for('pg.search'))
     
-    # Convert ObjectId to string
-    pg['_id'] = str(pg['_id'])
-    pg['owner_id'] = str(pg['owner_id'])
-    
-    # Get owner info
-    owner = User.find_by_id(pg['owner_id'])
-    if owner:
-        owner['_id'] = str(owner['_id'])
+    # Owner info is embedded on the listing
+    owner = PGListing.get_owner_summary(pg)
     
     user_logged_in = 'user_id' in session
     user_role = session.get('user_role', 'student')
     can_request = user_logged_in and user_role == 'student' and pg['status'] == 'approved' and pg['available_rooms'] > 0
     
     return render_template('pg/view.html', 
-                         pg=pg, 
-                         owner=owner,
+                         pg=present(pg), 
+                         owner=present(owner),
                          user_logged_in=user_logged_in,
                          user_role=user_role,
                          can_request=can_request)
@@ -145,14 +279,7 @@ def create():
             logger.error(f"Error creating PG listing: {e}")
             flash('An error occurred. Please try again.', 'danger')
     
-    # Common facilities list
-    common_facilities = [
-        'WiFi', 'AC', 'Food', 'Laundry', 'Power Backup', 'Security', 
-        'Parking', 'Gym', 'TV', 'Refrigerator', 'Washing Machine', 
-        'Geyser', 'Housekeeping', 'Study Table', 'Cupboard'
-    ]
-    
-    return render_template('pg/create.html', common_facilities=common_facilities)
+    return render_template('pg/create.html', common_facilities=FACILITIES)
 
 
 @pg_bp.route('/my-listings', methods=['GET'])
@@ -161,14 +288,10 @@ def create():
 def my_listings():
     """View all PG listings by the current owner"""
     owner_id = session['user_id']
-    listings = PGListing.find_by_owner(owner_id)
+    history = request.args.get('history') == '1'
+    listings = PGListing.find_by_owner(owner_id, projection='card', include_archived=history)
     
-    # Convert ObjectId to string
-    for listing in listings:
-        listing['_id'] = str(listing['_id'])
-        listing['owner_id'] = str(listing['owner_id'])
-    
-    return render_template('pg/my_listings.html', listings=listings)
+    return render_template('pg/my_listings.html', listings=present(listings), history=history)
 
 
 @pg_bp.route('/<pg_id>/edit', methods=['GET', 'POST'])
@@ -176,7 +299,7 @@ def my_listings():
 @pg_owner_required
 def edit(pg_id):
     """Edit a PG listing"""
-    pg = PGListing.find_by_id(pg_id)
+    pg = PGListing.find_by_id(pg_id, projection='detail')
     if not pg:
         flash('PG listing not found.', 'danger')
         return redirect(url_for('pg.my_listings'))
@@ -234,18 +357,7 @@ def edit(pg_id):
             logger.error(f"Error updating PG listing: {e}")
             flash('An error occurred. Please try again.', 'danger')
     
-    # Convert ObjectId to string
-    pg['_id'] = str(pg['_id'])
-    pg['owner_id'] = str(pg['owner_id'])
-    
-    # Common facilities list
-    common_facilities = [
-        'WiFi', 'AC', 'Food', 'Laundry', 'Power Backup', 'Security', 
-        'Parking', 'Gym', 'TV', 'Refrigerator', 'Washing Machine', 
-        'Geyser', 'Housekeeping', 'Study Table', 'Cupboard'
-    ]
-    
-    return render_template('pg/edit.html', pg=pg, common_facilities=common_facilities)
+    return render_template('pg/edit.html', pg=present(pg), common_facilities=FACILITIES)
 
 
 @pg_bp.route('/<pg_id>/delete', methods=['POST'])
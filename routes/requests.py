@@ -1,11 +1,16 @@
 """
 Join request routes (submit, view, approve/reject).
 """
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from datetime import datetime
+from flask import Blueprint, Response, render_template, request, redirect, url_for, session, flash, stream_with_context
 from models.join_request import JoinRequest
 from models.pg_listing import PGListing
-from models.user import User
 from utils.decorators import login_required, pg_owner_required
+from utils.streams import inbox_hub, stamp, from_stamp, streaming_supported
+from utils.views import present
+from config import Config
+import json
+import time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,6 +18,18 @@ logger = logging.getLogger(__name__)
 requests_bp = Blueprint('requests', __name__, url_prefix='/requests')
 
 
+@requests_bp.app_template_filter('sse_stamp')
+def sse_stamp(value):
+    """Format a datetime as an SSE event ID (epoch milliseconds)"""
+    return stamp(value) if isinstance(value, datetime) else 0
+
+
+def _present_received(requests):
+    return present(requests,
+                   pg_details=JoinRequest.get_pg_snapshot,
+                   student_details=JoinRequest.get_student_summary)
+
+
 @requests_bp.route('/submit/<pg_id>', methods=['GET', 'POST'])
 @login_required
 def submit(pg_id):
@@ -22,7 +39,7 @@ def submit(pg_id):
         flash('Only students can submit join requests.', 'danger')
         return redirect(url_for('pg.view', pg_id=pg_id))
     
-    pg = PGListing.find_by_id(pg_id)
+    pg = PGListing.find_by_id(pg_id, projection='card')
     if not pg:
         flash('PG listing not found.', 'danger')
         return redirect(url_for('pg.search'))
@@ -41,10 +58,7 @@ def submit(pg_id):
             logger.error(f"Error submitting join request: {e}")
             flash('An error occurred. Please try again.', 'danger')
     
-    # Convert ObjectId to string
-    pg['_id'] = str(pg['_id'])
-    
-    return render_template('requests/submit.html', pg=pg)
+    return render_template('requests/submit.html', pg=present(pg))
 
 
 @requests_bp.route('/my-requests', methods=['GET'])
@@ -57,22 +71,13 @@ def my_requests():
         return redirect(url_for('main.dashboard'))
     
     student_id = session['user_id']
-    requests = JoinRequest.find_by_student(student_id)
+    history = request.args.get('history') == '1'
+    requests = JoinRequest.find_by_student(student_id, projection='card', include_archived=history)
     
-    # Convert ObjectId to string and get PG details
-    for req in requests:
-        req['_id'] = str(req['_id'])
-        req['student_id'] = str(req['student_id'])
-        req['pg_id'] = str(req['pg_id'])
-        req['pg_owner_id'] = str(req['pg_owner_id'])
-        
-        # Get PG details
-        pg = PGListing.find_by_id(req['pg_id'])
-        if pg:
-            pg['_id'] = str(pg['_id'])
-            req['pg_details'] = pg
-    
-    return render_template('requests/my_requests.html', requests=requests)
+    # PG details are embedded on the request
+    return render_template('requests/my_requests.html',
+                         requests=present(requests, pg_details=JoinRequest.get_pg_snapshot),
+                         history=history)
 
 
 @requests_bp.route('/received', methods=['GET'])
@@ -81,27 +86,66 @@ def my_requests():
 def received():
     """View all join requests received by PG owner"""
     owner_id = session['user_id']
-    requests = JoinRequest.find_by_pg_owner(owner_id)
-    
-    # Convert ObjectId to string and get details
-    for req in requests:
-        req['_id'] = str(req['_id'])
-        req['student_id'] = str(req['student_id'])
-        req['pg_id'] = str(req['pg_id'])
-        req['pg_owner_id'] = str(req['pg_owner_id'])
-        
-        # Get PG and student details
-        pg = PGListing.find_by_id(req['pg_id'])
-        student = User.find_by_id(req['student_id'])
-        
-        if pg:
-            pg['_id'] = str(pg['_id'])
-            req['pg_details'] = pg
-        if student:
-            student['_id'] = str(student['_id'])
-            req['student_details'] = student
-    
-    return render_template('requests/received.html', requests=requests)
+    # Taken before the query, so the live stream covers anything the query misses
+    since = stamp(datetime.utcnow())
+    history = request.args.get('history') == '1'
+    requests = JoinRequest.find_by_pg_owner(owner_id, projection='card', include_archived=history)
+    
+    # PG and student details are embedded on the request
+    return render_template('requests/received.html',
+                         requests=_present_received(requests),
+                         since=since,
+                         history=history)
+
+
+def _request_events(requests):
+    for req in _present_received(requests):
+        updated = stamp(req['updated_at'])
+        data = json.dumps({
+            'id': req['_id'],
+            'status': req['status'],
+            'updated': updated,
+            'html': render_template('requests/_received_card.html', req=req)
+        }, separators=(',', ':'))
+        yield f"id: {updated}\nevent: request\ndata: {data}\n\n"
+
+
+def _inbox_events(owner_id, since, keep_open):
+    """Generate the SSE body: requests changed since the page loaded, then live changes"""
+    # Listen before catching up so no change falls in between
+    listener = inbox_hub.listen([owner_id]) if keep_open else None
+    try:
+        yield f"retry: {Config.SSE_RETRY_MS if keep_open else Config.SSE_POLL_RETRY_MS}\n\n"
+        if since is not None:
+            yield from _request_events(JoinRequest.find_updated_for_owner(owner_id, since=since, projection='card'))
+        if not keep_open:
+            return
+        deadline = time.monotonic() + Config.SSE_MAX_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            changes = inbox_hub.wait(listener, Config.SSE_HEARTBEAT_SECONDS)
+            if not changes:
+                yield ": keep-alive\n\n"
+                continue
+            yield from _request_events(
+                JoinRequest.find_updated_for_owner(owner_id, request_ids=list(changes), projection='card')
+            )
+    finally:
+        if listener is not None:
+            inbox_hub.close(listener)
+
+
+@requests_bp.route('/received/stream', methods=['GET'])
+@login_required
+@pg_owner_required
+def received_stream():
+    """Server-Sent Events stream of new and changed requests for the owner's inbox"""
+    # A reconnecting EventSource resumes from the last event it received
+    since = from_stamp(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    return Response(
+        stream_with_context(_inbox_events(session['user_id'], since, streaming_supported(request.environ))),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 
 @requests_bp.route('/<request_id>/approve', methods=['POST'])
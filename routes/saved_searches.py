@@ -0,0 +1,67 @@
+"""
+Saved search routes (save, list with matches feed, delete).
+"""
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from models.saved_search import SavedSearch
+from utils.decorators import role_required
+from utils.views import present
+import logging
+
+logger = logging.getLogger(__name__)
+
+saved_searches_bp = Blueprint('saved_searches', __name__, url_prefix='/saved-searches')
+
+
+@saved_searches_bp.route('', methods=['GET'])
+@role_required('student')
+def index():
+    """List the student's saved searches and their new matches"""
+    user_id = session['user_id']
+    searches = SavedSearch.find_by_user(user_id)
+    feed = SavedSearch.feed(user_id)
+    unread_ids = [entry['_id'] for entry in feed if not entry.get('read')]
+    unread = len(unread_ids)
+
+    response = render_template('saved_searches/index.html',
+                               searches=present(searches),
+                               feed=present(feed),
+                               unread=unread)
+    # Viewing the feed marks the entries shown as seen
+    if unread_ids:
+        SavedSearch.mark_read(user_id, unread_ids)
+    return response
+
+
+@saved_searches_bp.route('', methods=['POST'])
+@role_required('student')
+def create():
+    """Save the current search filters"""
+    try:
+        SavedSearch.create(
+            session['user_id'],
+            name=request.form.get('name'),
+            city=request.form.get('city', '').strip() or None,
+            min_rent=request.form.get('min_rent', type=float),
+            max_rent=request.form.get('max_rent', type=float),
+            facilities=request.form.getlist('facilities') or None,
+            nearby_college=request.form.get('nearby_college', '').strip() or None,
+            nearby_workplace=request.form.get('nearby_workplace', '').strip() or None
+        )
+        flash("Search saved! We'll list new matching PGs here as they become available.", 'success')
+    except ValueError as e:
+        flash(str(e), 'danger')
+    except Exception as e:
+        logger.error(f"Error saving search: {e}")
+        flash('An error occurred. Please try again.', 'danger')
+    return redirect(url_for('saved_searches.index'))
+
+
+@saved_searches_bp.route('/<search_id>/delete', methods=['POST'])
+@role_required('student')
+def delete(search_id):
+    """Delete a saved search"""
+    if SavedSearch.delete(search_id, session['user_id']):
+        flash('Saved search deleted.', 'success')
+    else:
+        flash('Saved search not found.', 'danger')
+    return redirect(url_for('saved_searches.index'))
@@ -0,0 +1,19 @@
+"""
+Shared fixtures.
+
+Model tests run against mongomock, an in-memory stand-in for MongoDB
+(pip install -r requirements-dev.txt).
+"""
+import pytest
+from models import database
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Point the models at a fresh in-memory database with the app's indexes"""
+    mongomock = pytest.importorskip('mongomock')
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(database, 'get_client', lambda: client)
+    monkeypatch.setattr(database, '_db', None)
+    database.ensure_indexes()
+    return database.get_db()
@@ -0,0 +1,115 @@
+"""
+Tests for the admission gate, with real threads waiting on it.
+"""
+import heapq
+import threading
+import time
+from utils.admission import Gate
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+
+def start_waiter(gate, priority, timeout, results, name):
+    def run():
+        results[name] = gate.acquire(priority, timeout)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_release_hands_slot_to_waiter():
+    gate = Gate('test', limit=1, max_queue=4)
+    assert gate.acquire(False, 0)
+    results = {}
+    thread = start_waiter(gate, False, 2, results, 'waiter')
+    wait_for(lambda: gate.metrics()['waiting'] == 1)
+    gate.release()
+    thread.join()
+    assert results['waiter'] is True
+    # The slot passed over directly, without being freed in between
+    assert gate.in_flight == 1
+    gate.release()
+    assert gate.in_flight == 0
+
+
+def test_waiter_times_out_and_is_shed():
+    gate = Gate('test', limit=1, max_queue=4)
+    assert gate.acquire(False, 0)
+    assert gate.acquire(False, 0.01) is False
+    metrics = gate.metrics()
+    assert metrics['waiting'] == 0
+    assert metrics['shed'] == 1
+    gate.release()
+    assert gate.in_flight == 0
+
+
+def test_slot_handed_over_as_wait_times_out_is_kept():
+    gate = Gate('test', limit=1, max_queue=4)
+    assert gate.acquire(False, 0)
+    results = {}
+    thread = start_waiter(gate, False, 0.05, results, 'waiter')
+    wait_for(lambda: gate.metrics()['waiting'] == 1)
+    # Let the wait time out, then hand the slot over (as release() does)
+    # before the waiter gets the lock back to give up
+    with gate._lock:
+        time.sleep(0.1)
+        heapq.heappop(gate._waiters)[2].set()
+    thread.join()
+    assert results['waiter'] is True
+    assert gate.metrics()['shed'] == 0
+    assert gate.in_flight == 1
+    gate.release()
+    assert gate.in_flight == 0
+
+
+def test_priority_waiters_go_first():
+    gate = Gate('test', limit=1, max_queue=4)
+    assert gate.acquire(False, 0)
+    results = {}
+    order = []
+    threads = []
+    for name, priority in (('student-1', False), ('owner', True), ('student-2', False)):
+        def run(name=name, priority=priority):
+            results[name] = gate.acquire(priority, 2)
+            order.append(name)
+            gate.release()
+        thread = threading.Thread(target=run)
+        thread.start()
+        threads.append(thread)
+        wait_for(lambda n=len(threads): gate.metrics()['waiting'] == n)
+    gate.release()
+    for thread in threads:
+        thread.join()
+    assert order == ['owner', 'student-1', 'student-2']
+    assert all(results.values())
+    assert gate.metrics()['priority_admitted'] == 1
+    assert gate.in_flight == 0
+
+
+def test_full_queue_sheds_all_but_priority():
+    gate = Gate('test', limit=1, max_queue=1)
+    assert gate.acquire(False, 0)
+    results = {}
+    waiter = start_waiter(gate, False, 2, results, 'queued')
+    wait_for(lambda: gate.metrics()['waiting'] == 1)
+    # No room in the queue: shed at once rather than after a wait
+    started = time.monotonic()
+    assert gate.acquire(False, 2) is False
+    assert time.monotonic() - started < 0.5
+    # Priority requests queue past the limit
+    owner = start_waiter(gate, True, 2, results, 'owner')
+    wait_for(lambda: gate.metrics()['waiting'] == 2)
+    gate.release()
+    owner.join()
+    assert results['owner'] is True
+    gate.release()
+    waiter.join()
+    assert results['queued'] is True
+    gate.release()
+    assert gate.in_flight == 0
+    assert gate.metrics()['shed'] == 1
@@ -0,0 +1,72 @@
+"""
+Tests for the process-local cache: tag invalidation racing a load.
+"""
+import threading
+from utils.cache import LocalCache
+from utils import resilience
+
+
+def test_get_or_set_caches_loaded_value():
+    cache = LocalCache(max_entries=10, default_ttl=60)
+    assert cache.get_or_set('k', lambda: 1, tags=['pg:1']) == 1
+    assert cache.get_or_set('k', lambda: 2, tags=['pg:1']) == 1
+
+
+def test_invalidation_during_load_is_not_cached():
+    cache = LocalCache(max_entries=10, default_ttl=60)
+    loading = threading.Event()
+    invalidated = threading.Event()
+
+    def slow_loader():
+        loading.set()
+        invalidated.wait(5)
+        return 'old'
+
+    def invalidate():
+        loading.wait(5)
+        cache.invalidate_tags(['pg:1'])
+        invalidated.set()
+
+    thread = threading.Thread(target=invalidate)
+    thread.start()
+    assert cache.get_or_set('k', slow_loader, tags=['pg:1']) == 'old'
+    thread.join()
+
+    assert cache.get('k') is None
+    assert cache.metrics()['stale_loads'] == 1
+    assert cache.get_or_set('k', lambda: 'new', tags=['pg:1']) == 'new'
+    assert cache.get('k') == 'new'
+
+
+def test_invalidation_of_other_tag_does_not_drop_load():
+    cache = LocalCache(max_entries=10, default_ttl=60)
+
+    def loader():
+        cache.invalidate_tags(['pg:2'])
+        return 'value'
+
+    cache.get_or_set('k', loader, tags=['pg:1'])
+    assert cache.get('k') == 'value'
+
+
+def test_generations_are_dropped_after_loads():
+    cache = LocalCache(max_entries=10, default_ttl=60)
+
+    def loader():
+        cache.invalidate_tags(['pg:1'])
+        return 'value'
+
+    cache.get_or_set('k', loader, tags=['pg:1'])
+    cache.invalidate_tags(['pg:1'])
+    assert cache._loads == {} and cache._generations == {}
+
+
+def test_cached_read_skips_set_across_invalidation():
+    cache = LocalCache(max_entries=10, default_ttl=60)
+
+    def loader():
+        cache.invalidate_tags(['stats'])
+        return 'value'
+
+    assert resilience.cached_read(cache, 'test_cache:k', loader, tags=['stats']) == 'value'
+    assert cache.get('test_cache:k') is None
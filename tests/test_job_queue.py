@@ -0,0 +1,139 @@
+"""
+Tests for the durable job queue: claiming, leases, retries, idempotency
+and the pending_jobs outbox.
+"""
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from config import Config
+from models.job_queue import JobQueue
+from models.join_request import JoinRequest
+import models.pg_listing  # noqa: F401 (registers the pg.reserve_room job)
+
+calls = []
+
+
+@JobQueue.handler('test.record')
+def _record(value):
+    calls.append(value)
+
+
+@JobQueue.handler('test.explode')
+def _explode():
+    raise RuntimeError('boom')
+
+
+@pytest.fixture(autouse=True)
+def queue_enabled(monkeypatch):
+    monkeypatch.setattr(Config, 'JOB_QUEUE_ENABLED', True)
+    calls.clear()
+
+
+def _expire_lease(db, job):
+    db.jobs.update_one({'_id': job['_id']}, {'$set': {'locked_until': datetime.utcnow() - timedelta(seconds=1)}})
+
+
+def test_same_idempotency_key_enqueues_once(db):
+    first = JobQueue.enqueue('test.record', {'value': 1}, idempotency_key='k1')
+    second = JobQueue.enqueue('test.record', {'value': 2}, idempotency_key='k1')
+    assert db.jobs.count_documents({}) == 1
+    assert second['_id'] == first['_id']
+
+
+def test_unknown_job_is_rejected(db):
+    with pytest.raises(ValueError):
+        JobQueue.enqueue('test.missing')
+
+
+def test_claim_skips_delayed_jobs(db):
+    JobQueue.enqueue('test.record', {'value': 1}, delay=60)
+    assert JobQueue.claim('w1') is None
+    JobQueue.enqueue('test.record', {'value': 2})
+    job = JobQueue.claim('w1')
+    assert job['payload'] == {'value': 2}
+    assert job['status'] == 'running' and job['attempts'] == 1
+    assert JobQueue.claim('w2') is None
+
+
+def test_expired_lease_is_reclaimed_and_old_worker_cannot_complete(db):
+    JobQueue.enqueue('test.record', {'value': 1})
+    job = JobQueue.claim('w1')
+    _expire_lease(db, job)
+
+    reclaimed = JobQueue.claim('w2')
+    assert reclaimed['_id'] == job['_id']
+    assert reclaimed['locked_by'] == 'w2' and reclaimed['attempts'] == 2
+
+    JobQueue.complete(job, 'w1')
+    assert db.jobs.find_one({'_id': job['_id']})['status'] == 'running'
+    assert JobQueue.run(reclaimed, 'w2')
+    assert db.jobs.find_one({'_id': job['_id']})['status'] == 'done'
+    assert calls == [1]
+
+
+def test_failed_attempt_is_retried_with_backoff(db, monkeypatch):
+    monkeypatch.setattr(Config, 'JOB_RETRY_BASE_SECONDS', 10)
+    JobQueue.enqueue('test.explode', max_attempts=2)
+
+    job = JobQueue.claim('w1')
+    assert not JobQueue.run(job, 'w1')
+    stored = db.jobs.find_one({'_id': job['_id']})
+    assert stored['status'] == 'queued'
+    assert stored['run_at'] > datetime.utcnow() + timedelta(seconds=5)
+    assert 'boom' in stored['last_error']
+    assert JobQueue.claim('w1') is None
+
+
+def test_job_out_of_attempts_fails_and_expires(db):
+    JobQueue.enqueue('test.explode', max_attempts=1)
+    job = JobQueue.claim('w1')
+    assert not JobQueue.run(job, 'w1')
+    stored = db.jobs.find_one({'_id': job['_id']})
+    assert stored['status'] == 'failed'
+    # Picked up by the completed_at TTL index
+    assert stored['completed_at'] is not None
+
+
+def _join_request(db):
+    request_id = ObjectId()
+    db.join_requests.insert_one({
+        '_id': request_id, 'pg_id': ObjectId(), 'pg_owner_id': ObjectId(),
+        'student_id': ObjectId(), 'status': 'pending', 'created_at': datetime.utcnow()
+    })
+    return request_id
+
+
+def test_approval_flushes_its_outbox(db):
+    request_id = _join_request(db)
+    JoinRequest.approve(str(request_id))
+    assert db.jobs.count_documents({'idempotency_key': f"reserve_room:{request_id}"}) == 1
+    assert db.join_requests.find_one({'_id': request_id}).get('pending_jobs') == []
+
+
+def test_failed_enqueue_leaves_job_for_the_sweep(db, monkeypatch):
+    request_id = _join_request(db)
+    real_enqueue = JobQueue.enqueue
+
+    def unavailable(*args, **kwargs):
+        raise ConnectionError('jobs collection unavailable')
+
+    monkeypatch.setattr(JobQueue, 'enqueue', unavailable)
+    JoinRequest.approve(str(request_id))
+    stored = db.join_requests.find_one({'_id': request_id})
+    assert stored['status'] == 'approved'
+    assert [e['name'] for e in stored['pending_jobs']] == ['pg.reserve_room']
+    assert db.jobs.count_documents({}) == 0
+
+    monkeypatch.setattr(JobQueue, 'enqueue', real_enqueue)
+    assert JobQueue.sweep_outboxes(grace_seconds=60) == 0
+    assert JobQueue.sweep_outboxes(grace_seconds=0) == 1
+    assert db.jobs.count_documents({'idempotency_key': f"reserve_room:{request_id}"}) == 1
+    assert db.join_requests.find_one({'_id': request_id})['pending_jobs'] == []
+
+
+def test_reapproval_records_no_job(db):
+    request_id = _join_request(db)
+    JoinRequest.approve(str(request_id))
+    db.jobs.delete_many({})
+    JoinRequest.approve(str(request_id))
+    assert db.jobs.count_documents({}) == 0
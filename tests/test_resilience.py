@@ -0,0 +1,113 @@
+"""
+Tests for the read circuit breaker and the last-known-good fallback.
+"""
+import time
+import pytest
+from flask import Flask, g
+from pymongo.errors import AutoReconnect, ExecutionTimeout, OperationFailure
+from config import Config
+from utils import resilience
+from utils.resilience import CircuitBreaker, CircuitOpenError
+
+
+def fail(error):
+    def call():
+        raise error
+    return call
+
+
+def test_opens_after_threshold_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(AutoReconnect):
+            breaker.call(fail(AutoReconnect('down')))
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 'ok')
+    assert breaker.metrics()['short_circuited'] == 1
+
+
+def test_query_errors_do_not_open():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    with pytest.raises(OperationFailure):
+        breaker.call(fail(OperationFailure('bad query')))
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_half_open_probe_success_closes():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    with pytest.raises(AutoReconnect):
+        breaker.call(fail(AutoReconnect('down')))
+    time.sleep(0.02)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.call(lambda: 'ok') == 'ok'
+
+
+def test_half_open_probe_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    with pytest.raises(AutoReconnect):
+        breaker.call(fail(AutoReconnect('down')))
+    time.sleep(0.02)
+    with pytest.raises(AutoReconnect):
+        breaker.call(fail(AutoReconnect('still down')))
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened == 2
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 'ok')
+
+
+def test_killed_probe_frees_the_slot():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    with pytest.raises(AutoReconnect):
+        breaker.call(fail(AutoReconnect('down')))
+    time.sleep(0.02)
+    with pytest.raises(KeyboardInterrupt):
+        breaker.call(fail(KeyboardInterrupt()))
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_deadline_cancellation_is_neutral():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    app = Flask(__name__)
+    with app.test_request_context():
+        g.deadline = time.monotonic() + 5
+        with pytest.raises(ExecutionTimeout):
+            breaker.call(fail(ExecutionTimeout('operation exceeded time limit', 50)))
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0 and breaker.successes == 0
+
+
+def test_execution_timeout_without_deadline_is_a_failure():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    with pytest.raises(ExecutionTimeout):
+        breaker.call(fail(ExecutionTimeout('operation exceeded time limit', 50)))
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+@pytest.fixture
+def fresh_breaker(monkeypatch):
+    monkeypatch.setattr(resilience, 'breaker', CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    monkeypatch.setattr(resilience, 'last_good', resilience.LocalCache(10, 60))
+
+
+def test_stale_result_served_while_failing(fresh_breaker):
+    assert resilience.read_or_stale('k', lambda: [1, 2]) == ([1, 2], None)
+    value, age = resilience.read_or_stale('k', fail(AutoReconnect('down')))
+    assert value == [1, 2] and age is not None
+
+
+def test_large_results_are_not_kept(fresh_breaker, monkeypatch):
+    monkeypatch.setattr(Config, 'BREAKER_STALE_MAX_ITEMS', 2)
+    resilience.read('k', lambda: [1, 2])
+    resilience.read('k', lambda: [1, 2, 3])
+    assert resilience.last_good.get('k') is None
+    with pytest.raises(resilience.ReadUnavailable):
+        resilience.read('k', fail(AutoReconnect('down')))
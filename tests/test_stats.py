@@ -0,0 +1,80 @@
+"""
+Tests for the materialized listing and owner counters.
+"""
+import pytest
+from bson import ObjectId
+from config import Config
+from models import stats
+from models.stats import ListingStats, OwnerStats, RentStats
+
+
+@pytest.fixture(autouse=True)
+def counters_enabled(monkeypatch):
+    monkeypatch.setattr(Config, 'USE_MATERIALIZED_COUNTERS', True)
+
+
+def add_listing(db, status, owner_id=None, rooms=1):
+    db.pg_listings.insert_one({'status': status, 'owner_id': owner_id or ObjectId(), 'available_rooms': rooms})
+
+
+def test_transition_before_first_read_is_not_lost(db):
+    add_listing(db, 'pending')
+    ListingStats.record_transition(None, 'pending')
+    # The upserted document holds only the increment and is rebuilt on read
+    assert ListingStats.get()['pending'] == 1
+    add_listing(db, 'approved')
+    ListingStats.record_transition(None, 'approved')
+    assert ListingStats.get() == {'pending': 1, 'approved': 1, 'rejected': 0, 'total': 2}
+
+
+def test_rebuild_recomputes_when_a_transition_lands_during_it(db, monkeypatch):
+    add_listing(db, 'pending')
+    ListingStats.rebuild()
+    aggregate = ListingStats.aggregate
+    calls = []
+
+    def racing_aggregate():
+        counts = aggregate()
+        if not calls:
+            # A listing is created after the scan but before the replace
+            add_listing(db, 'approved')
+            ListingStats.record_transition(None, 'approved')
+        calls.append(counts)
+        return counts
+
+    monkeypatch.setattr(ListingStats, 'aggregate', staticmethod(racing_aggregate))
+    ListingStats.rebuild()
+    monkeypatch.setattr(ListingStats, 'aggregate', staticmethod(aggregate))
+
+    assert len(calls) == 2
+    assert ListingStats.get() == {'pending': 1, 'approved': 1, 'rejected': 0, 'total': 2}
+
+
+def test_total_counts_known_statuses_only(db, monkeypatch):
+    add_listing(db, 'pending')
+    add_listing(db, 'draft')
+    assert ListingStats.aggregate()['total'] == 1
+    assert ListingStats.get()['total'] == 1
+    monkeypatch.setattr(Config, 'USE_MATERIALIZED_COUNTERS', False)
+    assert ListingStats.get()['total'] == 1
+
+
+def test_owner_stats_follow_increments(db):
+    owner_id = ObjectId()
+    add_listing(db, 'approved', owner_id, rooms=3)
+    assert OwnerStats.get(owner_id)['available_rooms'] == 3
+    db.pg_listings.update_one({'owner_id': owner_id}, {'$inc': {'available_rooms': -1}})
+    OwnerStats.apply(owner_id, rooms_delta=-1)
+    OwnerStats.apply(owner_id, pending_requests_delta=1)
+    result = OwnerStats.get(owner_id)
+    assert result['available_rooms'] == 2
+    assert result['pending_requests'] == 1
+    assert result['listings']['total'] == 1
+    assert db.owner_stats.find_one({'_id': owner_id})['version'] == 3
+    assert stats._needs_rebuild(db.owner_stats.find_one({'_id': owner_id})) is False
+
+
+def test_rent_histogram_of_equal_rents_is_one_bucket(db):
+    for _ in range(3):
+        db.pg_listings.insert_one({'status': 'approved', 'available_rooms': 1, 'city': 'Pune', 'rent': 5000})
+    assert RentStats.compute('pune')['histogram'] == [{'from': 5000, 'to': 5000, 'count': 3}]
@@ -0,0 +1,196 @@
+"""
+Admission control for database-heavy requests.
+
+Endpoints are grouped into route classes (ADMISSION_CLASSES: search,
+dashboard, admin), each with its own limit on requests in flight per
+worker (ADMISSION_LIMITS). A request over the limit waits briefly for a
+slot; if none frees up in time, or the wait queue is full, it is shed
+with a 503 and Retry-After instead of adding to the pile on MongoDB.
+
+Signed-in owners and admins have priority: they are handed freed slots
+before anyone else, wait longer (ADMISSION_PRIORITY_QUEUE_TIMEOUT) and are
+never turned away for a full queue.
+
+Endpoints outside every class (static files, health checks, live
+streams, listing pages) are not limited.
+"""
+import heapq
+import itertools
+import os
+import threading
+from flask import g, jsonify, render_template, request, session
+from config import Config
+
+PRIORITY_ROLES = ('pg_owner', 'admin')
+
+
+def parse_classes(spec):
+    """
+    Parse endpoint -> route class pairs.
+
+    Args:
+        spec: Comma-separated 'endpoint=class' pairs, e.g.
+            'pg.search=search,admin.*=admin'. 'blueprint.*' covers every
+            endpoint of a blueprint.
+
+    Returns:
+        Dictionary of endpoint pattern -> route class
+    """
+    classes = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        endpoint, _, route_class = item.partition('=')
+        classes[endpoint.strip()] = route_class.strip()
+    return classes
+
+
+class Gate:
+    """Limit on requests in flight, with a short priority-ordered wait queue"""
+
+    def __init__(self, name, limit, max_queue):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._waiters = []  # heap of (0 for priority, seq, event)
+        self.in_flight = 0
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.priority_admitted = 0
+
+    def acquire(self, priority, timeout):
+        """
+        Take a slot, waiting up to timeout seconds for one.
+
+        Returns:
+            True if the request was admitted, False if it should be shed
+        """
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self.in_flight += 1
+                self._admit(priority)
+                return True
+            if not priority and len(self._waiters) >= self.max_queue:
+                self.shed += 1
+                return False
+            waiter = (0 if priority else 1, next(self._seq), threading.Event())
+            heapq.heappush(self._waiters, waiter)
+            self.queued += 1
+
+        waiter[2].wait(timeout)
+        with self._lock:
+            # A slot may have been handed over just as the wait timed out
+            if waiter[2].is_set():
+                self._admit(priority)
+                return True
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+            self.shed += 1
+            return False
+
+    def _admit(self, priority):
+        self.admitted += 1
+        if priority:
+            self.priority_admitted += 1
+
+    def release(self):
+        """Free a slot, handing it straight to the first waiter if there is one"""
+        with self._lock:
+            if self._waiters:
+                heapq.heappop(self._waiters)[2].set()
+            else:
+                self.in_flight -= 1
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'in_flight': self.in_flight,
+                'waiting': len(self._waiters),
+                'admitted': self.admitted,
+                'priority_admitted': self.priority_admitted,
+                'queued': self.queued,
+                'shed': self.shed,
+            }
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._waiters = []
+        self.in_flight = 0
+
+
+classes = parse_classes(Config.ADMISSION_CLASSES)
+gates = {
+    name: Gate(name, int(limit), Config.ADMISSION_QUEUE_SIZE)
+    for name, limit in parse_classes(Config.ADMISSION_LIMITS).items()
+}
+
+
+def gate_for(endpoint):
+    """Get the gate limiting an endpoint, None if it is not limited"""
+    route_class = classes.get(endpoint)
+    if route_class is None:
+        blueprint = (endpoint or '').rpartition('.')[0]
+        route_class = classes.get(f'{blueprint}.*')
+    return gates.get(route_class)
+
+
+def has_priority():
+    """Check whether the current user is a signed-in owner or admin"""
+    return 'user_id' in session and session.get('user_role') in PRIORITY_ROLES
+
+
+def metrics():
+    return {
+        'enabled': Config.ADMISSION_ENABLED,
+        'classes': {name: gate.metrics() for name, gate in gates.items()},
+    }
+
+
+def _shed_response():
+    if request.path.startswith('/api/'):
+        body = jsonify({'error': 'Server is busy, please retry shortly'})
+    else:
+        body = render_template('errors/503.html')
+    return body, 503, {'Retry-After': str(Config.ADMISSION_RETRY_AFTER)}
+
+
+def init_app(app):
+    """
+    Admit or shed each request before it runs.
+
+    Call before deadlines.init_app(), so time spent waiting for a slot does
+    not count against the request's database deadline.
+    """
+    if not Config.ADMISSION_ENABLED:
+        return
+
+    @app.before_request
+    def admit():
+        gate = gate_for(request.endpoint)
+        if gate is None:
+            return None
+        priority = has_priority()
+        timeout = Config.ADMISSION_PRIORITY_QUEUE_TIMEOUT if priority else Config.ADMISSION_QUEUE_TIMEOUT
+        if not gate.acquire(priority, timeout):
+            return _shed_response()
+        g.admission_gate = gate
+        return None
+
+    @app.teardown_request
+    def release(exc):
+        gate = g.pop('admission_gate', None)
+        if gate is not None:
+            gate.release()
+
+
+def _reset_after_fork():
+    for gate in gates.values():
+        gate.reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,199 @@
+"""
+In-memory typeahead index for the search form.
+
+Holds the distinct city, nearby college and nearby workplace values of
+approved listings as sorted arrays of casefolded keys, so a prefix lookup
+is a bisect plus a short scan. Each value is reference counted by the
+listings that contribute it. The index is built once per worker during
+warm-up and kept current from 'pg_listing' invalidation events, which
+re-read only the changed listing. If that build fails, a lookup starts
+another in the background, at most every AUTOCOMPLETE_RETRY_SECONDS.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from bson import ObjectId
+from models.database import get_collection
+from utils import invalidation
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Request field name -> listing field
+FIELDS = {
+    'city': 'city',
+    'college': 'nearby_colleges',
+    'workplace': 'nearby_workplaces',
+}
+
+
+def _values(pg, field):
+    value = pg.get(field)
+    values = value if isinstance(value, list) else [value]
+    return {v.strip() for v in values if isinstance(v, str) and v.strip()}
+
+
+class PrefixIndex:
+    """Reference-counted sorted index of listing values per field"""
+
+    def __init__(self):
+        self._keys = {field: [] for field in FIELDS.values()}  # sorted casefolded keys
+        self._entries = {field: {} for field in FIELDS.values()}  # key -> [display, refcount]
+        self._listings = {}  # listing id -> {field: set of values}
+        self._lock = threading.Lock()
+        self._pending = None  # listing ids changed while a build is running
+        self._retry_at = 0
+        self.built = False
+        self.lookups = 0
+        self.build_failures = 0
+
+    def _add(self, field, value):
+        key = value.casefold()
+        entry = self._entries[field].get(key)
+        if entry is None:
+            self._entries[field][key] = [value, 1]
+            bisect.insort(self._keys[field], key)
+        else:
+            entry[1] += 1
+
+    def _remove(self, field, value):
+        key = value.casefold()
+        entry = self._entries[field].get(key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._entries[field][key]
+            keys = self._keys[field]
+            del keys[bisect.bisect_left(keys, key)]
+
+    def _apply(self, listing_id, pg):
+        """Replace a listing's contribution; pg is None when it no longer counts"""
+        old = self._listings.pop(listing_id, {})
+        for field, values in old.items():
+            for value in values:
+                self._remove(field, value)
+        if pg is None:
+            return
+        new = {field: _values(pg, field) for field in FIELDS.values()}
+        for field, values in new.items():
+            for value in values:
+                self._add(field, value)
+        self._listings[listing_id] = new
+
+    def build(self):
+        """
+        Load every approved listing.
+
+        Listings changed while the scan runs are re-read afterwards, so no
+        update is lost between the scan and the swap. A failed build leaves
+        the index as it was, to be retried by a later lookup.
+        """
+        with self._lock:
+            if self._pending is not None:
+                return
+            self._pending = set()
+        try:
+            fresh = PrefixIndex()
+            projection = {field: 1 for field in FIELDS.values()}
+            for pg in get_collection('pg_listings').find({'status': 'approved'}, projection):
+                fresh._apply(str(pg['_id']), pg)
+        except BaseException:
+            with self._lock:
+                self._pending = None
+                self.build_failures += 1
+                self._retry_at = time.monotonic() + Config.AUTOCOMPLETE_RETRY_SECONDS
+            raise
+        with self._lock:
+            self._keys, self._entries, self._listings = fresh._keys, fresh._entries, fresh._listings
+            pending, self._pending = self._pending, None
+            self.built = True
+        for listing_id in pending:
+            self.refresh(listing_id)
+        logger.info(f"Autocomplete index built from {len(self._listings)} listings")
+
+    def refresh(self, listing_id, deleted=False):
+        """Re-read one listing and update its contribution"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.add(listing_id)
+                return
+            if not self.built:
+                return
+        pg = None
+        if not deleted:
+            pg = get_collection('pg_listings').find_one(
+                {'_id': ObjectId(listing_id), 'status': 'approved'},
+                {field: 1 for field in FIELDS.values()}
+            )
+        with self._lock:
+            self._apply(listing_id, pg)
+
+    def suggest(self, field, prefix, limit=10):
+        """
+        Get values of a field starting with a prefix (case-insensitive).
+
+        Args:
+            field: Listing field ('city', 'nearby_colleges', 'nearby_workplaces')
+            prefix: Typed prefix
+            limit: Maximum number of suggestions
+
+        Returns:
+            List of display values in alphabetical order
+        """
+        prefix = prefix.strip().casefold()
+        with self._lock:
+            self.lookups += 1
+            if not self.built and self._pending is None and time.monotonic() >= self._retry_at:
+                # Claim the retry so concurrent lookups do not start more
+                self._retry_at = time.monotonic() + Config.AUTOCOMPLETE_RETRY_SECONDS
+                threading.Thread(target=self._retry_build, name='autocomplete-build', daemon=True).start()
+            keys = self._keys[field]
+            entries = self._entries[field]
+            results = []
+            i = bisect.bisect_left(keys, prefix)
+            while i < len(keys) and len(results) < limit and keys[i].startswith(prefix):
+                results.append(entries[keys[i]][0])
+                i += 1
+            return results
+
+    def _retry_build(self):
+        try:
+            self.build()
+        except Exception as e:
+            logger.warning(f"Autocomplete index build failed: {e}")
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'built': self.built,
+                'listings': len(self._listings),
+                'values': {field: len(keys) for field, keys in self._keys.items()},
+                'lookups': self.lookups,
+                'build_failures': self.build_failures,
+            }
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        # A build in flight belonged to one of the parent's threads
+        self._pending = None
+
+
+index = PrefixIndex()
+
+
+def build_index():
+    """Warm-up task: build the index for this process"""
+    index.build()
+
+
+@invalidation.subscribe
+def _on_change(event):
+    if event['entity'] == 'pg_listing' and event.get('entity_id'):
+        index.refresh(event['entity_id'], deleted=event.get('data', {}).get('deleted', False))
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=index.reset_after_fork)
@@ -0,0 +1,234 @@
+"""
+Per-process cache with TTL, LRU eviction and entity tags.
+
+Entries are tagged with the entities they were built from, e.g.
+'pg_listing:<id>' for a single listing or 'pg_listing:*' for anything
+derived from the whole collection. Invalidation events from the bus in
+utils/invalidation.py evict by tag.
+
+A value loaded while one of its tags is invalidated may already be out of
+date, and there is nothing to evict yet when the event arrives. Loads are
+therefore tracked (loading()): invalidating a tag bumps its generation,
+and a load whose tags moved on is returned but not stored.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from config import Config
+
+_MISSING = object()
+
+
+def entity_tag(entity, entity_id=None):
+    """
+    Build a cache tag for an entity.
+
+    Args:
+        entity: Entity type, e.g. 'pg_listing'
+        entity_id: Entity ID, or None for the collection-wide tag
+
+    Returns:
+        Tag string
+    """
+    return f"{entity}:{entity_id if entity_id is not None else '*'}"
+
+
+class LocalCache:
+    """Thread-safe in-memory cache"""
+
+    def __init__(self, max_entries, default_ttl):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}  # tag -> set of keys
+        self._loads = {}  # tag -> loads in flight
+        self._generations = {}  # tag -> invalidations during those loads
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_loads = 0
+
+    def get(self, key, default=None):
+        """Get a cached value, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None, tags=()):
+        """
+        Store a value.
+
+        Args:
+            key: Cache key
+            value: Value to store
+            ttl: Seconds to keep the value, defaults to default_ttl
+            tags: Entity tags that invalidate this entry
+        """
+        with self._lock:
+            self._set(key, value, ttl, tags)
+
+    def _set(self, key, value, ttl, tags):
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.default_ttl)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, value, tuple(tags))
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    @contextmanager
+    def loading(self, tags=()):
+        """
+        Track a load of a value built from the given tags.
+
+        Usage:
+            with cache.loading(tags) as load:
+                value = compute()
+                load.set(key, value, ttl=ttl)
+
+        Yields:
+            Load whose set() stores the value only if none of the tags was
+            invalidated since the load began
+        """
+        tags = tuple(tags)
+        with self._lock:
+            for tag in tags:
+                self._loads[tag] = self._loads.get(tag, 0) + 1
+            started = tuple(self._generations.get(tag, 0) for tag in tags)
+        try:
+            yield _Load(self, tags, started)
+        finally:
+            with self._lock:
+                for tag in tags:
+                    self._loads[tag] -= 1
+                    if not self._loads[tag]:
+                        del self._loads[tag]
+                        self._generations.pop(tag, None)
+
+    def _set_loaded(self, load, key, value, ttl):
+        with self._lock:
+            if tuple(self._generations.get(tag, 0) for tag in load.tags) != load.started:
+                self.stale_loads += 1
+                return False
+            self._set(key, value, ttl, load.tags)
+            return True
+
+    def get_or_set(self, key, loader, ttl=None, tags=()):
+        """
+        Get a cached value, computing and storing it on a miss.
+
+        A value whose tags are invalidated while it is computed is returned
+        but not stored.
+
+        Args:
+            key: Cache key
+            loader: Callable producing the value
+            ttl: Seconds to keep the value
+            tags: Entity tags that invalidate this entry
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            with self.loading(tags) as load:
+                value = loader()
+                load.set(key, value, ttl=ttl)
+        return value
+
+    def delete(self, key):
+        """Remove a single key"""
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_tags(self, tags):
+        """
+        Evict every entry carrying any of the given tags.
+
+        Returns:
+            Number of entries evicted
+        """
+        evicted = 0
+        with self._lock:
+            for tag in tags:
+                if tag in self._loads:
+                    self._generations[tag] = self._generations.get(tag, 0) + 1
+                for key in self._tags.pop(tag, ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        evicted += 1
+        return evicted
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            for tag in self._loads:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def metrics(self):
+        """Get hit/miss counters for this process"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'stale_loads': self.stale_loads,
+            }
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        # Loads in flight belonged to the parent's threads
+        self._loads = {}
+        self._generations = {}
+
+
+class _Load:
+    """A load in flight, see LocalCache.loading()"""
+
+    __slots__ = ('cache', 'tags', 'started')
+
+    def __init__(self, cache, tags, started):
+        self.cache = cache
+        self.tags = tags
+        self.started = started
+
+    def set(self, key, value, ttl=None):
+        """
+        Store the loaded value, unless one of its tags was invalidated
+        during the load.
+
+        Returns:
+            True if the value was stored
+        """
+        return self.cache._set_loaded(self, key, value, ttl)
+
+
+cache = LocalCache(Config.CACHE_MAX_ENTRIES, Config.CACHE_DEFAULT_TTL)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=cache.reset_after_fork)
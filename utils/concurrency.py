@@ -0,0 +1,32 @@
+"""
+Helpers for code that runs under both threaded and gevent workers.
+"""
+import sys
+
+
+def gevent_patched():
+    """
+    Check whether gevent has monkey-patched threading in this process.
+
+    Under gunicorn's gevent worker, threading primitives are cooperative
+    and "threads" are greenlets sharing one OS thread.
+    """
+    if 'gevent.monkey' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('threading')
+
+
+def native_thread_pool_class():
+    """
+    Get a concurrent.futures executor class backed by real OS threads.
+
+    CPU-bound work (password hashing) submitted to a patched
+    ThreadPoolExecutor would run on greenlets and block the event loop,
+    so under gevent this returns gevent's native thread pool executor.
+    """
+    if gevent_patched():
+        from gevent.threadpool import ThreadPoolExecutor
+        return ThreadPoolExecutor
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor
@@ -0,0 +1,133 @@
+"""
+Per-request deadlines for database work.
+
+Each GET or HEAD request gets a time budget, REQUEST_DEADLINE_SECONDS
+unless REQUEST_DEADLINES sets one for its endpoint, entered as a
+pymongo.timeout() block in before_request and left in teardown. Every
+query the request makes, in any model, then runs with maxTimeMS and
+socket timeouts derived from the time remaining: the server cancels work
+that cannot finish in time and the worker moves on instead of waiting out
+socketTimeoutMS.
+
+Requests that write have no deadline: cancelling one between its write
+and the bookkeeping that follows (counters, outbox flush, invalidation)
+would leave them inconsistent for a while, and a write is worth waiting
+for. Jobs, CLI commands and other code outside a request have none either.
+"""
+import os
+import threading
+import time
+import pymongo
+from flask import g, has_request_context, request
+from pymongo.errors import PyMongoError, ServerSelectionTimeoutError
+from config import Config
+
+
+def parse_budgets(spec):
+    """
+    Parse per-endpoint budgets.
+
+    Args:
+        spec: Comma-separated 'endpoint=seconds' pairs, e.g.
+            'pg.search=3,admin.*=15'. 'blueprint.*' covers every endpoint
+            of a blueprint; 0 means no deadline.
+
+    Returns:
+        Dictionary of endpoint pattern -> seconds
+    """
+    budgets = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        endpoint, _, seconds = item.partition('=')
+        budgets[endpoint.strip()] = float(seconds)
+    return budgets
+
+
+READ_METHODS = ('GET', 'HEAD')
+
+budgets = parse_budgets(Config.REQUEST_DEADLINES)
+
+_lock = threading.Lock()
+_exceeded = {}  # endpoint -> requests that ran out of time
+
+
+def budget_for(endpoint):
+    """Get the deadline in seconds for an endpoint (0 for none)"""
+    if endpoint in budgets:
+        return budgets[endpoint]
+    blueprint = (endpoint or '').rpartition('.')[0]
+    return budgets.get(f'{blueprint}.*', Config.REQUEST_DEADLINE_SECONDS)
+
+
+def remaining():
+    """Get the seconds left before the current request's deadline, None if it has none"""
+    deadline = g.get('deadline') if has_request_context() else None
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def exceeded(error):
+    """
+    Check whether a database error is the request running out of time.
+
+    Under a deadline every timeout comes from the deadline, except server
+    selection: no reachable server is an outage, not a slow query.
+    """
+    return (
+        remaining() is not None
+        and isinstance(error, PyMongoError)
+        and getattr(error, 'timeout', False)
+        and not isinstance(error, ServerSelectionTimeoutError)
+    )
+
+
+def record_exceeded():
+    """Count the current request as having run out of time (once per request)"""
+    if g.get('deadline_exceeded'):
+        return
+    g.deadline_exceeded = True
+    with _lock:
+        _exceeded[request.endpoint] = _exceeded.get(request.endpoint, 0) + 1
+
+
+def metrics():
+    with _lock:
+        exceeded_by_endpoint = dict(_exceeded)
+    return {
+        'default_seconds': Config.REQUEST_DEADLINE_SECONDS,
+        'budgets': budgets,
+        'exceeded': exceeded_by_endpoint,
+    }
+
+
+def init_app(app):
+    """
+    Run every GET and HEAD request under its deadline.
+
+    Call before registering other before_request hooks, so their queries
+    fall under the deadline too.
+    """
+    @app.before_request
+    def start_deadline():
+        if request.method not in READ_METHODS:
+            return
+        seconds = budget_for(request.endpoint)
+        if seconds > 0:
+            g.deadline = time.monotonic() + seconds
+            g.deadline_scope = pymongo.timeout(seconds)
+            g.deadline_scope.__enter__()
+
+    @app.teardown_request
+    def end_deadline(exc):
+        scope = g.pop('deadline_scope', None)
+        if scope is not None:
+            scope.__exit__(None, None, None)
+
+
+def _reset_after_fork():
+    global _lock
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
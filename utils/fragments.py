@@ -0,0 +1,94 @@
+"""
+Template rendering caches.
+
+Listing cards are cached as rendered HTML fragments keyed by the listing's
+_id and updated_at, so a page of results is mostly a join of cached
+strings. Any write to a listing bumps updated_at, which makes the old
+fragment unreachable; it then ages out of the LRU. Compiled templates are
+kept in an on-disk bytecode cache shared by the workers on a host.
+
+Bytecode files are unmarshalled and executed, so the cache directory must
+be private to the app's user: anyone who can write to it can run code in
+the app.
+"""
+import logging
+import os
+import stat
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from config import Config
+from utils.cache import LocalCache
+
+logger = logging.getLogger(__name__)
+
+fragment_cache = LocalCache(Config.FRAGMENT_CACHE_MAX_ENTRIES, Config.FRAGMENT_CACHE_TTL)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=fragment_cache.reset_after_fork)
+
+
+def cached_fragment(name, doc, *vary, caller):
+    """
+    Render a fragment once per version of a document.
+
+    Usage in a template:
+        {% call cached_fragment('search_card', pg) %} ...markup... {% endcall %}
+
+    Args:
+        name: Fragment name, unique per template block
+        doc: Document the fragment renders (needs _id and updated_at)
+        *vary: Other values the markup depends on
+        caller: Block body, supplied by Jinja's call tag
+
+    Returns:
+        Rendered markup
+    """
+    updated_at = doc.get('updated_at') or doc.get('created_at')
+    if not Config.FRAGMENT_CACHE_ENABLED or updated_at is None:
+        return caller()
+    key = (name, str(doc['_id']), updated_at, *vary)
+    html = fragment_cache.get(key)
+    if html is None:
+        html = str(caller())
+        fragment_cache.set(key, html)
+    return Markup(html)
+
+
+def _private_cache_dir(path):
+    """
+    Create or check a bytecode cache directory.
+
+    Raises:
+        OSError: If the directory is not owned by this process's user, or
+            is writable by its group or others
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise OSError(f"{path} is not a directory")
+    if hasattr(os, 'getuid') and st.st_uid != os.getuid():
+        raise OSError(f"{path} is not owned by this user")
+    if st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise OSError(f"{path} is writable by other users")
+    return path
+
+
+def init_app(app):
+    """
+    Install the template caches on an app.
+
+    Must run before the first template is rendered, since the bytecode
+    cache is read when the Jinja environment is created.
+    """
+    cache_dir = app.config.get('JINJA_BYTECODE_CACHE_DIR')
+    if cache_dir:
+        try:
+            if cache_dir == 'auto':
+                # Jinja's per-user directory, created 0700 and ownership-checked
+                bytecode_cache = FileSystemBytecodeCache()
+            else:
+                bytecode_cache = FileSystemBytecodeCache(_private_cache_dir(cache_dir), '%s.jinja.cache')
+            app.jinja_options = {**app.jinja_options, 'bytecode_cache': bytecode_cache}
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"Jinja bytecode cache disabled, cannot use {cache_dir}: {e}")
+    app.add_template_global(cached_fragment)
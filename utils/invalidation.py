@@ -0,0 +1,238 @@
+"""
+Cross-worker cache invalidation bus.
+
+Model writes publish entity-level events ('pg_listing', 'join_request').
+The publishing process handles its own events immediately, then inserts
+them into the capped `cache_events` collection. Every worker runs a
+consumer thread that follows that collection, using a change stream where
+the deployment supports one (replica sets, Atlas) and a tailable cursor
+otherwise, and evicts matching cache entries within
+CACHE_EVENTS_MAX_LAG_MS.
+
+Other modules can subscribe() to receive every event, local or remote.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, OperationFailure, PyMongoError
+from config import Config
+from models import database
+from utils.cache import cache, entity_tag
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = 'cache_events'
+
+_subscribers = []
+_consumer_pid = None
+_lock = threading.Lock()
+
+
+class BusMetrics:
+    """Counters for the invalidation bus in this process"""
+
+    def __init__(self):
+        self.mode = None
+        self.published = 0
+        self.publish_errors = 0
+        self.received = 0
+        self.last_lag_ms = None
+        self.max_lag_ms = 0.0
+
+    def to_dict(self):
+        return {
+            'mode': self.mode,
+            'published': self.published,
+            'publish_errors': self.publish_errors,
+            'received': self.received,
+            'last_lag_ms': self.last_lag_ms,
+            'max_lag_ms': round(self.max_lag_ms, 3),
+        }
+
+
+metrics = BusMetrics()
+
+
+def _origin():
+    """Identify this worker process in published events"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def subscribe(callback):
+    """
+    Register a callback for every invalidation event.
+
+    Args:
+        callback: Callable taking the event dictionary, with keys
+            'entity', 'entity_id', 'data', 'origin' and 'ts'
+    """
+    if callback not in _subscribers:
+        _subscribers.append(callback)
+    return callback
+
+
+def _dispatch(event):
+    for callback in _subscribers:
+        try:
+            callback(event)
+        except Exception as e:
+            logger.error(f"Invalidation subscriber {getattr(callback, '__name__', callback)} failed: {e}")
+
+
+def publish(entity, entity_id=None, **data):
+    """
+    Publish an entity change to every worker.
+
+    Publishing never raises: a write that has already committed must not
+    fail because the bus is unavailable. Remote workers then rely on
+    their cache TTLs.
+
+    Args:
+        entity: Entity type, e.g. 'pg_listing'
+        entity_id: ID of the changed entity
+        **data: Extra event fields for subscribers (e.g. owner_id)
+    """
+    event = {
+        'entity': entity,
+        'entity_id': str(entity_id) if entity_id is not None else None,
+        'data': data,
+        'origin': _origin(),
+        'ts': datetime.utcnow(),
+    }
+    _dispatch(event)
+
+    if Config.CACHE_BUS_MODE == 'off':
+        return
+    try:
+        database.get_collection(COLLECTION).insert_one(dict(event))
+        metrics.published += 1
+    except PyMongoError as e:
+        metrics.publish_errors += 1
+        logger.warning(f"Could not publish invalidation event for {entity} {entity_id}: {e}")
+
+
+@subscribe
+def _evict(event):
+    """Evict cache entries tagged with the changed entity"""
+    entity = event['entity']
+    cache.invalidate_tags([entity_tag(entity), entity_tag(entity, event.get('entity_id'))])
+
+
+def ensure_collection():
+    """Create the capped events collection if it does not exist"""
+    db = database.get_db()
+    try:
+        db.create_collection(
+            COLLECTION,
+            capped=True,
+            size=Config.CACHE_EVENTS_SIZE_BYTES,
+            max=Config.CACHE_EVENTS_MAX_DOCS,
+        )
+        logger.info(f"Created capped collection {COLLECTION}")
+    except CollectionInvalid:
+        pass  # Already exists
+
+
+def _handle(doc):
+    """Apply an event received from the collection"""
+    if doc.get('origin') == _origin():
+        return  # Already applied when published
+    metrics.received += 1
+    ts = doc.get('ts')
+    if isinstance(ts, datetime):
+        lag_ms = max(0.0, (datetime.utcnow() - ts).total_seconds() * 1000)
+        metrics.last_lag_ms = round(lag_ms, 3)
+        metrics.max_lag_ms = max(metrics.max_lag_ms, lag_ms)
+    _dispatch(doc)
+
+
+def _replay(collection, since):
+    """Apply events recorded since a point in time; returns the newest ts seen"""
+    for doc in collection.find({'ts': {'$gte': since}}):
+        _handle(doc)
+        since = max(since, doc['ts'])
+    return since
+
+
+def _consume_change_stream(collection, since):
+    metrics.mode = 'change_stream'
+    with collection.watch(
+        [{'$match': {'operationType': 'insert'}}],
+        max_await_time_ms=Config.CACHE_EVENTS_MAX_LAG_MS,
+    ) as stream:
+        # Cover events inserted while the stream was being opened
+        since = _replay(collection, since)
+        for change in stream:
+            doc = change['fullDocument']
+            _handle(doc)
+            since = max(since, doc['ts'])
+    return since
+
+
+def _consume_tailable(collection, since):
+    metrics.mode = 'tailable'
+    cursor = collection.find(
+        {'ts': {'$gte': since}},
+        cursor_type=CursorType.TAILABLE_AWAIT,
+    ).max_await_time_ms(Config.CACHE_EVENTS_MAX_LAG_MS)
+    while cursor.alive:
+        for doc in cursor:
+            _handle(doc)
+            since = max(since, doc['ts'])
+    # A tailable cursor dies when the collection is empty or wraps
+    time.sleep(Config.CACHE_EVENTS_MAX_LAG_MS / 1000)
+    return since
+
+
+def _consume_loop():
+    collection = database.get_collection(COLLECTION)
+    # Small overlap to tolerate clock skew between hosts; evictions are idempotent
+    since = datetime.utcnow() - timedelta(seconds=1)
+    use_change_stream = Config.CACHE_BUS_MODE in ('auto', 'change_stream')
+    collection_ready = False
+    while True:
+        try:
+            if not collection_ready:
+                ensure_collection()
+                collection_ready = True
+            if use_change_stream:
+                try:
+                    since = _consume_change_stream(collection, since)
+                    continue
+                except OperationFailure as e:
+                    if Config.CACHE_BUS_MODE == 'change_stream':
+                        raise
+                    logger.info(f"Change streams unavailable ({e}); following {COLLECTION} with a tailable cursor")
+                    use_change_stream = False
+            since = _consume_tailable(collection, since)
+        except PyMongoError as e:
+            logger.warning(f"Invalidation consumer error: {e}")
+            time.sleep(Config.WARMUP_RETRY_INTERVAL)
+
+
+def start_consumer():
+    """Start the consumer thread for this process, once per PID"""
+    global _consumer_pid
+    if Config.CACHE_BUS_MODE == 'off':
+        return
+    pid = os.getpid()
+    with _lock:
+        if _consumer_pid == pid:
+            return
+        _consumer_pid = pid
+    thread = threading.Thread(target=_consume_loop, name='cache-events', daemon=True)
+    thread.start()
+
+
+def _reset_after_fork():
+    global _lock, metrics
+    _lock = threading.Lock()
+    metrics = BusMetrics()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
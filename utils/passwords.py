@@ -0,0 +1,169 @@
+"""
+Password hashing on a bounded worker pool.
+
+Hashing is deliberately slow (scrypt/PBKDF2), and hashlib releases the GIL
+while it runs. Running it on a small thread pool caps how many hashes a
+worker computes at once; when the pool and its queue are full, callers get
+HasherBusyError immediately instead of piling up behind each other.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from config import Config
+from utils.concurrency import native_thread_pool_class
+
+logger = logging.getLogger(__name__)
+
+
+class HasherBusyError(Exception):
+    """Raised when the hashing pool is saturated or a hash times out"""
+
+
+def canonical_method(method):
+    """
+    Expand a werkzeug hash method to the form stored in password hashes.
+
+    Args:
+        method: Method string, e.g. 'scrypt', 'pbkdf2:sha256'
+
+    Returns:
+        Fully parameterised method, e.g. 'pbkdf2:sha256:600000'
+
+    Raises:
+        ValueError: If the method is not supported
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = args if args else (2 ** 15, 8, 1)
+        return f"scrypt:{int(n)}:{int(r)}:{int(p)}"
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    raise ValueError(f"Unsupported password hash method: {method}")
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a bounded thread pool"""
+
+    def __init__(self, method, salt_length, workers, max_pending, timeout):
+        self.method = canonical_method(method)
+        self.salt_length = salt_length
+        self.workers = workers
+        self.timeout = timeout
+        # Real OS threads even under gevent, so hashing never blocks the event loop
+        self._executor = native_thread_pool_class()(max_workers=workers, thread_name_prefix='pwhash')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusyError("Password hashing pool is saturated")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is held until the hash finishes, even if the caller
+        # stops waiting, so timed-out work still counts against capacity
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            self.submitted += 1
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise HasherBusyError("Password hashing timed out")
+
+    def hash(self, password):
+        """
+        Hash a password with the configured parameters.
+
+        Raises:
+            HasherBusyError: If the pool is saturated
+        """
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        """
+        Check a password against a stored hash.
+
+        Raises:
+            HasherBusyError: If the pool is saturated
+        """
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """
+        Check whether a stored hash was made with different parameters.
+
+        Args:
+            pwhash: Stored hash in werkzeug's 'method$salt$hash' format
+
+        Returns:
+            True if the hash should be regenerated with the current settings
+        """
+        try:
+            method, salt, _ = pwhash.split('$', 2)
+            return canonical_method(method) != self.method or len(salt) != self.salt_length
+        except ValueError:
+            return True
+
+    def metrics(self):
+        """Get counters for this process's hashing pool"""
+        with self._lock:
+            return {
+                'method': self.method,
+                'workers': self.workers,
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+            }
+
+
+_hasher = None
+_hasher_pid = None
+_hasher_lock = threading.Lock()
+
+
+def get_hasher():
+    """
+    Get the password hasher for the current process.
+
+    The pool is created lazily per PID, since executor threads do not
+    survive a fork.
+
+    Returns:
+        PasswordHasher instance
+    """
+    global _hasher, _hasher_pid
+    pid = os.getpid()
+    if _hasher is None or _hasher_pid != pid:
+        with _hasher_lock:
+            if _hasher is None or _hasher_pid != pid:
+                _hasher = PasswordHasher(
+                    Config.PASSWORD_HASH_METHOD,
+                    Config.PASSWORD_SALT_LENGTH,
+                    Config.PASSWORD_HASH_WORKERS,
+                    Config.PASSWORD_HASH_MAX_PENDING,
+                    Config.PASSWORD_HASH_TIMEOUT,
+                )
+                _hasher_pid = pid
+    return _hasher
+
+
+def _reset_after_fork():
+    global _hasher_lock
+    _hasher_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,177 @@
+"""
+Token bucket rate limiting.
+
+Each key (an IP address, an email) has a bucket holding up to `capacity`
+tokens that refills at `refill_rate` tokens per second; a request spends
+one token or is rejected. Buckets live in a BucketStore. The default
+in-memory store is per process; a shared backend can be installed with
+set_bucket_store() to enforce limits across workers.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class BucketStore:
+    """Interface for token bucket storage backends"""
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        """
+        Take tokens from the bucket for a key.
+
+        Args:
+            key: Bucket key
+            capacity: Maximum tokens in the bucket
+            refill_rate: Tokens added per second
+            cost: Tokens to take
+
+        Returns:
+            Tuple of (allowed, retry_after_seconds)
+        """
+        raise NotImplementedError
+
+
+class InMemoryBucketStore(BucketStore):
+    """
+    Per-process bucket store with least-recently-used eviction.
+
+    Keys are client-chosen (emails), so the store is bounded: past
+    max_keys it drops the least recently used buckets down to
+    low_water_keys in one pass, keeping eviction O(1) per request on
+    average however many keys an attacker rotates through.
+    """
+
+    def __init__(self, max_keys=100000, low_water_keys=None):
+        self.max_keys = max_keys
+        self.low_water_keys = low_water_keys if low_water_keys is not None else int(max_keys * 0.9)
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                allowed, retry_after = True, 0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed = False
+                retry_after = math.ceil((cost - tokens) / refill_rate) if refill_rate > 0 else None
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.max_keys:
+                while len(self._buckets) > self.low_water_keys:
+                    self._buckets.popitem(last=False)
+                    self.evictions += 1
+        return allowed, retry_after
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+
+
+class RateLimiter:
+    """Named token bucket limit with rejection metrics"""
+
+    def __init__(self, name, capacity, refill_per_minute):
+        self.name = name
+        self.capacity = capacity
+        self.refill_rate = refill_per_minute / 60.0
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def hit(self, key):
+        """
+        Spend a token for a key.
+
+        Args:
+            key: Identity being limited (e.g. IP address or email)
+
+        Returns:
+            Tuple of (allowed, retry_after_seconds)
+        """
+        allowed, retry_after = get_bucket_store().consume(
+            f"{self.name}:{key}", self.capacity, self.refill_rate
+        )
+        with self._lock:
+            if allowed:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+        if not allowed:
+            logger.warning(f"Rate limit {self.name} exceeded for {key}")
+        return allowed, retry_after
+
+    def metrics(self):
+        """Get allowed/rejected counters for this process"""
+        with self._lock:
+            return {
+                'capacity': self.capacity,
+                'refill_per_minute': round(self.refill_rate * 60, 3),
+                'allowed': self.allowed,
+                'rejected': self.rejected,
+            }
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+
+
+_store = InMemoryBucketStore()
+_limiters = {}
+
+
+def get_bucket_store():
+    """Get the active bucket store"""
+    return _store
+
+
+def set_bucket_store(store):
+    """
+    Replace the bucket store, e.g. with a backend shared across workers.
+
+    Args:
+        store: BucketStore implementation
+    """
+    global _store
+    _store = store
+
+
+def get_limiter(name, capacity, refill_per_minute):
+    """
+    Get or create a named rate limiter.
+
+    Args:
+        name: Limiter name, used as the bucket key prefix
+        capacity: Burst size
+        refill_per_minute: Sustained rate
+
+    Returns:
+        RateLimiter instance
+    """
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limiter = _limiters.setdefault(name, RateLimiter(name, capacity, refill_per_minute))
+    return limiter
+
+
+def get_metrics():
+    """Get metrics for every limiter in this process"""
+    return {name: limiter.metrics() for name, limiter in _limiters.items()}
+
+
+def _reset_after_fork():
+    if isinstance(_store, InMemoryBucketStore):
+        _store.reset_after_fork()
+    for limiter in _limiters.values():
+        limiter.reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,309 @@
+"""
+Circuit breaker and last-known-good fallback for model reads.
+
+Reads routed through read() share one breaker per process. After
+BREAKER_FAILURE_THRESHOLD consecutive database failures (connection
+errors and timeouts; query errors do not count) the breaker opens and
+reads fail fast without touching MongoDB. After BREAKER_RESET_SECONDS it
+lets a single probe through (half-open): success closes it, failure
+opens it again.
+
+Every successful read stores its result in a separate last-known-good
+cache, which invalidation events deliberately do not touch; results longer
+than BREAKER_STALE_MAX_ITEMS are not kept, so the cache stays bounded in
+size as well as entries. While reads
+fail, read() returns that result instead and records its age on the
+request, so pages can say they are showing saved data. With nothing saved,
+it raises ReadUnavailable, which init_app() turns into a 503 page.
+
+A read the server cancels at the request deadline (utils/deadlines.py,
+ExecutionTimeout) is a slow query, not an outage: it falls back the same
+way but neither opens nor closes the breaker. Network timeouts under a
+deadline still count as failures.
+"""
+import logging
+import os
+import threading
+import time
+from flask import g, has_request_context, jsonify, render_template, request
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, PyMongoError
+from config import Config
+from utils import deadlines
+from utils.cache import LocalCache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class ReadUnavailable(Exception):
+    """Raised when a read fails and there is no saved result to serve"""
+
+
+class CircuitOpenError(ReadUnavailable):
+    """Raised when the breaker is open and the read was not attempted"""
+
+
+class DeadlineExceeded(ReadUnavailable):
+    """Raised when a read runs out of request deadline with no saved result"""
+
+
+def is_outage(error):
+    """Check whether an error means the database is unreachable or too slow"""
+    return isinstance(error, (ConnectionFailure, ExecutionTimeout)) or (
+        isinstance(error, PyMongoError) and getattr(error, 'timeout', False)
+    )
+
+
+class CircuitBreaker:
+    """Closed / open / half-open circuit breaker"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._opened_at = None
+        self._probing = False
+        self.consecutive_failures = 0
+        self.failures = 0
+        self.successes = 0
+        self.short_circuited = 0
+        self.opened = 0
+        self.probes = 0
+
+    def allow(self):
+        """Check whether a call may go to the database now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                self.probes += 1
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                logger.info("Read circuit breaker closed")
+                self.state = self.CLOSED
+
+    def record_neutral(self):
+        """End a call that says nothing about the database, freeing the probe slot"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold
+            ):
+                logger.warning(f"Read circuit breaker opened after {self.consecutive_failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.opened += 1
+
+    def call(self, fn):
+        """
+        Run a call through the breaker.
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+        """
+        if not self.allow():
+            raise CircuitOpenError("Database reads are failing fast while the circuit is open")
+        # A call killed without an outcome (gevent.Timeout, GreenletExit on
+        # client disconnect) must still free the half-open probe slot
+        outcome = self.record_neutral
+        try:
+            result = fn()
+            outcome = self.record_success
+            return result
+        except Exception as e:
+            if isinstance(e, ExecutionTimeout) and deadlines.exceeded(e):
+                # The server cancelled a query at the request's maxTimeMS:
+                # a slow query, which says nothing either way
+                pass
+            elif is_outage(e):
+                # Includes socket timeouts under a deadline: the server did
+                # not answer within it
+                outcome = self.record_failure
+            else:
+                # The database answered, the call itself was wrong
+                outcome = self.record_success
+            raise
+        finally:
+            outcome()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'open_for_seconds': (
+                    round(time.monotonic() - self._opened_at, 3) if self.state != self.CLOSED else 0
+                ),
+                'failures': self.failures,
+                'successes': self.successes,
+                'short_circuited': self.short_circuited,
+                'opened': self.opened,
+                'probes': self.probes,
+            }
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._probing = False
+
+
+breaker = CircuitBreaker(Config.BREAKER_FAILURE_THRESHOLD, Config.BREAKER_RESET_SECONDS)
+last_good = LocalCache(Config.BREAKER_STALE_MAX_ENTRIES, Config.BREAKER_STALE_TTL)
+stale_served = 0
+too_large_to_save = 0
+
+
+def _mark_stale(age):
+    global stale_served
+    stale_served += 1
+    if has_request_context():
+        g.stale_data_age = max(getattr(g, 'stale_data_age', 0), age)
+
+
+def read_or_stale(key, loader, allow_stale=True):
+    """
+    Run a read through the breaker, falling back to its last good result.
+
+    Args:
+        key: Hashable key of the read (same key, same query)
+        loader: Callable performing the read
+        allow_stale: Serve the last good result when the read fails
+
+    Returns:
+        Tuple of (result, age in seconds if the result is stale, else None)
+
+    Raises:
+        ReadUnavailable: If the read failed and there is nothing to serve
+    """
+    try:
+        value = breaker.call(loader)
+    except Exception as e:
+        out_of_time = deadlines.exceeded(e)
+        if out_of_time:
+            deadlines.record_exceeded()
+        elif not isinstance(e, CircuitOpenError) and not is_outage(e):
+            raise
+        saved = last_good.get(key, _MISSING) if allow_stale else _MISSING
+        if saved is _MISSING:
+            if isinstance(e, ReadUnavailable):
+                raise
+            raise (DeadlineExceeded if out_of_time else ReadUnavailable)(str(e)) from e
+        value, saved_at = saved
+        age = time.time() - saved_at
+        logger.info(f"Serving {age:.0f}s old result for {key[0] if isinstance(key, tuple) else key}: {e}")
+        _mark_stale(age)
+        return value, age
+    if allow_stale:
+        _save(key, value)
+    return value, None
+
+
+def _save(key, value):
+    global too_large_to_save
+    if isinstance(value, list) and len(value) > Config.BREAKER_STALE_MAX_ITEMS:
+        # An unpaged result; a stale copy would cost more than it saves.
+        # Drop an older, smaller copy so it is not served past this one
+        too_large_to_save += 1
+        last_good.delete(key)
+        return
+    last_good.set(key, (value, time.time()))
+
+
+def read(key, loader, allow_stale=True):
+    """Like read_or_stale(), returning only the result"""
+    return read_or_stale(key, loader, allow_stale)[0]
+
+
+def cached_read(cache, key, loader, ttl=None, tags=()):
+    """
+    Like cache.get_or_set(), with the load going through read_or_stale().
+
+    A stale fallback is returned but not cached, so the next request tries
+    the database again; so is a result whose tags were invalidated during
+    the read.
+    """
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        with cache.loading(tags) as load:
+            value, stale_age = read_or_stale(key, loader)
+            if stale_age is None:
+                load.set(key, value, ttl=ttl)
+    return value
+
+
+def metrics():
+    return {
+        **breaker.metrics(),
+        'stale_served': stale_served,
+        'too_large_to_save': too_large_to_save,
+        'last_good': last_good.metrics(),
+    }
+
+
+def init_app(app):
+    """
+    Show the staleness indicator and turn ReadUnavailable into a 503.
+
+    Database errors from requests that ran out of deadline outside read()
+    get the same 503; other database errors are left to the 500 handler.
+
+    Templates get stale_data_age (seconds, or None), and stale responses
+    carry a 'Warning: 110' header.
+    """
+    @app.context_processor
+    def inject_staleness():
+        return {'stale_data_age': g.get('stale_data_age')}
+
+    @app.after_request
+    def mark_stale_response(response):
+        if g.get('stale_data_age') is not None:
+            response.headers['Warning'] = '110 - "Response is Stale"'
+        return response
+
+    @app.errorhandler(ReadUnavailable)
+    def read_unavailable(error):
+        if request.path.startswith('/api/'):
+            body = jsonify({'error': 'Service temporarily unavailable'})
+        else:
+            body = render_template('errors/503.html')
+        response = app.make_response((body, 503))
+        response.headers['Retry-After'] = str(int(Config.BREAKER_RESET_SECONDS))
+        return response
+
+    @app.errorhandler(PyMongoError)
+    def out_of_time(error):
+        if not deadlines.exceeded(error):
+            raise error
+        deadlines.record_exceeded()
+        return read_unavailable(error)
+
+
+def _reset_after_fork():
+    breaker.reset_after_fork()
+    last_good.reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,176 @@
+"""
+Application startup state and background warm-up.
+
+In lazy startup mode the worker accepts traffic as soon as the app object
+is built; connecting to MongoDB and checking indexes happens on a
+background thread. Liveness only says the process is up, readiness says
+the warm-up has completed against the database.
+"""
+import logging
+import os
+import threading
+import time
+from config import Config
+from models import database
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_warmup_tasks = []
+
+
+class StartupState:
+    """Liveness and readiness state of the current worker process"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.started_at = time.time()
+        self.import_ms = None
+        self.startup_ms = None
+        self.ready = False
+        self.ready_ms = None
+        self.attempts = 0
+        self.last_error = None
+        self.warmup_pid = None
+        self._created = time.perf_counter()
+
+    def to_dict(self):
+        """Serializable view of the state for health endpoints"""
+        return {
+            'pid': self.pid,
+            'uptime_s': round(time.time() - self.started_at, 3),
+            'import_ms': self.import_ms,
+            'startup_ms': self.startup_ms,
+            'ready': self.ready,
+            'ready_ms': self.ready_ms,
+            'warmup_attempts': self.attempts,
+            'last_error': self.last_error,
+        }
+
+
+state = StartupState()
+
+
+def register_warmup_task(task):
+    """
+    Register a callable to run once the database is reachable.
+
+    Tasks run in registration order on the warm-up thread after the ping
+    and index checks. A failing task is logged and does not block readiness.
+
+    Args:
+        task: Callable taking no arguments
+    """
+    if task not in _warmup_tasks:
+        _warmup_tasks.append(task)
+    return task
+
+
+def record_import_time(import_ms):
+    """Record how long importing the application modules took"""
+    state.import_ms = round(import_ms, 3)
+
+
+def record_startup_time(startup_ms):
+    """Record how long create_app() took and check it against the budget"""
+    state.startup_ms = round(startup_ms, 3)
+    total_ms = state.startup_ms + (state.import_ms or 0)
+    if total_ms > Config.STARTUP_BUDGET_MS:
+        logger.warning(f"Startup took {total_ms:.0f}ms, over the {Config.STARTUP_BUDGET_MS}ms budget "
+                       f"(import {state.import_ms}ms, create_app {state.startup_ms}ms)")
+    else:
+        logger.info(f"Startup completed in {total_ms:.0f}ms "
+                    f"(import {state.import_ms}ms, create_app {state.startup_ms}ms)")
+
+
+def _warmup_once():
+    """
+    Run a single warm-up attempt.
+
+    Returns:
+        True if the database is reachable and indexes were checked
+    """
+    state.attempts += 1
+    try:
+        database.ping()
+        database.ensure_indexes()
+    except Exception as e:
+        state.last_error = str(e)
+        logger.warning(f"Warm-up attempt {state.attempts} failed: {e}")
+        return False
+
+    state.ready = True
+    state.last_error = None
+    state.ready_ms = round((time.perf_counter() - state._created) * 1000, 3)
+    logger.info(f"Worker {state.pid} ready after {state.ready_ms}ms")
+
+    for task in _warmup_tasks:
+        try:
+            task()
+        except Exception as e:
+            logger.error(f"Warm-up task {getattr(task, '__name__', task)} failed: {e}")
+    return True
+
+
+def _warmup_loop():
+    """Retry warm-up with exponential backoff until it succeeds"""
+    interval = Config.WARMUP_RETRY_INTERVAL
+    while not _warmup_once():
+        time.sleep(interval)
+        interval = min(interval * 2, Config.WARMUP_MAX_RETRY_INTERVAL)
+
+
+def start_warmup(mode=None):
+    """
+    Start warm-up for the current process, once per PID.
+
+    Args:
+        mode: 'lazy' to warm up on a background thread, 'eager' to block on
+            the first attempt (falling back to the background thread if it
+            fails). Defaults to Config.STARTUP_MODE.
+    """
+    pid = os.getpid()
+    with _lock:
+        if state.warmup_pid == pid:
+            return
+        state.warmup_pid = pid
+
+    mode = mode or Config.STARTUP_MODE
+    if mode == 'eager' and _warmup_once():
+        return
+
+    thread = threading.Thread(target=_warmup_loop, name='warmup', daemon=True)
+    thread.start()
+
+
+def ensure_warmup():
+    """
+    Start warm-up if it has not run in this process.
+
+    Threads do not survive fork, so a worker forked from a preloaded master
+    starts its own warm-up on the first request.
+    """
+    if state.warmup_pid != os.getpid():
+        start_warmup()
+
+
+def is_alive():
+    """Liveness: the process is up and serving requests"""
+    return True
+
+
+def is_ready():
+    """Readiness: warm-up has completed against the database"""
+    return state.ready and state.pid == os.getpid()
+
+
+def _reset_after_fork():
+    global state, _lock
+    import_ms, startup_ms = state.import_ms, state.startup_ms
+    state = StartupState()
+    state.import_ms, state.startup_ms = import_ms, startup_ms
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
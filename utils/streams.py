@@ -0,0 +1,194 @@
+"""
+Live updates for Server-Sent Events streams.
+
+Each open stream registers a Listener on the channels it watches: listing
+IDs for room availability, an owner ID for the received requests inbox.
+The hubs follow invalidation events (from this worker or any other) and
+hand each listener the latest state of every changed item. Pending states
+are coalesced per item, so a slow client holds at most one state per item
+rather than a growing queue.
+
+- availability_hub: 'pg_listing' events (room reservations from approved
+  join requests, owner edits, approvals and deletions), per listing.
+- inbox_hub: 'join_request' events (new requests and status changes), per
+  owner, keyed by request ID.
+
+An idle stream costs one Listener and one waiting greenlet or thread.
+That is cheap under a cooperative worker (gunicorn's gevent worker, see
+gunicorn.conf.py); under the sync worker a stream would hold a whole
+process, so streaming_supported() lets the routes fall back to sending
+what they have and having the browser reconnect later, i.e. polling.
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from utils import invalidation
+from utils.concurrency import gevent_patched
+
+logger = logging.getLogger(__name__)
+
+# Listing fields whose changes are pushed to streams
+STREAMED_FIELDS = frozenset({'available_rooms', 'total_rooms', 'status'})
+
+# Sent instead of the state of a listing that left public view (pending
+# re-review or rejected) to viewers who are not its owner or an admin
+WITHDRAWN_STATE = {'available_rooms': 0, 'total_rooms': None, 'status': 'withdrawn'}
+
+
+def streaming_supported(environ):
+    """
+    Check whether this worker can hold long-lived responses cheaply.
+
+    Args:
+        environ: WSGI environ of the request
+
+    Returns:
+        True under gevent or a threaded server
+    """
+    return gevent_patched() or bool(environ.get('wsgi.multithread'))
+
+
+def availability_state(pg):
+    """Get the streamed availability fields of a listing or event"""
+    return {field: pg.get(field) for field in sorted(STREAMED_FIELDS)}
+
+
+class Listener:
+    """Pending changes for one open stream"""
+
+    __slots__ = ('channels', '_pending', '_wakeup')
+
+    def __init__(self, channels):
+        self.channels = frozenset(channels)
+        self._pending = {}  # item id -> latest state
+        self._wakeup = threading.Event()
+
+
+class StreamHub:
+    """Fans changes on channels out to the open streams watching them"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listeners = {}  # channel -> set of Listener
+        self.open_streams = 0
+        self.streams_opened = 0
+        self.changes = 0
+        self.deliveries = 0
+
+    def listen(self, channels):
+        """
+        Register a stream for changes on some channels.
+
+        Returns:
+            Listener to pass to wait() and close()
+        """
+        listener = Listener(channels)
+        with self._lock:
+            for channel in listener.channels:
+                self._listeners.setdefault(channel, set()).add(listener)
+            self.open_streams += 1
+            self.streams_opened += 1
+        return listener
+
+    def close(self, listener):
+        """Unregister a stream"""
+        with self._lock:
+            for channel in listener.channels:
+                listeners = self._listeners.get(channel)
+                if listeners is not None:
+                    listeners.discard(listener)
+                    if not listeners:
+                        del self._listeners[channel]
+            self.open_streams -= 1
+
+    def publish(self, channel, item_id, state):
+        """Hand an item's new state to every stream watching its channel"""
+        with self._lock:
+            listeners = self._listeners.get(channel)
+            if not listeners:
+                return
+            self.changes += 1
+            for listener in listeners:
+                listener._pending[item_id] = state
+                listener._wakeup.set()
+                self.deliveries += 1
+
+    def wait(self, listener, timeout):
+        """
+        Wait for changes on a stream's channels.
+
+        Args:
+            listener: Listener from listen()
+            timeout: Seconds to wait
+
+        Returns:
+            Dictionary of item id -> latest state, empty on timeout
+        """
+        if not listener._wakeup.wait(timeout):
+            return {}
+        with self._lock:
+            listener._wakeup.clear()
+            pending, listener._pending = listener._pending, {}
+        return pending
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'open_streams': self.open_streams,
+                'channels': len(self._listeners),
+                'streams_opened': self.streams_opened,
+                'changes': self.changes,
+                'deliveries': self.deliveries,
+            }
+
+    def reset_after_fork(self):
+        # Streams belong to the parent's connections
+        self._lock = threading.Lock()
+        self._listeners = {}
+        self.open_streams = 0
+
+
+availability_hub = StreamHub()
+inbox_hub = StreamHub()
+
+
+@invalidation.subscribe
+def _on_listing_change(event):
+    if event['entity'] != 'pg_listing' or not event.get('entity_id'):
+        return
+    data = event.get('data', {})
+    if 'fields' in data and not STREAMED_FIELDS.intersection(data['fields']):
+        return
+    if data.get('deleted'):
+        state = {'available_rooms': 0, 'total_rooms': None, 'status': 'deleted'}
+    else:
+        state = availability_state(data)
+    availability_hub.publish(event['entity_id'], event['entity_id'], state)
+
+
+@invalidation.subscribe
+def _on_request_change(event):
+    if event['entity'] != 'join_request' or not event.get('entity_id'):
+        return
+    data = event.get('data', {})
+    if data.get('pg_owner_id'):
+        inbox_hub.publish(data['pg_owner_id'], event['entity_id'], {'status': data.get('status')})
+
+
+def stamp(dt):
+    """Milliseconds since the epoch of a naive UTC datetime, for SSE event IDs"""
+    return int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def from_stamp(value):
+    """Parse an SSE event ID made by stamp(); None if invalid"""
+    try:
+        return datetime.fromtimestamp(int(value) / 1000, tz=timezone.utc).replace(tzinfo=None)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=availability_hub.reset_after_fork)
+    os.register_at_fork(after_in_child=inbox_hub.reset_after_fork)
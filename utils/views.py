@@ -0,0 +1,100 @@
+"""
+Template views of MongoDB documents.
+
+Routes used to walk every result set converting ObjectId fields to
+strings in place. A DocumentView wraps a document without copying it and
+converts values only when a template reads them: ObjectId becomes its hex
+string and embedded documents are wrapped in turn. Derived fields (owner
+or PG details) are computed on first access.
+"""
+from bson import ObjectId
+
+_MISSING = object()
+
+
+def _convert(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, dict):
+        return DocumentView(value)
+    return value
+
+
+class DocumentView:
+    """Read-only, lazily converting view of a document"""
+
+    __slots__ = ('_doc', '_computed', '_values')
+
+    def __init__(self, doc, computed=None):
+        """
+        Args:
+            doc: Document to wrap
+            computed: Optional dict of field name -> callable taking the
+                document, evaluated once on first access
+        """
+        self._doc = doc
+        self._computed = computed
+        self._values = None
+
+    def __getitem__(self, key):
+        if self._computed and key in self._computed:
+            if self._values is None:
+                self._values = {}
+            value = self._values.get(key, _MISSING)
+            if value is _MISSING:
+                value = self._values[key] = _convert(self._computed[key](self._doc))
+            return value
+        return _convert(self._doc[key])
+
+    def __getattr__(self, name):
+        if name in DocumentView.__slots__:
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self._doc or bool(self._computed and key in self._computed)
+
+    def __iter__(self):
+        return iter(self._doc)
+
+    def __len__(self):
+        return len(self._doc)
+
+    def __bool__(self):
+        return True
+
+    @property
+    def doc(self):
+        """The wrapped document, unconverted"""
+        return self._doc
+
+    def __repr__(self):
+        return f"DocumentView({self._doc!r})"
+
+
+def present(docs, **computed):
+    """
+    Wrap documents for a template.
+
+    Args:
+        docs: A document, a list of documents, or None
+        **computed: Derived fields, as callables taking the document
+
+    Returns:
+        DocumentView, list of DocumentView, or None
+    """
+    if docs is None:
+        return None
+    computed = computed or None
+    if isinstance(docs, dict):
+        return DocumentView(docs, computed)
+    return [DocumentView(doc, computed) for doc in docs]
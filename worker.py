@@ -0,0 +1,61 @@
+"""
+Standalone background job worker.
+
+Runs queued jobs (room reservations, snapshot fan-out) outside the web
+processes. Set JOB_WORKERS_IN_APP=0 on the web service when using it.
+
+Usage:
+    python worker.py [--threads N]
+"""
+import argparse
+import logging
+import signal
+import threading
+
+# Importing the models registers their job handlers
+import models.pg_listing  # noqa: F401
+import models.join_request  # noqa: F401
+import models.user  # noqa: F401
+import models.saved_search  # noqa: F401
+import models.archive  # noqa: F401
+from models.database import ensure_indexes
+from models.job_queue import JobWorker
+from config import Config
+from utils import invalidation
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run background jobs')
+    parser.add_argument('--threads', type=int, default=max(1, Config.JOB_WORKERS_IN_APP),
+                        help='Number of worker threads')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s [%(name)s] %(message)s'
+    )
+    logger = logging.getLogger('worker')
+
+    ensure_indexes()
+    # Handlers publish cache events for the web workers to pick up
+    if Config.CACHE_BUS_MODE != 'off':
+        invalidation.ensure_collection()
+
+    worker = JobWorker(threads=args.threads).start()
+    stopping = threading.Event()
+
+    def shutdown(signum, frame):
+        logger.info(f"Received signal {signum}, stopping")
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    stopping.wait()
+    # Jobs interrupted here are retried once their lease expires
+    worker.stop(timeout=Config.JOB_LEASE_SECONDS)
+    logger.info(f"Worker stopped: {worker.metrics()}")
+
+
+if __name__ == '__main__':
+    main()